@@ -13,6 +13,20 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 # 导入并运行主应用
 import streamlit as st
 from src.core.PaperHelper import main_page
+from src.utils.PaperHelper_utils import warm_up, start_research_trends_refresh, start_job_workers
+from src.config.telemetry import telemetry
+
+# 后台预热模型客户端（每个进程只执行一次，不阻塞页面渲染）
+warm_up(background=True)
+
+# 研究趋势快照定时刷新（每个进程只启动一次）
+start_research_trends_refresh()
+
+# 批注、格式修正等耗时任务在后台工作线程中执行，不受页面重新运行影响
+start_job_workers()
+
+# 按环境变量启动指标导出（HTTP /metrics 端点或指标文件）
+telemetry.start_exporters()
 
 # 初始化session state - 移到模块级别确保在部署时也能执行
 if 'current_page' not in st.session_state:
@@ -23,8 +37,12 @@ if 'topic_analysis' not in st.session_state:
     st.session_state.topic_analysis = None
 if 'paper_content' not in st.session_state:
     st.session_state.paper_content = ""
+if 'paper_structure' not in st.session_state:
+    st.session_state.paper_structure = None
 if 'annotation_result' not in st.session_state:
     st.session_state.annotation_result = None
+if 'annotation_type' not in st.session_state:
+    st.session_state.annotation_type = "全面批注"
 if 'analysis_result' not in st.session_state:
     st.session_state.analysis_result = None
 if 'file_info' not in st.session_state:
@@ -33,6 +51,8 @@ if 'format_content' not in st.session_state:
     st.session_state.format_content = ""
 if 'format_result' not in st.session_state:
     st.session_state.format_result = None
+if 'format_target' not in st.session_state:
+    st.session_state.format_target = "APA格式"
 if 'format_analysis_result' not in st.session_state:
     st.session_state.format_analysis_result = None
 
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端基准测试
+使用本地模拟模型服务和合成论文语料，测量选题、批注、格式修正三条主流程的耗时、CPU、内存峰值与模型调用次数
+运行方式：python -m src.benchmarks
+"""
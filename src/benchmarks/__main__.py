@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""基准测试入口：python -m src.benchmarks"""
+
+import sys
+
+from src.benchmarks.runner import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成论文语料
+按固定随机种子生成不同篇幅的新闻传播学论文，并写出TXT、DOCX、PDF三种格式，保证每次基准测试的输入一致
+"""
+
+import os
+import random
+from typing import Dict, List
+
+# Word文档生成（python-docx 同时也是文档处理器的依赖）
+try:
+    from docx import Document
+    DOCX_AVAILABLE = True
+except ImportError:
+    DOCX_AVAILABLE = False
+
+# 篇幅档位：名称 -> 目标字数
+CORPUS_SIZES = {
+    "small": 3000,
+    "medium": 12000,
+    "large": 40000
+}
+
+CHAPTERS = ["引言", "文献综述", "理论框架", "研究方法", "研究发现", "讨论", "结论与展望"]
+
+SUBJECTS = ["短视频平台", "算法推荐", "主流媒体融合转型", "社交媒体舆论", "网络直播", "数字新闻生产"]
+OBJECTS = ["青年群体", "新闻从业者", "公众议程", "信息茧房", "媒介信任", "平台治理"]
+SENTENCE_TEMPLATES = [
+    "本研究发现，{subject}对{object}的影响呈现出明显的阶段性特征（{author}，{year}）。",
+    "已有研究多从传播效果视角讨论{subject}，但对{object}的关注仍显不足[{ref}]。",
+    "基于议程设置理论，{subject}通过重塑信息环境间接作用于{object}。",
+    "问卷数据显示，{subject}使用频率与{object}之间存在显著正相关（r=0.{digits}，p<0.01）。",
+    "因此，有必要将{subject}纳入{object}研究的分析框架之中。",
+    "然而，{subject}的商业逻辑与公共价值之间的张力，使{object}面临新的不确定性。",
+    "此外，深度访谈表明，受访者对{subject}的态度受到{object}的调节。",
+    "综上所述，{subject}与{object}的互动关系需要在更长的时间维度上加以检验[{ref}]。"
+]
+AUTHORS = ["张明", "李华", "王芳", "陈静", "刘洋", "McCombs", "Castells", "Jenkins"]
+
+
+def _sentence(rng: random.Random) -> str:
+    """生成一句论文正文"""
+    return rng.choice(SENTENCE_TEMPLATES).format(
+        subject=rng.choice(SUBJECTS),
+        object=rng.choice(OBJECTS),
+        author=rng.choice(AUTHORS),
+        year=rng.randint(2010, 2024),
+        ref=rng.randint(1, 30),
+        digits=rng.randint(20, 69)
+    )
+
+
+def _paragraph(rng: random.Random) -> str:
+    """生成一个4-8句的段落"""
+    return "".join(_sentence(rng) for _ in range(rng.randint(4, 8)))
+
+
+def generate_paper(size: str, seed: int = 0) -> List[str]:
+    """
+    生成一篇合成论文
+
+    Args:
+        size: 篇幅档位（见 CORPUS_SIZES）
+        seed: 随机种子，相同参数生成相同内容
+
+    Returns:
+        段落列表（章节标题单独成段，格式为“第X章 标题”，可被文档处理器识别为章节）
+    """
+    rng = random.Random(f"{size}-{seed}")
+    target_chars = CORPUS_SIZES[size]
+    subject = rng.choice(SUBJECTS)
+    paragraphs = [
+        f"{subject}语境下的{rng.choice(OBJECTS)}研究",
+        "摘要：" + _paragraph(rng),
+        "关键词：" + "；".join(rng.sample(SUBJECTS + OBJECTS, 4))
+    ]
+
+    # 正文按章节平均分配字数
+    per_chapter = max(target_chars // len(CHAPTERS), 200)
+    numerals = "一二三四五六七八九十"
+    for i, chapter in enumerate(CHAPTERS):
+        paragraphs.append(f"第{numerals[i]}章 {chapter}")
+        written = 0
+        while written < per_chapter:
+            paragraph = _paragraph(rng)
+            paragraphs.append(paragraph)
+            written += len(paragraph)
+
+    paragraphs.append("参考文献：")
+    for i in range(1, 31):
+        paragraphs.append(f"[{i}] {rng.choice(AUTHORS)}. {rng.choice(SUBJECTS)}与{rng.choice(OBJECTS)}研究[J]. "
+                          f"新闻与传播研究, {rng.randint(2010, 2024)}({rng.randint(1, 12)}): {rng.randint(1, 120)}-{rng.randint(121, 200)}.")
+    return paragraphs
+
+
+def write_txt(path: str, paragraphs: List[str]):
+    """写出TXT文件"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(paragraphs))
+
+
+def write_docx(path: str, paragraphs: List[str]):
+    """写出Word文档"""
+    document = Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def _pdf_lines(paragraphs: List[str], chars_per_line: int = 40) -> List[str]:
+    """按固定字数折行"""
+    lines = []
+    for paragraph in paragraphs:
+        lines.extend(paragraph[i:i + chars_per_line] for i in range(0, len(paragraph), chars_per_line))
+    return lines
+
+
+def write_pdf(path: str, paragraphs: List[str], lines_per_page: int = 48):
+    """
+    写出PDF文件
+
+    不依赖第三方库：使用PDF阅读器内置的 STSong-Light 中文字体（UniGB-UCS2-H 编码），
+    文本以UTF-16BE十六进制串写入，pdfplumber/PyPDF2 均可提取
+    """
+    lines = _pdf_lines(paragraphs)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    # 对象编号：1 目录，2 页面树，3-5 字体，之后每页占两个对象（页面 + 内容流）
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /UniGB-UCS2-H "
+           b"/DescendantFonts [4 0 R] >>",
+        4: b"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light "
+           b"/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 2 >> /FontDescriptor 5 0 R /DW 1000 >>",
+        5: b"<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 /FontBBox [-25 -254 1000 880] "
+           b"/ItalicAngle 0 /Ascent 880 /Descent -120 /CapHeight 880 /StemV 93 >>"
+    }
+    page_ids = []
+    for index, page_lines in enumerate(pages):
+        page_id, content_id = 6 + index * 2, 7 + index * 2
+        page_ids.append(page_id)
+        text = "".join(f"<{line.encode('utf-16-be').hex().upper()}> Tj T*\n" for line in page_lines)
+        stream = f"BT /F1 11 Tf 15 TL 56 790 Td\n{text}ET".encode("ascii")
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode("ascii")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("ascii")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        output += b"%010d 00000 n \n" % offsets[object_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+
+    with open(path, "wb") as f:
+        f.write(bytes(output))
+
+
+def build_corpus(directory: str, sizes: List[str] = None, seed: int = 0) -> Dict[str, str]:
+    """
+    生成基准语料（已存在的文件直接复用）
+
+    Returns:
+        {"格式-篇幅": 文件路径}，未安装python-docx时不生成DOCX
+    """
+    os.makedirs(directory, exist_ok=True)
+    writers = {"txt": write_txt, "pdf": write_pdf}
+    if DOCX_AVAILABLE:
+        writers["docx"] = write_docx
+
+    corpus = {}
+    for size in sizes or list(CORPUS_SIZES):
+        paragraphs = generate_paper(size, seed)
+        for extension, writer in writers.items():
+            path = os.path.join(directory, f"paper-{size}-{seed}.{extension}")
+            if not os.path.exists(path):
+                writer(path, paragraphs)
+            corpus[f"{extension}-{size}"] = path
+    return corpus
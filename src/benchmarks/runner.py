@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试执行与基线对比
+每个场景在独立的子进程中冷启动运行（全新缓存），记录墙钟时间、CPU时间、内存峰值和模型调用次数，
+并与保存的基线比较，超出容差即视为性能回退
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List
+
+# 内存峰值统计（Windows 无 resource 模块）
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_OUTPUT_DIR = os.path.join(PROJECT_ROOT, "benchmark_results")
+
+# 参与对比的指标：名称 -> (显示名, 绝对变化下限)；变化量低于下限时视为噪声
+COMPARED_METRICS = {
+    "wall_seconds": ("耗时", 0.05),
+    "cpu_seconds": ("CPU", 0.05),
+    "peak_rss_mb": ("内存峰值", 5.0)
+}
+
+
+def _peak_rss_mb():
+    """当前进程的内存峰值（MB），不支持时返回None"""
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _init_worker(env: Dict[str, str]):
+    """子进程初始化：在导入应用模块前设置环境变量"""
+    os.environ.update(env)
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+
+
+def _measure(scenario_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """在子进程中执行单个场景：准备阶段不计时，只测量用户流程本身"""
+    from src.benchmarks.scenarios import SCENARIO_TYPES
+    from src.utils.PaperHelper_utils import get_cache_stats
+
+    run = SCENARIO_TYPES[scenario_type](params)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    run()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    cache_stats = get_cache_stats()
+    return {
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        "cache_hits": cache_stats.get("hits", 0),
+        "cache_misses": cache_stats.get("misses", 0)
+    }
+
+
+def run_scenario(scenario_type: str, params: Dict[str, Any], env: Dict[str, str], server) -> Dict[str, Any]:
+    """在全新的子进程中运行一次场景，模型调用次数由模拟服务统计"""
+    requests_before = server.get_stats()["requests"]
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_worker,
+                             initargs=(env,)) as pool:
+        result = pool.submit(_measure, scenario_type, params).result()
+    result["llm_calls"] = server.get_stats()["requests"] - requests_before
+    return result
+
+
+def _summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """多次运行取耗时中位数、内存与调用次数最大值"""
+    rss_values = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+    return {
+        "wall_seconds": round(statistics.median(run["wall_seconds"] for run in runs), 4),
+        "cpu_seconds": round(statistics.median(run["cpu_seconds"] for run in runs), 4),
+        "peak_rss_mb": max(rss_values) if rss_values else None,
+        "llm_calls": max(run["llm_calls"] for run in runs),
+        "cache_hits": max(run["cache_hits"] for run in runs),
+        "runs": len(runs)
+    }
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                          tolerance: float) -> Dict[str, List[str]]:
+    """
+    与基线比较
+
+    Returns:
+        {场景名: [回退说明]}，只包含出现回退的场景
+    """
+    regressions = {}
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        problems = []
+        for metric, (label, min_delta) in COMPARED_METRICS.items():
+            current, previous = metrics.get(metric), base.get(metric)
+            if current is None or not previous:
+                continue
+            if current > previous * (1 + tolerance) and current - previous > min_delta:
+                problems.append(f"{label} {previous:g} → {current:g}（+{(current / previous - 1) * 100:.0f}%）")
+        if metrics["llm_calls"] > base.get("llm_calls", metrics["llm_calls"]):
+            problems.append(f"模型调用 {base['llm_calls']} → {metrics['llm_calls']} 次")
+        if problems:
+            regressions[name] = problems
+    return regressions
+
+
+def _git_commit() -> str:
+    """当前提交的短哈希"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def _load_baseline(path: str) -> Dict[str, Dict[str, Any]]:
+    """读取基线，不存在时返回空字典"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def _print_table(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                 regressions: Dict[str, List[str]]):
+    """输出结果表"""
+    print(f"\n{'场景':<28}{'耗时(s)':>10}{'CPU(s)':>10}{'内存(MB)':>10}{'调用':>6}  对比基线")
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if not base:
+            note = "无基线"
+        elif name in regressions:
+            note = "❌ " + "；".join(regressions[name])
+        else:
+            note = f"✅ 耗时 {(metrics['wall_seconds'] / base['wall_seconds'] - 1) * 100:+.0f}%" \
+                if base.get("wall_seconds") else "✅"
+        rss = metrics["peak_rss_mb"] if metrics["peak_rss_mb"] is not None else "-"
+        print(f"{name:<28}{metrics['wall_seconds']:>10.3f}{metrics['cpu_seconds']:>10.3f}{rss:>10}"
+              f"{metrics['llm_calls']:>6}  {note}")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="端到端基准测试（使用本地模拟模型服务）")
+    parser.add_argument("--sizes", default="small,medium,large", help="语料篇幅档位，逗号分隔")
+    parser.add_argument("--scenarios", default="topic,annotation,format", help="运行的场景类型，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=1, help="每个场景重复运行次数（取中位数）")
+    parser.add_argument("--latency", default="fixed:0.05", help="模拟服务首字延迟分布")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="模拟服务输出速度，0表示不限速")
+    parser.add_argument("--response-tokens", type=int, default=200, help="模拟服务默认回复长度")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化比例")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="结果目录")
+    parser.add_argument("--corpus-dir", help="语料目录，默认在结果目录下")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """主函数，出现性能回退时返回1"""
+    args = parse_args(argv)
+    sys.path.insert(0, PROJECT_ROOT)
+    from src.benchmarks.corpus import build_corpus
+    from src.benchmarks.scenarios import build_scenarios
+    from src.scripts.fake_llm_server import FakeLLMServer
+
+    corpus = build_corpus(args.corpus_dir or os.path.join(args.output_dir, "corpus"),
+                          [size.strip() for size in args.sizes.split(",") if size.strip()])
+    selected = {name.strip() for name in args.scenarios.split(",") if name.strip()}
+    scenarios = [scenario for scenario in build_scenarios(corpus) if scenario[1] in selected]
+
+    server = FakeLLMServer(port=0, latency=args.latency, tokens_per_second=args.tokens_per_second,
+                           response_tokens=args.response_tokens, seed=0).start()
+    print(f"🧪 模拟模型服务: {server.url}（首字延迟 {args.latency}）")
+
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix="paperhelper-bench-") as cache_dir:
+            for name, scenario_type, params in scenarios:
+                runs = []
+                for i in range(args.repeat):
+                    env = {
+                        "PAPERHELPER_DEFAULT_MODEL": "fake_llm",
+                        "PAPERHELPER_FAKE_LLM_URL": server.url,
+                        "PAPERHELPER_AUTO_ROUTE": "0",
+                        "PAPERHELPER_HEDGING": "0",
+                        # 每次运行使用全新的缓存文件，保证测量的是冷启动流程
+                        "PAPERHELPER_CACHE_PATH": os.path.join(cache_dir, f"{name}-{i}.db")
+                    }
+                    runs.append(run_scenario(scenario_type, params, env, server))
+                results[name] = _summarize(runs)
+                print(f"⏱️  {name}: {results[name]['wall_seconds']:.3f}s，{results[name]['llm_calls']} 次调用",
+                      flush=True)
+    finally:
+        server.stop()
+
+    baseline = _load_baseline(args.baseline)
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    _print_table(results, baseline, regressions)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                   "response_tokens": args.response_tokens, "repeat": args.repeat},
+        "results": results
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    report_path = os.path.join(args.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 结果已保存: {report_path}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📌 已更新基线: {args.baseline}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} 个场景出现性能回退（容差 {args.tolerance:.0%}）")
+        return 1
+    return 0
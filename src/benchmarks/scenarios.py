@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准场景
+对应 src/core/PaperHelper.py 中的用户流程；每个场景分为准备（导入模块、读取输入，不计时）和执行（计时）两步
+"""
+
+from typing import Dict, Any, Callable, List, Tuple
+
+TOPIC_SUBJECT = "短视频平台对青年群体新闻消费习惯的影响"
+RESEARCH_TYPE = "实证研究"
+TARGET_FORMAT = "APA格式"
+
+
+def _topic(params: Dict[str, Any]) -> Callable[[], Any]:
+    """选题：生成选题 → 选题诊断 → 可行性分析"""
+    from src.utils.PaperHelper_utils import generate_paper, topic_diagnosis, analyze_topic_feasibility
+
+    def run():
+        generate_paper(TOPIC_SUBJECT, 0.8, 0.3)
+        topic_diagnosis(TOPIC_SUBJECT, RESEARCH_TYPE)
+        analyze_topic_feasibility(TOPIC_SUBJECT, RESEARCH_TYPE)
+    return run
+
+
+def _annotation(params: Dict[str, Any]) -> Callable[[], Any]:
+    """批注：上传文档 → 文档处理 → 综合分析 → 智能批注"""
+    from src.utils.local_files import LocalUploadedFile
+    from src.modules.document_processor_simple import document_processor
+    from src.modules.advanced_analyzer import advanced_analyzer
+    from src.utils.PaperHelper_utils import intelligent_annotation
+
+    uploaded_file = LocalUploadedFile.from_path(params["path"])
+
+    def run():
+        doc_result = document_processor.process_uploaded_file(uploaded_file)
+        if not doc_result.get("success"):
+            raise RuntimeError(doc_result.get("error", "文档处理失败"))
+        advanced_analyzer.comprehensive_analysis(doc_result["content"])
+        intelligent_annotation(doc_result["content"], params.get("annotation_type", "全面批注"),
+                               structure=doc_result.get("structure"))
+    return run
+
+
+def _format(params: Dict[str, Any]) -> Callable[[], Any]:
+    """格式修正"""
+    from src.utils.PaperHelper_utils import format_correction
+
+    with open(params["path"], "r", encoding="utf-8") as f:
+        content = f.read()
+
+    def run():
+        format_correction(content, TARGET_FORMAT)
+    return run
+
+
+SCENARIO_TYPES = {
+    "topic": _topic,
+    "annotation": _annotation,
+    "format": _format
+}
+
+
+def build_scenarios(corpus: Dict[str, str]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    根据语料生成场景列表（按语料篇幅由小到大排列）
+
+    Returns:
+        [(场景名, 场景类型, 参数)]
+    """
+    scenarios = [("topic", "topic", {})]
+    for key, path in corpus.items():
+        scenarios.append((f"annotation-{key}", "annotation", {"path": path}))
+    for key, path in corpus.items():
+        if key.startswith("txt-"):
+            scenarios.append((f"format-{key[4:]}", "format", {"path": path}))
+    return scenarios
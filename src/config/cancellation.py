@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求取消
+用户切换页面或重复提交时，被取代的请求通过取消令牌中止。令牌经 contextvars 传递到模型调用层：
+提交到后台事件循环的协程在令牌取消时被直接取消，进行中的HTTP请求随之断开；
+同步代码在重试退避、限流等待与流式输出的间隙检查令牌
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from src.config.telemetry import telemetry
+
+_current_token = contextvars.ContextVar("paperhelper_cancellation_token", default=None)
+
+
+class RequestCancelledError(asyncio.CancelledError):
+    """请求已被取消（继承CancelledError，不会被当作普通错误降级处理或重试）"""
+
+
+class CancellationToken:
+    """取消令牌（线程安全），一个令牌对应一次用户操作"""
+
+    def __init__(self, label: str = ""):
+        """
+        初始化
+
+        Args:
+            label: 令牌用途（如 annotation、topic_analysis），用于指标标签
+        """
+        self.label = label
+        self.reason = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已取消"""
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "superseded") -> bool:
+        """
+        取消令牌，执行所有已注册的回调（如取消后台协程）
+
+        Args:
+            reason: 取消原因，如 superseded（重复提交）、navigation（切换页面）
+        Returns:
+            是否为首次取消
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        telemetry.inc("paperhelper_cancellations_total", label=self.label or "unknown", reason=reason)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"执行取消回调时发生错误: {str(e)}")
+        return True
+
+    def raise_if_cancelled(self):
+        """已取消时抛出 RequestCancelledError"""
+        if self._event.is_set():
+            raise RequestCancelledError(f"请求已取消（{self.reason}）")
+
+    def wait(self, timeout: float = None) -> bool:
+        """等待取消，返回是否已取消"""
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        注册取消回调，已取消时立即执行
+
+        Returns:
+            注销回调的函数
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def remove():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+                return remove
+        callback()
+        return lambda: None
+
+
+def current_token() -> Optional[CancellationToken]:
+    """当前上下文中的取消令牌"""
+    return _current_token.get()
+
+
+@contextmanager
+def scope(token: Optional[CancellationToken]):
+    """在上下文中使用指定的取消令牌，其中发起的模型调用都可被该令牌取消"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def check():
+    """当前令牌已取消时抛出 RequestCancelledError"""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def sleep(seconds: float):
+    """可被当前令牌打断的 time.sleep"""
+    token = _current_token.get()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        token.raise_if_cancelled()
+
+
+def bind(coro):
+    """
+    让提交到后台事件循环的协程沿用调用方的取消令牌
+
+    令牌取消时直接取消该协程所在的任务（进行中的HTTP请求随之断开），并抛出 RequestCancelledError
+    """
+    token = _current_token.get()
+    if token is None:
+        return coro
+
+    async def bound():
+        _current_token.set(token)
+        if token.cancelled:
+            coro.close()
+            token.raise_if_cancelled()
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        remove = token.add_callback(lambda: loop.call_soon_threadsafe(task.cancel))
+        try:
+            return await coro
+        except asyncio.CancelledError:
+            if token.cancelled:
+                raise RequestCancelledError(f"请求已取消（{token.reason}）") from None
+            raise
+        finally:
+            remove()
+    return bound()
@@ -6,55 +6,90 @@
 """
 
 import os
-from typing import Dict, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
 
-# 尝试导入各种模型，如果失败则设置为None
-try:
-    from langchain_openai import ChatOpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    ChatOpenAI = None
-    OPENAI_AVAILABLE = False
-
-try:
-    from langchain_anthropic import ChatAnthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    ChatAnthropic = None
-    ANTHROPIC_AVAILABLE = False
+from src.config.fast_models_config import fast_models_config
 
-try:
-    from langchain_community.llms import Ollama
-    OLLAMA_AVAILABLE = True
-except ImportError:
-    Ollama = None
-    OLLAMA_AVAILABLE = False
+# 各模型SDK在首次创建模型时才导入（见 _load_backends），加快应用启动
+ChatOpenAI = None
+ChatAnthropic = None
+Ollama = None
+http_client_pool = None
+OPENAI_AVAILABLE = False
+ANTHROPIC_AVAILABLE = False
+OLLAMA_AVAILABLE = False
+_backends_loaded = False
+_backends_lock = threading.Lock()
 
-from src.config.fast_models_config import fast_models_config
+def _load_backends():
+    """导入各种模型，如果失败则设置为None"""
+    global ChatOpenAI, ChatAnthropic, Ollama, http_client_pool
+    global OPENAI_AVAILABLE, ANTHROPIC_AVAILABLE, OLLAMA_AVAILABLE, _backends_loaded
+    
+    with _backends_lock:
+        if _backends_loaded:
+            return
+        
+        try:
+            from langchain_openai import ChatOpenAI
+            OPENAI_AVAILABLE = True
+        except ImportError:
+            ChatOpenAI = None
+            OPENAI_AVAILABLE = False
+        
+        try:
+            from langchain_anthropic import ChatAnthropic
+            ANTHROPIC_AVAILABLE = True
+        except ImportError:
+            ChatAnthropic = None
+            ANTHROPIC_AVAILABLE = False
+        
+        try:
+            from langchain_community.llms import Ollama
+            OLLAMA_AVAILABLE = True
+        except ImportError:
+            Ollama = None
+            OLLAMA_AVAILABLE = False
+        
+        from src.config.http_client_pool import http_client_pool
+        _backends_loaded = True
 
 class FastLLMManager:
     """快速模型管理器"""
     
-    def __init__(self):
+    def __init__(self, max_pool_size: int = None):
         """初始化模型管理器"""
         self.current_model = None
         self.model_config = None
         self.llm_instance = None
         
+        # 模型实例池：(model_key, temperature, max_tokens) -> 已创建的客户端
+        self.max_pool_size = max_pool_size or int(os.getenv("PAPERHELPER_LLM_POOL_SIZE", 16))
+        self._pool = OrderedDict()
+        self._pool_stats = {}
+        self._pool_lock = threading.RLock()
+        self._pool_counters = {"hits": 0, "misses": 0, "evictions": 0}
+        # id(实例) -> model_key，用于确定某次调用实际使用的模型
+        self._pool_models = {}
+        
+        # 自动路由：每次请求按实测延迟选择最快的健康模型
+        self.auto_route = os.getenv("PAPERHELPER_AUTO_ROUTE", "0") == "1"
+        
     def switch_model(self, model_key: str) -> Dict[str, Any]:
         """切换模型"""
         try:
             # 获取模型配置
-            self.model_config = fast_models_config.get_model_config(model_key)
-            self.current_model = model_key
+            model_config = fast_models_config.get_model_config(model_key)
             
-            # 根据模型类型创建实例
-            if self.model_config["type"] == "local":
-                self.llm_instance = self._create_local_model()
-            elif self.model_config["type"] == "api":
-                self.llm_instance = self._create_api_model()
-            else:
-                raise ValueError(f"不支持的模型类型: {self.model_config['type']}")
+            # 根据模型类型创建（或复用）实例
+            llm_instance = self._get_pooled_llm(model_key, model_config)
+            
+            self.model_config = model_config
+            self.current_model = model_key
+            self.llm_instance = llm_instance
             
             return {
                 "success": True,
@@ -69,23 +104,77 @@ class FastLLMManager:
                 "error": f"切换模型失败: {str(e)}"
             }
     
-    def _create_local_model(self):
+    def _resolve_max_tokens(self, model_key: str, model_config: Dict[str, Any],
+                            max_tokens: Optional[int]) -> Optional[int]:
+        """确定实例使用的max_tokens（未指定时沿用各模型的默认值）"""
+        if max_tokens is not None:
+            return max_tokens
+        if model_key == "openai_gpt35" or model_key == "qwen":
+            return model_config.get("max_tokens", 1500)
+        if model_key == "qwen_plus":
+            return model_config.get("max_tokens", 2000)
+        return model_config.get("max_tokens")
+    
+    def _get_pooled_llm(self, model_key: str, model_config: Dict[str, Any],
+                        temperature: float = None, max_tokens: int = None) -> Any:
+        """从实例池获取模型实例，不存在时创建，超出容量时按LRU淘汰"""
+        if temperature is None:
+            temperature = model_config["temperature"]
+        max_tokens = self._resolve_max_tokens(model_key, model_config, max_tokens)
+        pool_key = (model_key, float(temperature), max_tokens)
+        
+        with self._pool_lock:
+            llm = self._pool.get(pool_key)
+            if llm is not None:
+                self._pool.move_to_end(pool_key)
+                stats = self._pool_stats[pool_key]
+                stats["uses"] += 1
+                stats["last_used"] = time.time()
+                self._pool_counters["hits"] += 1
+                return llm
+            
+            _load_backends()
+            
+            # 根据模型类型创建实例
+            if model_config["type"] == "local":
+                llm = self._create_local_model(model_key, model_config, temperature)
+            elif model_config["type"] == "api":
+                llm = self._create_api_model(model_key, model_config, temperature, max_tokens)
+            else:
+                raise ValueError(f"不支持的模型类型: {model_config['type']}")
+            
+            now = time.time()
+            self._pool[pool_key] = llm
+            self._pool_stats[pool_key] = {"created_at": now, "last_used": now, "uses": 1}
+            self._pool_models[id(llm)] = model_key
+            self._pool_counters["misses"] += 1
+            
+            while len(self._pool) > self.max_pool_size:
+                evicted_key, evicted_llm = self._pool.popitem(last=False)
+                self._pool_stats.pop(evicted_key, None)
+                self._pool_models.pop(id(evicted_llm), None)
+                self._pool_counters["evictions"] += 1
+            
+            return llm
+    
+    def _create_local_model(self, model_key: str, model_config: Dict[str, Any], temperature: float):
         """创建本地模型实例"""
         if not OLLAMA_AVAILABLE:
             raise ImportError("Ollama模块未安装，无法使用本地模型")
         
-        if self.current_model in ["local_llama", "phi", "gemma"]:
+        if model_key in ["local_llama", "phi", "gemma"]:
             # 使用Ollama运行本地模型
             return Ollama(
-                model=self.model_config["model_name"],
-                temperature=self.model_config["temperature"]
+                model=model_config["model_name"],
+                temperature=temperature
             )
         else:
-            raise ValueError(f"不支持的本地模型: {self.current_model}")
+            raise ValueError(f"不支持的本地模型: {model_key}")
     
-    def _create_api_model(self):
+    def _create_api_model(self, model_key: str, model_config: Dict[str, Any],
+                          temperature: float, max_tokens: Optional[int]):
         """创建API模型实例 - 优化版配置"""
-        if self.current_model == "openai_gpt35":
+        if model_key == "openai_gpt35":
             if not OPENAI_AVAILABLE:
                 raise ImportError("OpenAI模块未安装，无法使用OpenAI模型")
             
@@ -94,15 +183,16 @@ class FastLLMManager:
                 raise ValueError("未设置OPENAI_API_KEY环境变量")
             
             return ChatOpenAI(
-                model=self.model_config["model_name"],
-                temperature=self.model_config["temperature"],
+                model=model_config["model_name"],
+                temperature=temperature,
                 api_key=api_key,
-                max_tokens=self.model_config.get("max_tokens", 1500),
-                timeout=self.model_config.get("timeout", 30),
-                request_timeout=self.model_config.get("timeout", 30)
+                max_tokens=max_tokens,
+                timeout=model_config.get("timeout", 30),
+                request_timeout=model_config.get("timeout", 30),
+                **http_client_pool.client_kwargs(model_config["api_base"])
             )
             
-        elif self.current_model == "anthropic_claude":
+        elif model_key == "anthropic_claude":
             if not ANTHROPIC_AVAILABLE:
                 raise ImportError("Anthropic模块未安装，无法使用Claude模型")
             
@@ -110,86 +200,174 @@ class FastLLMManager:
             if not api_key:
                 raise ValueError("未设置ANTHROPIC_API_KEY环境变量")
             
+            extra_params = {"max_tokens": max_tokens} if max_tokens is not None else {}
             return ChatAnthropic(
-                model=self.model_config["model_name"],
-                temperature=self.model_config["temperature"],
-                api_key=api_key
+                model=model_config["model_name"],
+                temperature=temperature,
+                api_key=api_key,
+                **extra_params
             )
             
-        elif self.current_model == "baichuan":
+        elif model_key == "baichuan":
             api_key = os.getenv("BAICHUAN_API_KEY")
             if not api_key:
                 raise ValueError("未设置BAICHUAN_API_KEY环境变量")
             
+            extra_params = {"max_tokens": max_tokens} if max_tokens is not None else {}
             return ChatOpenAI(
-                model=self.model_config["model_name"],
-                temperature=self.model_config["temperature"],
+                model=model_config["model_name"],
+                temperature=temperature,
                 api_key=api_key,
-                base_url=self.model_config["api_base"]
+                base_url=model_config["api_base"],
+                **extra_params,
+                **http_client_pool.client_kwargs(model_config["api_base"])
             )
             
-        elif self.current_model == "qwen":
+        elif model_key == "qwen":
             api_key = os.getenv("DASHSCOPE_API_KEY")
             if not api_key:
                 raise ValueError("未设置DASHSCOPE_API_KEY环境变量")
             
             return ChatOpenAI(
-                model=self.model_config["model_name"],
-                temperature=self.model_config["temperature"],
+                model=model_config["model_name"],
+                temperature=temperature,
                 api_key=api_key,
-                base_url=self.model_config["api_base"],
-                max_tokens=self.model_config.get("max_tokens", 1500),
-                timeout=self.model_config.get("timeout", 30),
-                request_timeout=self.model_config.get("timeout", 30)
+                base_url=model_config["api_base"],
+                max_tokens=max_tokens,
+                timeout=model_config.get("timeout", 30),
+                request_timeout=model_config.get("timeout", 30),
+                **http_client_pool.client_kwargs(model_config["api_base"])
             )
             
-        elif self.current_model == "qwen_plus":
+        elif model_key == "qwen_plus":
             api_key = os.getenv("DASHSCOPE_API_KEY")
             if not api_key:
                 raise ValueError("未设置DASHSCOPE_API_KEY环境变量")
             
             return ChatOpenAI(
-                model=self.model_config["model_name"],
-                temperature=self.model_config["temperature"],
+                model=model_config["model_name"],
+                temperature=temperature,
                 api_key=api_key,
-                base_url=self.model_config["api_base"],
-                max_tokens=self.model_config.get("max_tokens", 2000),
-                timeout=self.model_config.get("timeout", 45),
-                request_timeout=self.model_config.get("timeout", 45)
+                base_url=model_config["api_base"],
+                max_tokens=max_tokens,
+                timeout=model_config.get("timeout", 45),
+                request_timeout=model_config.get("timeout", 45),
+                **http_client_pool.client_kwargs(model_config["api_base"])
+            )
+            
+        elif model_key == "fake_llm":
+            if not OPENAI_AVAILABLE:
+                raise ImportError("OpenAI模块未安装，无法使用模拟模型")
+            
+            # 模拟服务不校验密钥；重试交给重试引擎，使注入的错误如实计入统计
+            return ChatOpenAI(
+                model=model_config["model_name"],
+                temperature=temperature,
+                api_key="fake",
+                base_url=model_config["api_base"],
+                max_tokens=max_tokens,
+                timeout=model_config.get("timeout", 60),
+                max_retries=0,
+                **http_client_pool.client_kwargs(model_config["api_base"])
             )
             
         else:
-            raise ValueError(f"不支持的API模型: {self.current_model}")
+            raise ValueError(f"不支持的API模型: {model_key}")
     
-    def get_llm(self, temperature: float = None) -> Any:
-        """获取LLM实例"""
+    def get_llm(self, temperature: float = None, max_tokens: int = None, quality_tier: str = None,
+                route_metric: str = "total") -> Any:
+        """
+        获取LLM实例
+        
+        相同 (模型, temperature, max_tokens) 的请求复用池中已建立连接的实例，
+        不再为每个temperature重新创建客户端
+        
+        Args:
+            temperature: 创造性参数
+            max_tokens: 最大输出长度
+            quality_tier: 自动路由时要求的最低质量档位，默认使用配置中的档位
+            route_metric: 自动路由的排序依据，流式调用使用 "ttft"（首字延迟）
+        """
+        if self.auto_route:
+            from src.config.latency_router import latency_router
+            
+            model_key = latency_router.choose(quality_tier or fast_models_config.default_quality_tier, route_metric)
+            model_config = fast_models_config.get_model_config(model_key)
+            return self._get_pooled_llm(model_key, model_config, temperature, max_tokens)
+        
         if self.llm_instance is None:
             # 使用默认模型
-            self.switch_model(fast_models_config.default_model)
+            result = self.switch_model(fast_models_config.default_model)
+            if not result["success"]:
+                raise RuntimeError(result["error"])
         
-        # 如果指定了temperature，创建新的实例
-        if temperature is not None and temperature != self.model_config["temperature"]:
-            if self.model_config["type"] == "local":
-                return Ollama(
-                    model=self.model_config["model_name"],
-                    temperature=temperature
-                )
-            elif self.model_config["type"] == "api":
-                if self.current_model == "openai_gpt35":
-                    return ChatOpenAI(
-                        model=self.model_config["model_name"],
-                        temperature=temperature,
-                        api_key=os.getenv("OPENAI_API_KEY")
-                    )
-                elif self.current_model == "anthropic_claude":
-                    return ChatAnthropic(
-                        model=self.model_config["model_name"],
-                        temperature=temperature,
-                        api_key=os.getenv("ANTHROPIC_API_KEY")
-                    )
-                # 其他模型类似...
+        if temperature is None and max_tokens is None:
+            return self.llm_instance
         
-        return self.llm_instance
+        return self._get_pooled_llm(self.current_model, self.model_config, temperature, max_tokens)
+    
+    def get_llm_for(self, model_key: str, temperature: float = None, max_tokens: int = None) -> Any:
+        """获取指定模型的实例（不影响当前模型），用于对冲等需要同时使用多个模型的场景"""
+        model_config = fast_models_config.get_model_config(model_key)
+        return self._get_pooled_llm(model_key, model_config, temperature, max_tokens)
+    
+    def set_auto_route(self, enabled: bool):
+        """开启/关闭自动路由"""
+        self.auto_route = enabled
+    
+    def model_key_for(self, llm: Any) -> Optional[str]:
+        """
+        查询某个实例对应的模型键
+
+        池中的实例直接查表；已被淘汰但仍被调用链引用的实例按模型名与接口地址匹配配置，
+        无法确定时返回None
+        """
+        with self._pool_lock:
+            model_key = self._pool_models.get(id(llm))
+        if model_key is not None:
+            return model_key
+
+        model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+        if not model_name:
+            return None
+        api_base = getattr(llm, "openai_api_base", None) or getattr(llm, "base_url", None)
+        candidates = [key for key, config in fast_models_config.models.items() if config.get("model_name") == model_name]
+        if len(candidates) > 1 and api_base:
+            matched = [key for key in candidates
+                       if str(fast_models_config.models[key].get("api_base", "")).rstrip("/") == str(api_base).rstrip("/")]
+            candidates = matched or candidates
+        return candidates[0] if candidates else None
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取实例池统计（命中/创建/淘汰次数及每个实例的使用情况）"""
+        with self._pool_lock:
+            entries = []
+            for (model_key, temperature, max_tokens), stats in self._pool_stats.items():
+                entries.append({
+                    "model": model_key,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "uses": stats["uses"],
+                    "created_at": stats["created_at"],
+                    "last_used": stats["last_used"]
+                })
+            
+            return {
+                "size": len(self._pool),
+                "max_size": self.max_pool_size,
+                "hits": self._pool_counters["hits"],
+                "misses": self._pool_counters["misses"],
+                "evictions": self._pool_counters["evictions"],
+                "entries": entries
+            }
+    
+    def clear_pool(self, model_key: str = None):
+        """清空实例池（指定model_key时只清除该模型的实例）"""
+        with self._pool_lock:
+            for pool_key in list(self._pool.keys()):
+                if model_key is None or pool_key[0] == model_key:
+                    self._pool_models.pop(id(self._pool.pop(pool_key)), None)
+                    self._pool_stats.pop(pool_key, None)
     
     def get_current_model_info(self) -> Dict[str, Any]:
         """获取当前模型信息"""
@@ -208,9 +386,12 @@ class FastLLMManager:
     def test_model_connection(self) -> Dict[str, Any]:
         """测试模型连接"""
         try:
+            from src.config.rate_limiter import rate_limiter
+            
             llm = self.get_llm()
-            # 发送简单测试请求
-            response = llm.invoke("你好")
+            # 发送简单测试请求（同样受限流约束）
+            with rate_limiter.limit(self.current_model):
+                response = llm.invoke("你好")
             
             return {
                 "success": True,
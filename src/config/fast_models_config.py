@@ -8,6 +8,9 @@
 import os
 from typing import Dict, Any
 
+# 本地模拟模型服务的默认地址（见 src/scripts/fake_llm_server.py）
+DEFAULT_FAKE_LLM_URL = "http://127.0.0.1:8765/v1"
+
 class FastModelsConfig:
     """快速模型配置类"""
     
@@ -23,7 +26,9 @@ class FastModelsConfig:
                 "setup": "需要本地部署",
                 "api_base": "http://localhost:11434/v1",
                 "model_name": "llama2:7b-chat",
-                "temperature": 0.7
+                "quality_tier": "basic",
+                "temperature": 0.7,
+                "rate_limit": {"requests_per_second": 0, "max_concurrency": 2}
             },
             
             # 2. 开源API模型（较快）
@@ -35,7 +40,13 @@ class FastModelsConfig:
                 "setup": "需要OpenAI API Key",
                 "api_base": "https://api.openai.com/v1",
                 "model_name": "gpt-3.5-turbo",
-                "temperature": 0.7
+                "quality_tier": "standard",
+                "structured_output": "json_object",   # 结构化输出方式 json_schema/json_object，未配置时只做本地校验与修复
+                "api_key_env": "OPENAI_API_KEY",
+                "temperature": 0.7,
+                "max_connections": 20,
+                "max_keepalive_connections": 10,
+                "rate_limit": {"requests_per_second": 3, "burst": 5, "max_concurrency": 5}
             },
             
             "anthropic_claude": {
@@ -46,7 +57,10 @@ class FastModelsConfig:
                 "setup": "需要Anthropic API Key",
                 "api_base": "https://api.anthropic.com",
                 "model_name": "claude-3-haiku-20240307",
-                "temperature": 0.7
+                "quality_tier": "standard",
+                "api_key_env": "ANTHROPIC_API_KEY",
+                "temperature": 0.7,
+                "rate_limit": {"requests_per_second": 1, "burst": 3, "max_concurrency": 3}
             },
             
             # 3. 国内模型（较快）
@@ -58,7 +72,12 @@ class FastModelsConfig:
                 "setup": "需要百川API Key",
                 "api_base": "https://api.baichuan-ai.com/v1",
                 "model_name": "Baichuan2-Turbo",
-                "temperature": 0.7
+                "quality_tier": "standard",
+                "api_key_env": "BAICHUAN_API_KEY",
+                "temperature": 0.7,
+                "max_connections": 20,
+                "max_keepalive_connections": 10,
+                "rate_limit": {"requests_per_second": 2, "burst": 4, "max_concurrency": 4}
             },
             
             "qwen": {
@@ -69,9 +88,16 @@ class FastModelsConfig:
                 "setup": "需要阿里云API Key",
                 "api_base": "https://dashscope.aliyuncs.com/compatible-mode/v1",
                 "model_name": "qwen-turbo",
+                "quality_tier": "standard",
+                "structured_output": "json_object",
+                "api_key_env": "DASHSCOPE_API_KEY",
                 "temperature": 0.3,
                 "max_tokens": 1500,
-                "timeout": 30
+                "timeout": 30,
+                "max_connections": 50,
+                "max_keepalive_connections": 20,
+                "rate_limit": {"requests_per_second": 5, "burst": 10, "max_concurrency": 8},
+                "hedge": {"secondary_models": ["baichuan", "openai_gpt35", "qwen_plus"]}
             },
             
             "qwen_plus": {
@@ -82,9 +108,16 @@ class FastModelsConfig:
                 "setup": "需要阿里云API Key",
                 "api_base": "https://dashscope.aliyuncs.com/compatible-mode/v1",
                 "model_name": "qwen-plus",
+                "quality_tier": "high",
+                "structured_output": "json_object",
+                "api_key_env": "DASHSCOPE_API_KEY",
                 "temperature": 0.3,
                 "max_tokens": 2000,
-                "timeout": 45
+                "timeout": 45,
+                "max_connections": 50,
+                "max_keepalive_connections": 20,
+                "rate_limit": {"requests_per_second": 3, "burst": 6, "max_concurrency": 6},
+                "hedge": {"secondary_models": ["baichuan", "openai_gpt35", "qwen"]}
             },
             
             # 4. 轻量级模型（最快）
@@ -96,7 +129,9 @@ class FastModelsConfig:
                 "setup": "需要本地部署",
                 "api_base": "http://localhost:11434/v1",
                 "model_name": "phi:2.7b",
-                "temperature": 0.7
+                "quality_tier": "basic",
+                "temperature": 0.7,
+                "rate_limit": {"requests_per_second": 0, "max_concurrency": 2}
             },
             
             "gemma": {
@@ -107,12 +142,63 @@ class FastModelsConfig:
                 "setup": "需要本地部署",
                 "api_base": "http://localhost:11434/v1",
                 "model_name": "gemma:2b",
-                "temperature": 0.7
+                "quality_tier": "basic",
+                "temperature": 0.7,
+                "rate_limit": {"requests_per_second": 0, "max_concurrency": 2}
             }
         }
         
-        # 默认模型配置 - 使用通义千问
-        self.default_model = "qwen_plus"
+        # 5. 本地模拟模型：只在离线测试时注册（设置了模拟服务地址或默认模型为 fake_llm），不出现在正式的模型列表中
+        if os.getenv("PAPERHELPER_FAKE_LLM_URL") or os.getenv("PAPERHELPER_DEFAULT_MODEL") == "fake_llm":
+            self.models["fake_llm"] = self.fake_llm_config(os.getenv("PAPERHELPER_FAKE_LLM_URL"))
+        
+        # 默认模型配置 - 使用通义千问，可通过 PAPERHELPER_DEFAULT_MODEL 覆盖（如离线测试时使用 fake_llm）
+        self.default_model = os.getenv("PAPERHELPER_DEFAULT_MODEL", "qwen_plus")
+        if self.default_model not in self.models:
+            self.default_model = "qwen_plus"
+        
+        # 对冲请求默认配置，模型可通过 "hedge" 项单独覆盖
+        self.default_hedge_policy = {
+            "secondary_models": [],     # 备用模型（按顺序取第一个可用的），为空时不对冲
+            "percentile": "p95",        # 以主模型首字延迟的哪个分位数作为阈值基准（p50/p95）
+            "multiplier": 1.0,          # 阈值 = 分位数 × 系数
+            "min_delay": 1.5,           # 阈值下限（秒）
+            "max_delay": 8.0,           # 阈值上限（秒）
+            "default_delay": 3.0,       # 样本不足时的阈值（秒）
+            "min_samples": 10           # 至少多少个成功样本后才使用实测阈值
+        }
+        
+        # 自动路由时未指定质量档位的请求使用的档位（basic/standard/high）
+        self.default_quality_tier = "standard"
+        
+        # HTTP连接池默认配置（模型未单独配置时使用）
+        self.default_connection_limits = {
+            "max_connections": 20,
+            "max_keepalive_connections": 10,
+            "keepalive_expiry": 60.0,
+            "timeout": 60.0,
+            "http2": True
+        }
+        
+        # 限流默认配置：每秒请求数（0表示不限速）、突发容量、最大并发、最长排队秒数
+        self.default_rate_limit = {
+            "requests_per_second": 2,
+            "burst": 4,
+            "max_concurrency": 4,
+            "max_wait": 60
+        }
+        
+        # 重试与熔断默认配置，模型可通过 "retry" 项单独覆盖
+        self.default_retry_policy = {
+            "max_attempts": 3,          # 含首次调用在内的最多尝试次数
+            "base_delay": 1.0,          # 指数退避基础延迟（秒）
+            "max_delay": 20.0,          # 单次退避上限（秒）
+            "max_retry_after": 30.0,    # 服务端要求等待超过此值时不再重试
+            "max_blocking_wait": 5.0,   # 同步调用（阻塞页面脚本线程且无法取消）单次等待的上限，超过时不再重试
+            "failure_threshold": 5,     # 连续失败多少次后熔断
+            "recovery_timeout": 30.0,   # 熔断后多久放行探测请求（秒）
+            "half_open_max_calls": 1    # 半开状态下同时放行的探测请求数
+        }
         
     def get_model_config(self, model_key: str = None) -> Dict[str, Any]:
         """获取模型配置"""
@@ -124,6 +210,66 @@ class FastModelsConfig:
         else:
             return self.models[self.default_model]
     
+    def fake_llm_config(self, api_base: str = None) -> Dict[str, Any]:
+        """本地模拟模型的配置（基准测试与离线测试用，质量档位最低，自动路由时不会优先选中）"""
+        return {
+            "name": "本地模拟模型",
+            "type": "api",
+            "speed": "极快",
+            "cost": "免费",
+            "setup": "需要运行 src/scripts/fake_llm_server.py",
+            "api_base": api_base or DEFAULT_FAKE_LLM_URL,
+            "model_name": "fake-llm",
+            "quality_tier": "basic",
+            "structured_output": "json_schema",
+            "temperature": 0.3,
+            "max_tokens": 2000,
+            "timeout": 60,
+            "max_connections": 100,
+            "max_keepalive_connections": 50,
+            "rate_limit": {"requests_per_second": 0, "max_concurrency": 32}
+        }
+    
+    def get_connection_limits(self, api_base: str) -> Dict[str, Any]:
+        """
+        获取某个服务商地址的连接池配置
+        
+        同一地址的多个模型（如qwen与qwen_plus）共享连接池，取其中的最大值
+        """
+        limits = dict(self.default_connection_limits)
+        api_base = (api_base or "").rstrip("/")
+        matched = [config for config in self.models.values()
+                   if config.get("api_base", "").rstrip("/") == api_base]
+        
+        for key in ["max_connections", "max_keepalive_connections"]:
+            values = [config[key] for config in matched if key in config]
+            if values:
+                limits[key] = max(values)
+        
+        timeouts = [config["timeout"] for config in matched if "timeout" in config]
+        if timeouts:
+            limits["timeout"] = float(max(timeouts))
+        
+        return limits
+    
+    def get_rate_limit(self, model_key: str = None) -> Dict[str, Any]:
+        """获取模型的限流配置，未配置的项使用默认值"""
+        settings = dict(self.default_rate_limit)
+        settings.update(self.get_model_config(model_key).get("rate_limit", {}))
+        return settings
+    
+    def get_retry_policy(self, model_key: str = None) -> Dict[str, Any]:
+        """获取模型的重试与熔断配置，未配置的项使用默认值"""
+        policy = dict(self.default_retry_policy)
+        policy.update(self.get_model_config(model_key).get("retry", {}))
+        return policy
+    
+    def get_hedge_policy(self, model_key: str = None) -> Dict[str, Any]:
+        """获取模型的对冲配置，未配置的项使用默认值"""
+        policy = dict(self.default_hedge_policy)
+        policy.update(self.get_model_config(model_key).get("hedge", {}))
+        return policy
+    
     def get_available_models(self) -> Dict[str, Dict[str, Any]]:
         """获取所有可用模型"""
         return self.models
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP连接池管理器
+为每个服务商地址维护进程级共享的httpx客户端（同步/异步），复用TLS连接
+"""
+
+import threading
+from typing import Dict, Any
+
+# httpx是openai SDK的依赖，正常情况下一定可用
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+# 安装h2后启用HTTP/2，服务端不支持时会通过ALPN自动回落到HTTP/1.1
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+from src.config.fast_models_config import fast_models_config
+
+
+class HTTPClientPool:
+    """按服务商地址（base_url）共享的HTTP客户端池"""
+
+    def __init__(self):
+        """初始化客户端池"""
+        self._clients = {}
+        self._async_clients = {}
+        self._lock = threading.Lock()
+
+    def _normalize_base_url(self, base_url: str) -> str:
+        """规范化服务商地址作为池的键"""
+        return (base_url or "").rstrip("/")
+
+    def _client_options(self, base_url: str) -> Dict[str, Any]:
+        """根据配置生成客户端参数"""
+        limits_config = fast_models_config.get_connection_limits(base_url)
+        return {
+            "limits": httpx.Limits(
+                max_connections=limits_config["max_connections"],
+                max_keepalive_connections=limits_config["max_keepalive_connections"],
+                keepalive_expiry=limits_config["keepalive_expiry"]
+            ),
+            # 单次请求超时由模型客户端按请求设置，这里只作为兜底
+            "timeout": httpx.Timeout(limits_config["timeout"], connect=10.0),
+            "http2": HTTP2_AVAILABLE and limits_config["http2"]
+        }
+
+    def get_client(self, base_url: str):
+        """获取共享的同步客户端"""
+        key = self._normalize_base_url(base_url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.Client(**self._client_options(key))
+                self._clients[key] = client
+            return client
+
+    def get_async_client(self, base_url: str):
+        """
+        获取共享的异步客户端
+
+        异步连接与事件循环绑定，应在 PaperHelper_utils 的后台事件循环中使用
+        """
+        key = self._normalize_base_url(base_url)
+        with self._lock:
+            client = self._async_clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(**self._client_options(key))
+                self._async_clients[key] = client
+            return client
+
+    def client_kwargs(self, base_url: str) -> Dict[str, Any]:
+        """生成注入OpenAI兼容模型的客户端参数，httpx不可用时返回空字典"""
+        if not HTTPX_AVAILABLE or not base_url:
+            return {}
+        return {
+            "http_client": self.get_client(base_url),
+            "http_async_client": self.get_async_client(base_url)
+        }
+
+    def close_all(self):
+        """关闭所有同步客户端（异步客户端随进程退出释放）"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取客户端池信息"""
+        with self._lock:
+            return {
+                "http2": HTTP2_AVAILABLE,
+                "sync_clients": sorted(self._clients.keys()),
+                "async_clients": sorted(self._async_clients.keys())
+            }
+
+
+# 创建全局实例
+http_client_pool = HTTPClientPool()
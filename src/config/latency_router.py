@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+延迟感知的模型路由
+记录每个模型实际调用的首字延迟、总耗时和错误率，按质量档位选择当前最快的健康模型
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, List
+
+from src.config.fast_models_config import fast_models_config
+from src.config.retry_engine import retry_engine
+
+# 质量档位由低到高
+QUALITY_TIERS = ["basic", "standard", "high"]
+# 尚无实测数据时，按静态速度标签估计的耗时（秒）
+SPEED_PRIORS = {"极快": 3.0, "快": 6.0, "中": 10.0, "慢": 20.0}
+
+
+def _percentile(values: List[float], ratio: float) -> Optional[float]:
+    """计算分位数，无数据时返回None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+class _Measurement:
+    """一次调用的计时，用于 with 语句"""
+
+    def __init__(self, router: "LatencyRouter", model_key: str):
+        self._router = router
+        self._model_key = model_key
+        self._start = None
+        self._first_token_at = None
+
+    def first_token(self):
+        """标记收到首个输出块（流式调用）"""
+        if self._first_token_at is None:
+            self._first_token_at = time.perf_counter()
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        now = time.perf_counter()
+        if exc_type is None:
+            first_token_at = self._first_token_at or now
+            self._router.record(self._model_key, now - self._start, first_token_at - self._start, True)
+        elif issubclass(exc_type, Exception):
+            self._router.record(self._model_key, now - self._start, None, False)
+        # 取消、调用方中途放弃等不计入统计
+        return False
+
+
+class LatencyRouter:
+    """按模型统计实测延迟与错误率，并据此路由请求"""
+
+    def __init__(self, window_size: int = None, min_samples: int = 5, max_error_rate: float = 0.5,
+                 explore_rate: float = None):
+        """
+        初始化
+
+        Args:
+            window_size: 每个模型保留的最近调用数
+            min_samples: 样本数少于此值时使用静态速度标签估计
+            max_error_rate: 错误率超过此值的模型视为不健康
+            explore_rate: 随机选择其他健康模型的概率，使落后模型的数据保持更新
+        """
+        self.window_size = window_size or int(os.getenv("PAPERHELPER_ROUTER_WINDOW", 100))
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.explore_rate = explore_rate if explore_rate is not None else float(
+            os.getenv("PAPERHELPER_ROUTER_EXPLORE_RATE", 0.05))
+        # model_key -> deque[(timestamp, total, ttft, success)]
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def measure(self, model_key: str) -> _Measurement:
+        """返回计时上下文：正常结束记为成功，抛出异常记为失败"""
+        return _Measurement(self, model_key)
+
+    def record(self, model_key: str, total: float, ttft: Optional[float], success: bool):
+        """记录一次调用"""
+        with self._lock:
+            samples = self._samples.get(model_key)
+            if samples is None:
+                samples = deque(maxlen=self.window_size)
+                self._samples[model_key] = samples
+            samples.append((time.time(), total, ttft, success))
+
+    def get_model_stats(self, model_key: str) -> Dict[str, Any]:
+        """获取单个模型的实测统计"""
+        with self._lock:
+            samples = list(self._samples.get(model_key, ()))
+
+        successes = [s for s in samples if s[3]]
+        totals = [s[1] for s in successes]
+        ttfts = [s[2] for s in successes if s[2] is not None]
+        return {
+            "calls": len(samples),
+            "errors": len(samples) - len(successes),
+            "error_rate": (len(samples) - len(successes)) / len(samples) if samples else 0.0,
+            "ttft_p50": _percentile(ttfts, 0.5),
+            "ttft_p95": _percentile(ttfts, 0.95),
+            "total_p50": _percentile(totals, 0.5),
+            "total_p95": _percentile(totals, 0.95),
+            "last_call": samples[-1][0] if samples else None
+        }
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有已调用模型的实测统计"""
+        with self._lock:
+            model_keys = list(self._samples.keys())
+        return {model_key: self.get_model_stats(model_key) for model_key in model_keys}
+
+    def _is_available(self, model_key: str, model_config: Dict[str, Any], stats: Dict[str, Any]) -> bool:
+        """模型是否可用：API模型需配置密钥，本地模型需成功调用过"""
+        key_env = model_config.get("api_key_env")
+        if key_env:
+            return bool(os.getenv(key_env))
+        return stats["calls"] > stats["errors"]
+
+    def _is_healthy(self, model_key: str, stats: Dict[str, Any]) -> bool:
+        """熔断器未打开且近期错误率不过高"""
+        if retry_engine.get_breaker(model_key).get_stats()["state"] == "open":
+            return False
+        return stats["calls"] < self.min_samples or stats["error_rate"] <= self.max_error_rate
+
+    def is_routable(self, model_key: str) -> bool:
+        """模型当前是否可用且健康"""
+        stats = self.get_model_stats(model_key)
+        model_config = fast_models_config.get_model_config(model_key)
+        return self._is_available(model_key, model_config, stats) and self._is_healthy(model_key, stats)
+
+    def _expected_latency(self, model_config: Dict[str, Any], stats: Dict[str, Any], metric: str) -> float:
+        """预计耗时：样本充足时取P95（兼顾长尾），否则按静态速度标签估计"""
+        measured = stats[f"{metric}_p95"]
+        if measured is not None and stats["calls"] - stats["errors"] >= self.min_samples:
+            return measured
+        prior = SPEED_PRIORS.get(model_config.get("speed"), 10.0)
+        # 首字延迟通常远小于总耗时
+        return prior / 3 if metric == "ttft" else prior
+
+    def rank(self, quality_tier: str = "standard", metric: str = "total") -> List[str]:
+        """
+        按预计耗时排序满足质量档位的健康模型
+
+        Args:
+            quality_tier: 最低质量档位（basic/standard/high）
+            metric: 排序依据，"ttft" 首字延迟（流式场景）或 "total" 总耗时
+        """
+        min_rank = QUALITY_TIERS.index(quality_tier) if quality_tier in QUALITY_TIERS else 1
+        candidates = []
+        for model_key, model_config in fast_models_config.get_available_models().items():
+            tier = model_config.get("quality_tier", "standard")
+            if QUALITY_TIERS.index(tier) < min_rank:
+                continue
+            stats = self.get_model_stats(model_key)
+            if not self._is_available(model_key, model_config, stats) or not self._is_healthy(model_key, stats):
+                continue
+            candidates.append((self._expected_latency(model_config, stats, metric), model_key))
+        return [model_key for _, model_key in sorted(candidates)]
+
+    def choose(self, quality_tier: str = "standard", metric: str = "total") -> str:
+        """选择最快的健康模型，没有可用模型时返回默认模型"""
+        ranked = self.rank(quality_tier, metric)
+        if not ranked:
+            return fast_models_config.default_model
+        if len(ranked) > 1 and random.random() < self.explore_rate:
+            return random.choice(ranked[1:])
+        return ranked[0]
+
+
+# 创建全局实例
+latency_router = LatencyRouter()
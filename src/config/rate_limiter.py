@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型调用限流器
+按服务商地址 + 模型维护令牌桶和公平（先来先服务）的并发信号量，并统计排队深度与等待时间
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any
+
+from src.config.fast_models_config import fast_models_config
+from src.config import cancellation
+
+
+class RateLimitTimeout(Exception):
+    """排队等待超过上限"""
+
+
+class TokenBucket:
+    """令牌桶：按预约顺序分配令牌，先到的请求先获得发送时间"""
+
+    def __init__(self, rate: float, capacity: float):
+        """初始化，rate为每秒补充的令牌数，capacity为突发容量"""
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """预约一个令牌，返回需要等待的秒数（令牌可透支，后来者顺延）"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def refund(self):
+        """归还未使用的预约（排队超时或被取消时）"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class FairSemaphore:
+    """先来先服务的并发信号量，同步线程与异步协程共用同一个等待队列"""
+
+    def __init__(self, limit: int):
+        """初始化"""
+        self.limit = limit
+        self._active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _enqueue(self) -> Future:
+        """有空位且无人排队时直接获得，否则进入队尾"""
+        future = Future()
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                future.set_result(True)
+            else:
+                self._waiters.append(future)
+        return future
+
+    def _abandon(self, future: Future):
+        """放弃排队；若在放弃前刚好被分配到名额，则归还"""
+        with self._lock:
+            try:
+                self._waiters.remove(future)
+                return
+            except ValueError:
+                pass
+        if future.done() and not future.cancelled():
+            self.release()
+
+    def acquire(self, timeout: float = None):
+        """同步获取名额；当前取消令牌被取消时放弃排队并抛出 RequestCancelledError"""
+        future = self._enqueue()
+        token = cancellation.current_token()
+        remove = token.add_callback(future.cancel) if token is not None else None
+        try:
+            future.result(timeout=timeout)
+        except CancelledError:
+            self._abandon(future)
+            cancellation.check()
+            raise
+        except BaseException:
+            self._abandon(future)
+            raise
+        finally:
+            if remove is not None:
+                remove()
+
+    async def aacquire(self, timeout: float = None):
+        """异步获取名额，等待期间不阻塞事件循环"""
+        future = self._enqueue()
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except BaseException:
+            self._abandon(future)
+            raise
+
+    def release(self):
+        """释放名额，直接交给队首的等待者"""
+        with self._lock:
+            while self._waiters:
+                future = self._waiters.popleft()
+                if future.set_running_or_notify_cancel():
+                    future.set_result(True)
+                    return
+            self._active -= 1
+
+    @property
+    def active(self) -> int:
+        """正在执行的调用数"""
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        """排队中的调用数"""
+        return len(self._waiters)
+
+
+class ModelRateLimiter:
+    """单个模型的限流器：令牌桶控制速率，公平信号量控制并发"""
+
+    def __init__(self, name: str, requests_per_second: float, burst: int, max_concurrency: int,
+                 max_wait: float):
+        """初始化"""
+        self.name = name
+        self.max_wait = max_wait
+        self._bucket = TokenBucket(requests_per_second, burst)
+        self._semaphore = FairSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._recent_waits = deque(maxlen=200)
+        self._stats = {
+            "requests": 0,
+            "throttled": 0,
+            "timeouts": 0,
+            "max_queue_depth": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0
+        }
+        self.config = {
+            "requests_per_second": requests_per_second,
+            "burst": burst,
+            "max_concurrency": max_concurrency,
+            "max_wait": max_wait
+        }
+
+    def _enter_queue(self):
+        """记录进入排队"""
+        with self._lock:
+            self._waiting += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._waiting)
+
+    def _leave_queue(self, waited: float, acquired: bool):
+        """记录离开排队及等待时间"""
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                return
+            self._stats["requests"] += 1
+            self._stats["total_wait"] += waited
+            self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+            if waited > 0.01:
+                self._stats["throttled"] += 1
+            self._recent_waits.append(waited)
+
+    def _timeout_error(self) -> RateLimitTimeout:
+        """生成排队超时异常"""
+        with self._lock:
+            self._stats["timeouts"] += 1
+        return RateLimitTimeout(f"模型 {self.name} 排队超过 {self.max_wait:g} 秒")
+
+    @contextmanager
+    def limit(self):
+        """同步限流上下文"""
+        start = time.monotonic()
+        reserved = acquired = False
+        self._enter_queue()
+        try:
+            delay = self._bucket.reserve()
+            reserved = True
+            if delay > self.max_wait:
+                raise self._timeout_error()
+            if delay > 0:
+                cancellation.sleep(delay)
+            remaining = self.max_wait - (time.monotonic() - start)
+            try:
+                self._semaphore.acquire(timeout=max(remaining, 0))
+            except FutureTimeoutError:
+                raise self._timeout_error()
+            acquired = True
+        finally:
+            if reserved and not acquired:
+                # 排队超时或被取消，请求没有发出，归还预留的令牌
+                self._bucket.refund()
+            self._leave_queue(time.monotonic() - start, acquired)
+
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def alimit(self):
+        """异步限流上下文"""
+        start = time.monotonic()
+        reserved = acquired = False
+        self._enter_queue()
+        try:
+            delay = self._bucket.reserve()
+            reserved = True
+            if delay > self.max_wait:
+                raise self._timeout_error()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            remaining = self.max_wait - (time.monotonic() - start)
+            try:
+                await self._semaphore.aacquire(timeout=max(remaining, 0))
+            except asyncio.TimeoutError:
+                raise self._timeout_error()
+            acquired = True
+        finally:
+            if reserved and not acquired:
+                # 排队超时或任务被取消，请求没有发出，归还预留的令牌
+                self._bucket.refund()
+            self._leave_queue(time.monotonic() - start, acquired)
+
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取排队与等待统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            waits = sorted(self._recent_waits)
+            stats.update({
+                "queue_depth": self._waiting,
+                "in_flight": self._semaphore.active,
+                "avg_wait": stats["total_wait"] / stats["requests"] if stats["requests"] else 0.0,
+                "p95_wait": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                "config": dict(self.config)
+            })
+            return stats
+
+
+class RateLimiterRegistry:
+    """按服务商地址 + 模型名管理限流器，同一模型的不同温度/参数共享限额"""
+
+    def __init__(self):
+        """初始化"""
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_key: str = None) -> ModelRateLimiter:
+        """获取模型对应的限流器"""
+        model_config = fast_models_config.get_model_config(model_key)
+        limiter_key = f"{model_config.get('api_base', '').rstrip('/')}#{model_config.get('model_name', model_key)}"
+        with self._lock:
+            limiter = self._limiters.get(limiter_key)
+            if limiter is None:
+                settings = fast_models_config.get_rate_limit(model_key)
+                limiter = ModelRateLimiter(
+                    model_config.get("model_name", model_key),
+                    settings["requests_per_second"],
+                    settings["burst"],
+                    settings["max_concurrency"],
+                    settings["max_wait"]
+                )
+                self._limiters[limiter_key] = limiter
+            return limiter
+
+    def limit(self, model_key: str = None):
+        """同步限流上下文"""
+        return self.get(model_key).limit()
+
+    def alimit(self, model_key: str = None):
+        """异步限流上下文"""
+        return self.get(model_key).alimit()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有限流器的统计"""
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {limiter.name: limiter.get_stats() for limiter in limiters.values()}
+
+
+# 创建全局实例
+rate_limiter = RateLimiterRegistry()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对冲请求（hedged requests）
+主模型在自适应阈值内仍未输出首字时，向备用模型发出相同请求，先输出者胜出，另一方被取消
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, AsyncIterator
+
+from src.config.fast_models_config import fast_models_config
+from src.config.latency_router import latency_router
+
+
+class RequestHedger:
+    """按模型配置选择备用模型，统计对冲比例与额外开销"""
+
+    def __init__(self, enabled: bool = None):
+        """初始化，默认通过 PAPERHELPER_HEDGING=1 开启"""
+        if enabled is None:
+            enabled = os.getenv("PAPERHELPER_HEDGING", "0") == "1"
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "cancelled": 0,
+            "failed": 0,
+            "extra_chars": 0,
+            "total_chars": 0
+        }
+        self._last_thresholds = {}
+
+    def set_enabled(self, enabled: bool):
+        """开启/关闭对冲"""
+        self.enabled = enabled
+
+    def _count(self, key: str, amount: int = 1):
+        """累加统计"""
+        with self._lock:
+            self._stats[key] += amount
+
+    def threshold(self, model_key: str) -> float:
+        """
+        计算触发对冲的等待秒数
+
+        取主模型实测首字延迟的分位数乘以系数，并限制在配置的上下限内；样本不足时使用默认值
+        """
+        policy = fast_models_config.get_hedge_policy(model_key)
+        stats = latency_router.get_model_stats(model_key)
+        measured = stats.get(f"ttft_{policy['percentile']}")
+        if measured is None or stats["calls"] - stats["errors"] < policy["min_samples"]:
+            delay = policy["default_delay"]
+        else:
+            delay = min(max(measured * policy["multiplier"], policy["min_delay"]), policy["max_delay"])
+        with self._lock:
+            self._last_thresholds[model_key] = delay
+        return delay
+
+    def secondary_for(self, model_key: str) -> Optional[str]:
+        """选择第一个可用且健康的备用模型，没有时返回None"""
+        candidates = fast_models_config.get_hedge_policy(model_key)["secondary_models"]
+        for candidate in candidates:
+            if candidate != model_key and latency_router.is_routable(candidate):
+                return candidate
+        return None
+
+    async def astream(self, primary_key: str, make_stream: Callable[[str], AsyncIterator[str]]):
+        """
+        对冲流式调用，逐块产出胜出方的文本
+
+        Args:
+            primary_key: 主模型键
+            make_stream: 根据模型键创建文本流的函数
+        """
+        self._count("requests")
+        secondary_key = self.secondary_for(primary_key) if self.enabled else None
+        if secondary_key is None:
+            async for text in make_stream(primary_key):
+                yield text
+            return
+
+        start = time.perf_counter()
+        legs = {primary_key: self._start_leg(make_stream(primary_key))}
+        try:
+            done, _ = await asyncio.wait({legs[primary_key][1]}, timeout=self.threshold(primary_key))
+            # 主模型在阈值内输出首字则不对冲；主模型提前失败时立即改用备用模型
+            if done and not legs[primary_key][1].exception():
+                winner_key = primary_key
+            else:
+                self._count("hedged")
+                legs[secondary_key] = self._start_leg(make_stream(secondary_key))
+                winner_key = await self._first_success(legs, primary_key)
+        except BaseException:
+            # 调用方被取消或全部失败：asyncio.wait 不会取消子任务，需自行关闭每一路的连接
+            for iterator, task in legs.values():
+                await self._cancel_leg(iterator, task)
+            raise
+
+        winner_iterator, winner_task = legs.pop(winner_key)
+        loser_chars = 0
+        for loser_key, (loser_iterator, loser_task) in legs.items():
+            still_waiting = not loser_task.done()
+            if not still_waiting and not loser_task.cancelled() and loser_task.exception() is None:
+                # 落败方已输出的首块
+                loser_chars += len(loser_task.result())
+            await self._cancel_leg(loser_iterator, loser_task)
+            if not still_waiting:
+                continue
+            self._count("cancelled")
+            if loser_key == primary_key:
+                # 主模型首字前被放弃记为一次超时（失败），卡顿的模型错误率随之上升
+                latency_router.record(primary_key, time.perf_counter() - start, None, False)
+
+        self._count("hedge_wins" if winner_key != primary_key else "primary_wins")
+        hedged = len(legs) > 0
+        try:
+            text = winner_task.result()
+            yield text
+            chars = len(text)
+            async for text in winner_iterator:
+                chars += len(text)
+                yield text
+        finally:
+            await winner_iterator.aclose()
+        self._count("total_chars", chars)
+        if hedged:
+            # 额外开销按落败方被取消前实际输出的字数计算（首字前被取消的一路为0）
+            self._count("extra_chars", loser_chars)
+
+    def _start_leg(self, iterator: AsyncIterator[str]):
+        """开始一路请求，返回 (迭代器, 获取首块的任务)"""
+        return iterator, asyncio.ensure_future(iterator.__anext__())
+
+    async def _first_success(self, legs: Dict[str, Any], primary_key: str) -> str:
+        """等待最先成功输出首块的一路；全部失败时抛出主模型的错误"""
+        pending = {task: key for key, (_, task) in legs.items()}
+        while pending:
+            done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                key = pending.pop(task)
+                if not task.exception():
+                    return key
+
+        self._count("failed")
+        error = legs[primary_key][1].exception()
+        raise error if not isinstance(error, StopAsyncIteration) else RuntimeError("模型未返回任何内容")
+
+    async def _cancel_leg(self, iterator: AsyncIterator[str], task: asyncio.Future):
+        """取消落败的一路并关闭其连接"""
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await iterator.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取对冲统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["thresholds"] = dict(self._last_thresholds)
+        stats["enabled"] = self.enabled
+        stats["hedge_rate"] = stats["hedged"] / stats["requests"] if stats["requests"] else 0.0
+        # 额外开销：对冲产生的输出量占全部输出量的比例
+        stats["extra_cost_ratio"] = stats["extra_chars"] / stats["total_chars"] if stats["total_chars"] else 0.0
+        return stats
+
+
+# 创建全局实例
+request_hedger = RequestHedger()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型调用重试引擎
+按错误类型决定是否重试，遵循服务端的 Retry-After 提示，并为每个模型维护熔断器
+"""
+
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+
+from src.config.fast_models_config import fast_models_config
+from src.config.telemetry import telemetry
+from src.config import cancellation
+
+# 可重试的HTTP状态码：请求超时、冲突、限流、服务端错误
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# 网络层的瞬时错误（按类名匹配，避免在此导入openai/httpx）
+TRANSIENT_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError", "InternalServerError", "RateLimitError",
+    "ConnectError", "ConnectTimeout", "ReadError", "ReadTimeout", "WriteTimeout",
+    "PoolTimeout", "RemoteProtocolError", "TimeoutException", "NetworkError"
+}
+
+def _blocking() -> bool:
+    """同步重试的等待是否无法取消（没有取消令牌时会一直占用调用线程，如Streamlit脚本线程）"""
+    return cancellation.current_token() is None
+
+
+# 熔断器状态
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，调用被快速拒绝"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"模型 {name} 暂时不可用（熔断中），约 {retry_in:.0f} 秒后重试")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """提取异常中的HTTP状态码"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """解析服务端的 Retry-After / retry-after-ms 响应头（秒）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    try:
+        value = headers.get("retry-after-ms")
+        if value:
+            return max(float(value) / 1000, 0.0)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            # HTTP日期格式
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def classify_error(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """
+    判断错误是否值得重试
+
+    Returns:
+        (是否可重试, 服务端建议的等待秒数)
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES, _retry_after(error)
+
+    for cls in type(error).__mro__:
+        if cls.__name__ in TRANSIENT_ERROR_NAMES:
+            return True, _retry_after(error)
+
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True, None
+
+    # 参数错误、鉴权失败、排队超时等，重试也无济于事
+    return False, None
+
+
+class CircuitBreaker:
+    """单个模型的熔断器：连续失败达到阈值后打开，冷却后放行少量探测请求"""
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float, half_open_max_calls: int):
+        """初始化"""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _refresh_state(self):
+        """冷却时间到后转为半开（调用方需持有锁）"""
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = STATE_HALF_OPEN
+            self._half_open_calls = 0
+
+    def before_call(self):
+        """调用前检查，熔断时抛出 CircuitOpenError"""
+        with self._lock:
+            self._refresh_state()
+            if self._state == STATE_OPEN:
+                self._stats["rejected"] += 1
+                raise CircuitOpenError(self.name, self.recovery_timeout - (time.monotonic() - self._opened_at))
+            if self._state == STATE_HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, 1)
+                self._half_open_calls += 1
+
+    def record_success(self):
+        """记录成功，半开状态下恢复为关闭"""
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            self._state = STATE_CLOSED
+
+    def record_failure(self):
+        """记录可归因于服务端的失败"""
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != STATE_OPEN:
+                    self._stats["opened"] += 1
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+
+    def record_ignored(self):
+        """调用未能得出结论（如被取消或请求本身有误），释放半开探测名额"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取熔断器状态"""
+        with self._lock:
+            self._refresh_state()
+            stats = dict(self._stats)
+            stats.update({
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "retry_in": max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0)
+                if self._state == STATE_OPEN else 0.0
+            })
+            return stats
+
+
+class RetryEngine:
+    """按模型管理重试策略与熔断器"""
+
+    def __init__(self):
+        """初始化"""
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._stats = {"retries": 0, "gave_up": 0, "non_retryable": 0}
+
+    def get_breaker(self, model_key: str = None) -> CircuitBreaker:
+        """获取模型对应的熔断器（同一服务商地址 + 模型名共享）"""
+        model_config = fast_models_config.get_model_config(model_key)
+        breaker_key = f"{model_config.get('api_base', '').rstrip('/')}#{model_config.get('model_name', model_key)}"
+        with self._lock:
+            breaker = self._breakers.get(breaker_key)
+            if breaker is None:
+                policy = fast_models_config.get_retry_policy(model_key)
+                breaker = CircuitBreaker(
+                    model_config.get("model_name", model_key),
+                    policy["failure_threshold"],
+                    policy["recovery_timeout"],
+                    policy["half_open_max_calls"]
+                )
+                self._breakers[breaker_key] = breaker
+            return breaker
+
+    def _count(self, key: str):
+        """累加统计"""
+        with self._lock:
+            self._stats[key] += 1
+
+    def _next_delay(self, model_key: str, error: BaseException, attempt: int,
+                    policy: Dict[str, Any], blocking: bool = False) -> Optional[float]:
+        """
+        计算下一次重试前的等待秒数，不应重试时返回None
+
+        服务端给出 Retry-After 时以其为准，否则使用带完全抖动的指数退避；
+        blocking 为True（同步等待且没有取消令牌）时等待不超过 max_blocking_wait，要求等待更久则直接失败
+        """
+        max_wait = policy["max_blocking_wait"] if blocking else policy["max_retry_after"]
+        retryable, retry_after = classify_error(error)
+        if not retryable:
+            self._count("non_retryable")
+            return None
+        if attempt >= policy["max_attempts"]:
+            self._count("gave_up")
+            return None
+        if retry_after is not None:
+            if retry_after > max_wait:
+                # 服务端要求等待过久，直接失败交给降级逻辑
+                self._count("gave_up")
+                return None
+            delay = retry_after
+        else:
+            delay = random.uniform(0, min(policy["max_delay"], max_wait, policy["base_delay"] * (2 ** (attempt - 1))))
+        self._count("retries")
+        telemetry.record_retry(model_key)
+        return delay
+
+    def _record(self, breaker: CircuitBreaker, error: BaseException):
+        """按错误类型更新熔断器"""
+        retryable, _ = classify_error(error)
+        if retryable:
+            breaker.record_failure()
+        else:
+            breaker.record_ignored()
+
+    def call(self, model_key: str, func, label: str = "模型调用"):
+        """
+        同步调用，失败时按策略重试
+
+        Args:
+            model_key: 模型键，用于选择策略与熔断器
+            func: 无参调用函数
+            label: 日志中使用的调用名称
+        """
+        policy = fast_models_config.get_retry_policy(model_key)
+        breaker = self.get_breaker(model_key)
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.before_call()
+            try:
+                result = func()
+            except Exception as e:
+                self._record(breaker, e)
+                delay = self._next_delay(model_key, e, attempt, policy, _blocking())
+                if delay is None:
+                    raise
+                print(f"{label}失败，{delay:.1f}秒后重试... (尝试 {attempt}/{policy['max_attempts']}): {str(e)}")
+                cancellation.sleep(delay)
+                continue
+            except BaseException:
+                breaker.record_ignored()
+                raise
+            breaker.record_success()
+            return result
+
+    async def acall(self, model_key: str, coro_func, label: str = "模型调用"):
+        """异步调用，退避等待期间不阻塞事件循环"""
+        policy = fast_models_config.get_retry_policy(model_key)
+        breaker = self.get_breaker(model_key)
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.before_call()
+            try:
+                result = await coro_func()
+            except asyncio.CancelledError:
+                breaker.record_ignored()
+                raise
+            except Exception as e:
+                self._record(breaker, e)
+                delay = self._next_delay(model_key, e, attempt, policy)
+                if delay is None:
+                    raise
+                print(f"{label}失败，{delay:.1f}秒后重试... (尝试 {attempt}/{policy['max_attempts']}): {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.record_ignored()
+                raise
+            breaker.record_success()
+            return result
+
+    def stream(self, model_key: str, stream_func, label: str = "模型调用"):
+        """
+        流式调用：尚未产出内容前失败可重试，已开始输出后失败直接抛出
+
+        Args:
+            model_key: 模型键
+            stream_func: 无参函数，返回逐块产出的迭代器
+            label: 日志中使用的调用名称
+        """
+        policy = fast_models_config.get_retry_policy(model_key)
+        breaker = self.get_breaker(model_key)
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.before_call()
+            started = False
+            iterator = stream_func()
+            try:
+                for item in iterator:
+                    started = True
+                    yield item
+            except Exception as e:
+                self._record(breaker, e)
+                delay = None if started else self._next_delay(model_key, e, attempt, policy, _blocking())
+                if delay is None:
+                    raise
+                print(f"{label}失败，{delay:.1f}秒后重试... (尝试 {attempt}/{policy['max_attempts']}): {str(e)}")
+                cancellation.sleep(delay)
+                continue
+            except BaseException:
+                breaker.record_ignored()
+                raise
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+            breaker.record_success()
+            return
+
+    async def astream(self, model_key: str, stream_func, label: str = "模型调用"):
+        """流式调用 - 异步版：尚未产出内容前失败可重试，退避等待期间不阻塞事件循环"""
+        policy = fast_models_config.get_retry_policy(model_key)
+        breaker = self.get_breaker(model_key)
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.before_call()
+            started = False
+            iterator = stream_func()
+            try:
+                async for item in iterator:
+                    started = True
+                    yield item
+            except asyncio.CancelledError:
+                breaker.record_ignored()
+                raise
+            except Exception as e:
+                self._record(breaker, e)
+                delay = None if started else self._next_delay(model_key, e, attempt, policy)
+                if delay is None:
+                    raise
+                print(f"{label}失败，{delay:.1f}秒后重试... (尝试 {attempt}/{policy['max_attempts']}): {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.record_ignored()
+                raise
+            finally:
+                await iterator.aclose()
+            breaker.record_success()
+            return
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重试统计与各模型熔断器状态"""
+        with self._lock:
+            stats = dict(self._stats)
+            breakers = list(self._breakers.values())
+        stats["breakers"] = {breaker.name: breaker.get_stats() for breaker in breakers}
+        return stats
+
+
+# 创建全局实例
+retry_engine = RetryEngine()
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标与链路追踪
+记录每次模型调用的耗时、token用量、模型、缓存命中、重试与错误，以及文档处理各阶段耗时；
+指标以Prometheus文本格式通过HTTP端点或文件导出；设置 PAPERHELPER_TRACE_PATH 后，
+嵌套的调用链（span）由后台线程批量写入该JSONL文件
+"""
+
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+# 调用链批量写出的间隔（秒）与触发提前写出的积压条数
+TRACE_FLUSH_INTERVAL = 1.0
+TRACE_FLUSH_BATCH = 256
+# /metrics 端点默认只监听本机（环境变量 PAPERHELPER_METRICS_HOST）
+DEFAULT_METRICS_HOST = "127.0.0.1"
+# 调用链文件超过此大小时轮转为 .1
+DEFAULT_TRACE_MAX_BYTES = 50 * 1024 * 1024
+# 耗时直方图的分桶（秒）
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+# 指标说明，同时决定导出类型
+METRICS = {
+    "paperhelper_span_duration_seconds": ("histogram", "各函数及文档处理阶段的耗时"),
+    "paperhelper_span_errors_total": ("counter", "各函数及文档处理阶段的错误次数"),
+    "paperhelper_llm_requests_total": ("counter", "模型调用次数（按模型与结果）"),
+    "paperhelper_llm_latency_seconds": ("histogram", "模型调用总耗时（含排队与重试）"),
+    "paperhelper_llm_ttft_seconds": ("histogram", "流式模型调用的首字延迟"),
+    "paperhelper_llm_tokens_total": ("counter", "模型调用的token用量（prompt/completion）"),
+    "paperhelper_llm_retries_total": ("counter", "模型调用的重试次数"),
+    "paperhelper_cache_requests_total": ("counter", "结果缓存查询次数（hit/miss）"),
+    "paperhelper_structured_output_total": ("counter", "结构化输出校验结果（valid/repaired/invalid）"),
+    "paperhelper_snapshot_reads_total": ("counter", "共享快照读取次数（fresh/stale/miss）"),
+    "paperhelper_annotation_paragraphs_total": ("counter", "增量批注的段落数（reannotated/reused）"),
+    "paperhelper_jobs_total": ("counter", "后台任务数（按类型与状态）"),
+    "paperhelper_cancellations_total": ("counter", "被取消的请求令牌数（按用途与原因）"),
+    "paperhelper_job_duration_seconds": ("histogram", "后台任务从提交到结束的耗时")
+}
+
+# 当前span，随协程与线程上下文传递
+_current_span = contextvars.ContextVar("paperhelper_current_span", default=None)
+
+
+def _escape_label(value) -> str:
+    """转义Prometheus标签值"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels, extra: str = "") -> str:
+    """格式化标签"""
+    parts = [f'{key}="{_escape_label(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Span:
+    """一段被计时的操作"""
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        """初始化"""
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.error = None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        """设置属性"""
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: float = 1):
+        """累加数值属性"""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def elapsed(self) -> float:
+        """已持续的秒数"""
+        return time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为JSON记录"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time,
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class Telemetry:
+    """进程级指标注册表与调用链导出器"""
+
+    def __init__(self, enabled: bool = None, trace_path: str = None):
+        """
+        初始化
+
+        Args:
+            enabled: 是否启用，默认通过 PAPERHELPER_TELEMETRY=0 关闭
+            trace_path: 调用链JSONL文件，默认读取 PAPERHELPER_TRACE_PATH，未设置或为空时不写文件
+        """
+        if enabled is None:
+            enabled = os.getenv("PAPERHELPER_TELEMETRY", "1") == "1"
+        self.enabled = enabled
+        self.trace_path = trace_path if trace_path is not None else os.getenv("PAPERHELPER_TRACE_PATH", "")
+        self.trace_max_bytes = int(os.getenv("PAPERHELPER_TRACE_MAX_BYTES", DEFAULT_TRACE_MAX_BYTES))
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._trace_file = None
+        self._trace_buffer = []
+        self._trace_lock = threading.Lock()
+        self._trace_flush = threading.Lock()
+        self._trace_wakeup = threading.Event()
+        self._trace_writer = None
+        self._exporters_started = False
+
+    # ---- 指标 ----
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """累加计数器"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        """记录一次直方图观测值"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+                self._histograms[key] = histogram
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render_prometheus(self) -> str:
+        """导出Prometheus文本格式"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                          for key, h in self._histograms.items()}
+
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            series = counters if metric_type == "counter" else histograms
+            entries = sorted((labels, value) for (metric, labels), value in series.items() if metric == name)
+            if not entries:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in entries:
+                if metric_type == "counter":
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, value["buckets"]):
+                    bucket_labels = _format_labels(labels, 'le="%g"' % bound)
+                    lines.append(f"{name}_bucket{bucket_labels} {count}")
+                bucket_labels = _format_labels(labels, 'le="+Inf"')
+                lines.append(f"{name}_bucket{bucket_labels} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    # ---- 调用链 ----
+
+    def current_span(self) -> Optional[Span]:
+        """当前span，不在任何span内时返回None"""
+        return _current_span.get()
+
+    def set_attributes(self, **attributes):
+        """为当前span设置属性"""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def record_error(self, error: BaseException):
+        """
+        记录被调用方捕获并降级处理的错误
+
+        函数内部捕获异常后返回默认结果时，span本身会正常结束，需显式标记
+        """
+        span = _current_span.get()
+        if span is None:
+            return
+        span.status = "error"
+        span.error = f"{type(error).__name__}: {error}"
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """计时一段操作，嵌套调用自动形成父子关系"""
+        if not self.enabled:
+            yield Span(name, None, attributes)
+            return
+
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self._mark_failed(span, e)
+            raise
+        finally:
+            span.duration = span.elapsed()
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # 生成器在其他上下文中被关闭
+                pass
+            self._finish(span)
+
+    @staticmethod
+    def _mark_failed(span: Span, error: BaseException):
+        """按异常类型标记span状态"""
+        if isinstance(error, Exception):
+            span.status = "error"
+            span.error = f"{type(error).__name__}: {error}"
+        else:
+            # 取消、调用方中途放弃等
+            span.status = "cancelled"
+
+    def _traced_generator(self, name: str, generator):
+        """
+        为生成器创建span
+
+        只在生成器每次恢复执行期间将其设为当前span，两次产出之间调用方的当前span不受影响，
+        生成器被放弃后在其他上下文中关闭也不会留下错误的当前span
+        """
+        if not self.enabled:
+            return (yield from generator)
+
+        span = Span(name, _current_span.get(), {})
+
+        def step(method, *args):
+            token = _current_span.set(span)
+            try:
+                return method(*args)
+            finally:
+                _current_span.reset(token)
+
+        method, args = generator.send, (None,)
+        try:
+            while True:
+                try:
+                    chunk = step(method, *args)
+                except StopIteration as stop:
+                    return stop.value
+                try:
+                    method, args = generator.send, ((yield chunk),)
+                except GeneratorExit:
+                    raise
+                except BaseException as e:
+                    method, args = generator.throw, (e,)
+        except BaseException as e:
+            self._mark_failed(span, e)
+            raise
+        finally:
+            step(generator.close)
+            span.duration = span.elapsed()
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        """记录span指标并写出调用链"""
+        self.observe("paperhelper_span_duration_seconds", span.duration, span=span.name)
+        if span.status == "error":
+            self.inc("paperhelper_span_errors_total", span=span.name)
+        self._export_span(span)
+
+    def _export_span(self, span: Span):
+        """将span放入写出缓冲区，由后台线程批量写入调用链文件"""
+        if not self.trace_path:
+            return
+        record = span.to_dict()
+        record["attributes"] = dict(record["attributes"])
+        with self._trace_lock:
+            self._trace_buffer.append(record)
+            backlog = len(self._trace_buffer)
+            if self._trace_writer is None:
+                self._trace_writer = threading.Thread(target=self._trace_writer_loop,
+                                                      name="paperhelper-trace-writer", daemon=True)
+                self._trace_writer.start()
+                atexit.register(self.flush_traces)
+        if backlog >= TRACE_FLUSH_BATCH:
+            self._trace_wakeup.set()
+
+    def flush_traces(self):
+        """立即写出缓冲区中的调用链（超过大小上限时轮转）"""
+        with self._trace_flush:
+            with self._trace_lock:
+                records, self._trace_buffer = self._trace_buffer, []
+            if not records or not self.trace_path:
+                return
+            try:
+                if self._trace_file is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.trace_path)), exist_ok=True)
+                    self._trace_file = open(self.trace_path, "a", encoding="utf-8")
+                self._trace_file.writelines(json.dumps(record, ensure_ascii=False, default=str) + "\n"
+                                            for record in records)
+                self._trace_file.flush()
+                if self._trace_file.tell() > self.trace_max_bytes:
+                    self._trace_file.close()
+                    self._trace_file = None
+                    os.replace(self.trace_path, self.trace_path + ".1")
+            except OSError as e:
+                print(f"写入调用链文件失败，已停止写入: {str(e)}")
+                self.trace_path = ""
+
+    def _trace_writer_loop(self):
+        """定期批量写出调用链"""
+        while True:
+            self._trace_wakeup.wait(TRACE_FLUSH_INTERVAL)
+            self._trace_wakeup.clear()
+            self.flush_traces()
+
+    def traced(self, name: str = None):
+        """
+        装饰器：为函数（同步、异步或生成器）创建span
+
+        Args:
+            name: span名称，默认使用函数名
+        """
+        def decorator(func):
+            span_name = name or func.__name__
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            if inspect.isgeneratorfunction(func):
+                @functools.wraps(func)
+                def generator_wrapper(*args, **kwargs):
+                    return (yield from self._traced_generator(span_name, func(*args, **kwargs)))
+                return generator_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def bind(self, coro):
+        """让提交到后台事件循环的协程沿用调用方的当前span"""
+        parent = _current_span.get()
+        if parent is None or not self.enabled:
+            return coro
+
+        async def bound():
+            _current_span.set(parent)
+            return await coro
+        return bound()
+
+    # ---- 模型调用 ----
+
+    @contextmanager
+    def llm_call(self, model: str, mode: str, function: str = None):
+        """
+        计时一次模型调用（含排队与重试），结束时按span属性记录指标
+
+        调用方可在span上设置 prompt_tokens、completion_tokens、ttft
+        """
+        parent = _current_span.get()
+        function = function or (parent.name if parent else "unknown")
+        with self.span(f"llm.{mode}", model=model, function=function) as span:
+            status = "cancelled"
+            try:
+                yield span
+                status = "ok"
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                self.inc("paperhelper_llm_requests_total", model=model, status=status)
+                self.observe("paperhelper_llm_latency_seconds", span.elapsed(), model=model)
+                if span.attributes.get("ttft") is not None:
+                    self.observe("paperhelper_llm_ttft_seconds", span.attributes["ttft"], model=model)
+                for kind in ("prompt", "completion"):
+                    tokens = span.attributes.get(f"{kind}_tokens")
+                    if tokens:
+                        self.inc("paperhelper_llm_tokens_total", tokens, model=model, kind=kind)
+
+    def record_retry(self, model: str):
+        """记录一次重试"""
+        self.inc("paperhelper_llm_retries_total", model=model)
+        span = _current_span.get()
+        if span is not None:
+            span.add("retries")
+
+    def record_cache(self, result: str):
+        """记录一次缓存查询结果（hit/miss），按当前函数归类"""
+        span = _current_span.get()
+        self.inc("paperhelper_cache_requests_total", function=span.name if span else "unknown", result=result)
+        if span is not None:
+            span.set(cache=result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """汇总模型调用统计（侧边栏展示用）"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+
+        stats = {"llm_requests": 0, "llm_errors": 0, "llm_cancelled": 0, "cancellations": 0, "prompt_tokens": 0,
+                 "completion_tokens": 0, "retries": 0, "cache_hits": 0, "cache_misses": 0}
+        for (name, labels), value in counters.items():
+            labels = dict(labels)
+            if name == "paperhelper_llm_requests_total":
+                stats["llm_requests"] += value
+                if labels.get("status") == "error":
+                    stats["llm_errors"] += value
+                elif labels.get("status") == "cancelled":
+                    stats["llm_cancelled"] += value
+            elif name == "paperhelper_llm_tokens_total":
+                stats[f"{labels['kind']}_tokens"] += value
+            elif name == "paperhelper_llm_retries_total":
+                stats["retries"] += value
+            elif name == "paperhelper_cancellations_total":
+                stats["cancellations"] += value
+            elif name == "paperhelper_cache_requests_total":
+                stats["cache_hits" if labels.get("result") == "hit" else "cache_misses"] += value
+
+        latency = [h for (name, _), h in histograms.items() if name == "paperhelper_llm_latency_seconds"]
+        count = sum(h["count"] for h in latency)
+        stats["avg_llm_latency"] = sum(h["sum"] for h in latency) / count if count else 0.0
+        stats["trace_path"] = self.trace_path
+        return stats
+
+    # ---- 导出 ----
+
+    def start_exporters(self):
+        """
+        按环境变量启动指标导出（多次调用只生效一次，适应Streamlit脚本重复执行）
+
+        PAPERHELPER_METRICS_PORT: 在该端口提供 /metrics HTTP端点（监听地址 PAPERHELPER_METRICS_HOST，默认仅本机）
+        PAPERHELPER_METRICS_FILE: 定期写入指标文件（可配合node_exporter的textfile收集器），
+        间隔由 PAPERHELPER_METRICS_INTERVAL 指定（秒）
+        """
+        with self._lock:
+            if self._exporters_started or not self.enabled:
+                return
+            self._exporters_started = True
+
+        port = os.getenv("PAPERHELPER_METRICS_PORT")
+        if port:
+            self._start_http_exporter(int(port), os.getenv("PAPERHELPER_METRICS_HOST", DEFAULT_METRICS_HOST))
+
+        metrics_file = os.getenv("PAPERHELPER_METRICS_FILE")
+        if metrics_file:
+            interval = float(os.getenv("PAPERHELPER_METRICS_INTERVAL", 15))
+            threading.Thread(target=self._file_exporter_loop, args=(metrics_file, interval),
+                             name="paperhelper-metrics-file", daemon=True).start()
+
+    def _start_http_exporter(self, port: int, host: str = DEFAULT_METRICS_HOST):
+        """启动 /metrics HTTP端点"""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"指标端点启动失败（{host}:{port}）: {str(e)}")
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="paperhelper-metrics-http", daemon=True).start()
+
+    def write_metrics_file(self, path: str):
+        """原子地写出一次指标文件"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(temp_path, path)
+
+    def _file_exporter_loop(self, path: str, interval: float):
+        """定期写出指标文件"""
+        while True:
+            try:
+                self.write_metrics_file(path)
+            except OSError as e:
+                print(f"写入指标文件失败: {str(e)}")
+            time.sleep(interval)
+
+
+# 创建全局实例
+telemetry = Telemetry()
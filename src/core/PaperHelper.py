@@ -1,12 +1,32 @@
 import streamlit as st
 import os
+import uuid
+import hashlib
+import concurrent.futures
 from src.utils.PaperHelper_utils import (
     generate_paper, 
     topic_diagnosis, 
     get_research_trends,
     analyze_topic_feasibility,
-    intelligent_annotation
+    submit_topic_analysis,
+    get_title_advice,
+    submit_annotation_job,
+    submit_format_correction_job,
+    get_job,
+    stream_job,
+    cancel_job,
+    get_job_stats,
+    stream_topic_diagnosis,
+    get_cache_stats,
+    get_rate_limit_stats,
+    get_retry_stats,
+    get_latency_stats,
+    get_hedge_stats,
+    get_prompt_stats,
+    set_hedging
 )
+from src.config.telemetry import telemetry
+from src.config import cancellation
 # 尝试导入简化版文档处理器
 try:
     from src.modules.document_processor_simple import document_processor
@@ -65,21 +85,45 @@ with st.sidebar:
         model_options = list(available_models.keys())
         model_names = [available_models[key]["name"] for key in model_options]
         
+        # 各模型实测延迟
+        latency_stats = get_latency_stats()
+        
+        def format_latency(model_key):
+            """实测延迟摘要，尚无数据时显示静态速度标签"""
+            stats = latency_stats.get(model_key)
+            if not stats or stats['total_p50'] is None:
+                return f"未测量 · {available_models[model_key]['speed']}"
+            return (f"首字 P50 {stats['ttft_p50']:.1f}s / P95 {stats['ttft_p95']:.1f}s · "
+                    f"总耗时 P50 {stats['total_p50']:.1f}s / P95 {stats['total_p95']:.1f}s · "
+                    f"错误 {stats['error_rate'] * 100:.0f}%")
+        
+        # 自动路由
+        auto_route = st.toggle(
+            "⚡ 自动选择最快模型",
+            value=fast_llm_manager.auto_route,
+            help="按实测延迟和错误率，为每个请求选择满足质量要求的最快健康模型"
+        )
+        if auto_route != fast_llm_manager.auto_route:
+            fast_llm_manager.set_auto_route(auto_route)
+        
         # 当前模型信息
         current_model_info = fast_llm_manager.get_current_model_info()
-        if "error" not in current_model_info:
+        if auto_route:
+            st.info("当前模型: 自动路由")
+        elif "error" not in current_model_info:
             st.info(f"当前模型: {current_model_info['name']}")
-            st.caption(f"速度: {current_model_info['speed']} | 成本: {current_model_info['cost']}")
+            st.caption(f"{format_latency(current_model_info['model'])} | 成本: {current_model_info['cost']}")
         
         # 模型选择
         selected_model_index = st.selectbox(
             "选择模型：",
             range(len(model_options)),
-            format_func=lambda x: f"{model_names[x]} ({available_models[model_options[x]]['speed']})",
-            help="选择更快的模型可以提升响应速度"
+            format_func=lambda x: f"{model_names[x]} ({format_latency(model_options[x])})",
+            help="括号内为本进程实测的首字延迟、总耗时和错误率",
+            disabled=auto_route
         )
         
-        if st.button("🔄 切换模型", type="secondary"):
+        if st.button("🔄 切换模型", type="secondary", disabled=auto_route):
             selected_model = model_options[selected_model_index]
             result = fast_llm_manager.switch_model(selected_model)
             
@@ -97,6 +141,84 @@ with st.sidebar:
             else:
                 st.error(f"❌ 连接失败: {test_result['error']}")
     
+    # 缓存状态
+    with st.expander("📦 缓存状态"):
+        cache_stats = get_cache_stats()
+        st.caption(f"命中率: {cache_stats['hit_rate'] * 100:.0f}% | 命中: {cache_stats['hits']} | 未命中: {cache_stats['misses']}")
+        st.caption(f"淘汰: {cache_stats['evictions']} | 过期: {cache_stats['expirations']} | 持久化: {'是' if cache_stats['persistent'] else '否'}")
+        flight_stats = cache_stats['single_flight']
+        st.caption(f"合并请求: {flight_stats['shared']} | 进行中: {flight_stats['in_flight']}")
+        trends_stats = cache_stats['research_trends']
+        trends_age = f"{trends_stats['age_seconds'] / 3600:.1f} 小时前" if trends_stats['age_seconds'] is not None else "未生成"
+        st.caption(f"研究趋势快照: {trends_age} | 过期读取: {trends_stats['stale']} | 刷新: {trends_stats['refreshes']}")
+    
+    # 后台任务
+    with st.expander("🗂️ 后台任务"):
+        job_stats = get_job_stats()
+        st.caption(f"排队: {job_stats['queued']} | 运行中: {job_stats['running']} | 工作线程: {job_stats['workers']}")
+        st.caption(f"完成: {job_stats['succeeded']} | 失败: {job_stats['failed']} | 取消: {job_stats['cancelled']} | "
+                   f"接管: {job_stats['recovered']}")
+    
+    # 对冲请求
+    with st.expander("🔀 对冲请求"):
+        hedge_stats = get_hedge_stats()
+        hedging = st.toggle(
+            "主模型卡顿时同时请求备用模型",
+            value=hedge_stats['enabled'],
+            help="仅用于选题诊断、实时写作建议等交互式调用，会产生少量额外请求费用"
+        )
+        if hedging != hedge_stats['enabled']:
+            set_hedging(hedging)
+        st.caption(f"对冲比例: {hedge_stats['hedge_rate'] * 100:.0f}% ({hedge_stats['hedged']}/{hedge_stats['requests']}) | "
+                   f"备用胜出: {hedge_stats['hedge_wins']} | 取消: {hedge_stats['cancelled']}")
+        st.caption(f"额外开销: 约 {hedge_stats['extra_cost_ratio'] * 100:.0f}% 输出量")
+        for model_key, threshold in hedge_stats['thresholds'].items():
+            st.caption(f"{model_key} 当前阈值: {threshold:.1f}s")
+    
+    # 限流状态
+    rate_stats = get_rate_limit_stats()
+    if rate_stats:
+        with st.expander("🚦 限流状态"):
+            for model_name, stats in rate_stats.items():
+                st.caption(f"{model_name} | 排队: {stats['queue_depth']} (峰值 {stats['max_queue_depth']}) | "
+                           f"执行中: {stats['in_flight']}/{stats['config']['max_concurrency']}")
+                st.caption(f"平均等待: {stats['avg_wait']:.2f}s | P95: {stats['p95_wait']:.2f}s | "
+                           f"被限流: {stats['throttled']} | 超时: {stats['timeouts']}")
+    
+    # 模型健康（熔断器）状态
+    retry_stats = get_retry_stats()
+    if retry_stats['breakers']:
+        with st.expander("🛡️ 模型健康"):
+            state_labels = {"closed": "🟢 正常", "half_open": "🟡 探测恢复中", "open": "🔴 熔断"}
+            for model_name, breaker in retry_stats['breakers'].items():
+                label = state_labels.get(breaker['state'], breaker['state'])
+                if breaker['state'] == "open":
+                    label += f"（{breaker['retry_in']:.0f}秒后重试）"
+                st.caption(f"{model_name}: {label} | 连续失败: {breaker['consecutive_failures']}")
+            st.caption(f"重试: {retry_stats['retries']} | 放弃: {retry_stats['gave_up']} | 不可重试: {retry_stats['non_retryable']}")
+    
+    # 调用指标
+    telemetry_stats = telemetry.get_stats()
+    if telemetry_stats['llm_requests']:
+        with st.expander("📈 调用指标"):
+            st.caption(f"模型调用: {telemetry_stats['llm_requests']:g} | 失败: {telemetry_stats['llm_errors']:g} | "
+                       f"平均耗时: {telemetry_stats['avg_llm_latency']:.2f}s")
+            st.caption(f"Token: 输入 {telemetry_stats['prompt_tokens']:g} | 输出 {telemetry_stats['completion_tokens']:g}")
+            st.caption(f"结果缓存: 命中 {telemetry_stats['cache_hits']:g} | 未命中 {telemetry_stats['cache_misses']:g}")
+            st.caption(f"已取消请求: {telemetry_stats['cancellations']:g} | 中止的模型调用: {telemetry_stats['llm_cancelled']:g}")
+            if telemetry_stats['trace_path']:
+                st.caption(f"调用链: {telemetry_stats['trace_path']}")
+    
+    # 提示词开销
+    prompt_stats = get_prompt_stats()
+    if prompt_stats['prompts']:
+        with st.expander("🧾 提示词开销"):
+            st.caption(f"模板: {prompt_stats['templates']} | 调用链复用: {prompt_stats['chain_hits']} | "
+                       f"新建: {prompt_stats['chain_misses']}")
+            for prompt in prompt_stats['prompts'][:5]:
+                st.caption(f"{prompt['name']} | 模板 {prompt['template_tokens']} tokens | 调用 {prompt['calls']} 次 | "
+                           f"平均输入 {prompt['avg_prompt_tokens']:.0f} tokens")
+    
     # 页面导航
     st.subheader("📋 功能导航")
     
@@ -217,6 +339,11 @@ def main_page():
     
     st.markdown("---")
     
+    # 切换页面时取消上一页面仍在进行的模型请求
+    if st.session_state.get('last_page') not in (None, st.session_state.current_page):
+        _cancel_session_requests("navigation")
+    st.session_state.last_page = st.session_state.current_page
+    
     # 根据选择的页面显示不同内容
     if st.session_state.current_page == "选题指导":
         topic_guidance_page()
@@ -269,51 +396,61 @@ def topic_guidance_page():
         # 生成按钮
         if st.button("🚀 生成选题建议", type="primary", use_container_width=True):
             if subject:
-                # 创建进度条
-                progress_bar = st.progress(0)
                 status_text = st.empty()
                 
+                # 重复提交时取消上一次仍在进行的选题分析
+                previous_token = st.session_state.get('topic_token')
+                if previous_token is not None:
+                    previous_token.cancel("superseded")
+                topic_token = cancellation.CancellationToken("topic_analysis")
+                st.session_state.topic_token = topic_token
+                
                 try:
-                    # 步骤1：生成选题
-                    status_text.text("📝 正在生成选题建议...")
-                    progress_bar.progress(25)
-                    title, abstract, _ = generate_paper(subject, word_count, creativity)
-                    
-                    # 步骤2：选题诊断
-                    status_text.text("🔍 正在进行选题诊断...")
-                    progress_bar.progress(50)
-                    diagnosis = topic_diagnosis(subject, research_type)
-                    
-                    # 步骤3：可行性分析
-                    status_text.text("📊 正在分析可行性...")
-                    progress_bar.progress(75)
-                    feasibility = analyze_topic_feasibility(subject, research_type)
-                    
-                    # 步骤4：完成
-                    status_text.text("✅ 分析完成！")
-                    progress_bar.progress(100)
-                    
-                    # 保存结果到session state
-                    st.session_state.topic_analysis = {
-                        'title': title,
-                        'abstract': abstract,
-                        'diagnosis': diagnosis,
-                        'feasibility': feasibility,
-                        'subject': subject,
-                        'word_count': word_count,
-                        'creativity': creativity,
-                        'research_type': research_type
-                    }
+                    with telemetry.span("action.topic_analysis", research_type=research_type), \
+                            cancellation.scope(topic_token):
+                        # 选题生成与可行性分析在后台并发执行，同时流式展示选题诊断；
+                        # 每解析出一个题目就立即开始生成该题目的研究建议
+                        status_text.text("📝 正在并行生成选题建议与可行性分析...")
+                        topic_future = submit_topic_analysis(
+                            subject, word_count, creativity, research_type, include_diagnosis=False,
+                            per_title_advice=True
+                        )
+                        
+                        with st.expander("🔍 选题诊断", expanded=True):
+                            diagnosis_text = st.write_stream(stream_topic_diagnosis(subject, research_type))
+                        
+                        status_text.text("⏳ 正在等待选题建议与可行性分析...")
+                        topic_result = topic_future.result()
+                        
+                        # 完成
+                        status_text.text("✅ 分析完成！")
+                        
+                        # 保存结果到session state
+                        st.session_state.topic_analysis = {
+                            'title': topic_result['title'],
+                            'abstract': topic_result['abstract'],
+                            'titles': topic_result.get('titles'),
+                            'advice': topic_result.get('advice'),
+                            'diagnosis': {'analysis': diagnosis_text},
+                            'feasibility': topic_result['feasibility'],
+                            'timed_out': topic_result['timed_out'],
+                            'subject': subject,
+                            'word_count': word_count,
+                            'creativity': creativity,
+                            'research_type': research_type
+                        }
                     
-                    # 清除进度条
-                    progress_bar.empty()
+                    # 清除状态提示
                     status_text.empty()
                     
                     st.success("🎉 选题分析完成！")
                     st.rerun()
                     
+                except (cancellation.RequestCancelledError, concurrent.futures.CancelledError):
+                    # 已被新的提交或页面切换取代
+                    status_text.empty()
+                    st.info("⏹️ 本次选题分析已取消")
                 except Exception as e:
-                    progress_bar.empty()
                     status_text.empty()
                     st.error(f"❌ 分析过程中出现错误：{str(e)}")
                     st.info("💡 建议：请检查网络连接或稍后重试")
@@ -345,7 +482,12 @@ def topic_guidance_page():
             # 可行性评分
             if 'feasibility' in analysis:
                 feasibility = analysis['feasibility']
-                st.metric("可行性评分", f"{feasibility.get('score', 0)}/100")
+                if feasibility.get('score') is None:
+                    # 模型未给出有效评分，不展示编造的分数
+                    st.metric("可行性评分", "—")
+                    st.caption("⚠️ 暂未获得有效评分，以下为通用建议，可稍后重新生成")
+                else:
+                    st.metric("可行性评分", f"{feasibility['score']}/100")
                 
                 # 显示详细评估
                 st.markdown("**📋 详细评估**")
@@ -361,15 +503,34 @@ def topic_guidance_page():
         st.markdown("---")
         st.subheader("📋 选题分析结果")
         
+        if analysis.get('timed_out'):
+            st.warning("⚠️ 部分分析超时，已使用默认结果，可稍后重新生成")
+        
         # 创建两列布局显示结果
         col1, col2 = st.columns([2, 1])
         
         with col1:
             st.markdown("### 🔥 推荐选题")
             
+            titles = analysis.get('titles')
+            if titles is not None:
+                # 逐题展示研究建议，每个题目可单独重新生成
+                if not titles:
+                    st.warning("⚠️ 选题生成失败，请稍后重试")
+                for i, (title, advice) in enumerate(zip(titles, analysis['advice'])):
+                    st.markdown(f"**{i + 1}. {title}**")
+                    with st.expander("📝 研究建议", expanded=(i == 0)):
+                        st.markdown(advice)
+                        if st.button("🔄 重新生成", key=f"regenerate_title_advice_{i}"):
+                            with telemetry.span("action.regenerate_title_advice"):
+                                with st.spinner("正在重新生成该题目的研究建议..."):
+                                    result = get_title_advice(title, analysis['word_count'], analysis['creativity'],
+                                                              force_refresh=True)
+                            analysis['advice'][i] = result['advice']
+                            st.rerun()
             # 选题展示优化
-            title_content = analysis.get('title', '生成中...')
-            if title_content and title_content != '生成中...':
+            elif analysis.get('title') and analysis.get('title') != '生成中...':
+                title_content = analysis['title']
                 # 将选题分行显示
                 titles = [t.strip() for t in title_content.split('\n') if t.strip()]
                 for i, title in enumerate(titles, 1):
@@ -420,6 +581,101 @@ def topic_guidance_page():
             if st.button("💾 保存到收藏", type="secondary", use_container_width=True):
                 st.success("已保存到收藏夹")
 
+def _cancel_session_requests(reason):
+    """取消本会话中仍在进行的选题分析与后台任务"""
+    topic_token = st.session_state.get('topic_token')
+    if topic_token is not None:
+        topic_token.cancel(reason)
+        st.session_state.topic_token = None
+    for state_key in ("annotation_job", "format_job"):
+        job_id = st.session_state.get(state_key) or st.query_params.get(state_key)
+        if job_id:
+            cancel_job(job_id, reason)
+
+def _annotation_draft_id(paper_content):
+    """
+    论文的草稿ID：本会话内按论文标题（首个非空行）区分，不同论文不会互相比对
+    
+    未勾选增量批注时返回None，整篇批注
+    """
+    if not st.session_state.get("incremental_annotation", False):
+        return None
+    if "annotation_session" not in st.session_state:
+        st.session_state.annotation_session = uuid.uuid4().hex
+    title = next((line.strip() for line in (paper_content or "").split("\n") if line.strip()), "")
+    return hashlib.sha256(f"{st.session_state.annotation_session}:{title}".encode("utf-8")).hexdigest()
+
+def _start_job(state_key, submit, *args, **kwargs):
+    """
+    提交后台任务并记录任务ID：同时写入URL参数，浏览器重连（新会话）后仍能找回任务
+    
+    同一位置上一次提交的任务如仍在进行则先取消（重复点击时不再让旧请求跑完）
+    """
+    previous_id = st.session_state.get(state_key) or st.query_params.get(state_key)
+    if previous_id:
+        cancel_job(previous_id, "superseded")
+    job_id = submit(*args, **kwargs)
+    st.session_state[state_key] = job_id
+    st.query_params[state_key] = job_id
+
+def _show_job(state_key, title, on_success):
+    """
+    展示后台任务进度，任务结束后保存结果
+    
+    页面重新运行（包括操作其他控件）只会中断展示，任务本身在后台继续执行，下次运行时接着展示。
+    
+    Args:
+        state_key: session_state 与URL参数中保存任务ID的键
+        title: 进度展示区标题
+        on_success: 任务成功后的回调，参数为任务字典
+    """
+    job_id = st.session_state.get(state_key) or st.query_params.get(state_key)
+    job = get_job(job_id)
+    if job is None:
+        st.session_state[state_key] = None
+        return
+    st.session_state[state_key] = job_id
+    
+    if job['status'] not in ("succeeded", "failed", "cancelled"):
+        st.info("⏳ 任务在后台执行中，刷新浏览器不会中断任务；重新提交或切换功能页面会取消任务")
+        with st.expander(title, expanded=True):
+            st.write_stream(stream_job(job_id))
+        job = get_job(job_id)
+    
+    st.session_state[state_key] = None
+    st.query_params.pop(state_key, None)
+    if job['status'] == "succeeded":
+        on_success(job)
+        st.rerun()
+    elif job['status'] == "cancelled":
+        st.info(f"⏹️ {job['error']}")
+    else:
+        st.error(f"❌ 任务执行失败：{job['error']}")
+        if job.get('output'):
+            with st.expander("已输出的部分内容", expanded=False):
+                st.markdown(job['output'])
+        st.info("💡 建议：请检查网络连接或稍后重试")
+
+def _save_annotation_job(job):
+    """批注任务完成：保存批注结果"""
+    params = job['params']
+    st.session_state.annotation_result = {"annotation": job['result']['text']}
+    st.session_state.annotation_type = params['annotation_type']
+    st.session_state.paper_content = params['paper_content']
+    st.session_state.paper_structure = params.get('structure')
+    if not st.session_state.get('analysis_result'):
+        # 浏览器重连后的新会话中没有本地分析结果，重新计算（本地计算很快）
+        st.session_state.analysis_result = advanced_analyzer.comprehensive_analysis(params['paper_content'])
+
+def _save_format_job(job):
+    """格式修正任务完成：保存修正结果"""
+    params = job['params']
+    st.session_state.format_result = {"corrected_content": job['result']['text']}
+    st.session_state.format_target = params['target_format']
+    st.session_state.format_content = params['paper_content']
+    if not st.session_state.get('format_analysis_result'):
+        st.session_state.format_analysis_result = advanced_analyzer.comprehensive_analysis(params['paper_content'])
+
 def paper_annotation_page():
     """论文批注页面"""
     st.header("✏️ 论文批注修改")
@@ -444,7 +700,7 @@ def paper_annotation_page():
             
             # 处理文档
             if st.button("🔍 分析文档", type="primary", use_container_width=True):
-                with st.spinner("正在处理文档..."):
+                with st.spinner("正在处理文档..."), telemetry.span("action.analyze_document"):
                     # 处理上传的文件
                     doc_result = document_processor.process_uploaded_file(uploaded_file)
                     
@@ -453,6 +709,7 @@ def paper_annotation_page():
                     else:
                         # 保存文档内容
                         st.session_state.paper_content = doc_result["content"]
+                        st.session_state.paper_structure = doc_result.get("structure")
                         st.session_state.file_info = doc_result["file_info"]
                         
                         # 进行高级分析
@@ -464,12 +721,13 @@ def paper_annotation_page():
                         else:
                             st.success("文档分析完成！")
                         
-                        # 进行AI批注
-                        annotation_result = intelligent_annotation(doc_result["content"], "全面批注")
-                        
-                        # 保存结果
-                        st.session_state.annotation_result = annotation_result
+                        # AI批注提交为后台任务，进度在下方展示
+                        st.session_state.annotation_result = None
                         st.session_state.analysis_result = analysis_result
+                        _start_job("annotation_job", submit_annotation_job,
+                            doc_result["content"], "全面批注", structure=doc_result.get("structure"),
+                            draft_id=_annotation_draft_id(doc_result["content"])
+                        )
     
     with col2:
         st.subheader("📝 文本输入")
@@ -485,8 +743,16 @@ def paper_annotation_page():
         # 批注类型选择
         annotation_type = st.selectbox(
             "🔍 批注类型",
-            ["全面批注", "学术规范性", "逻辑结构", "内容质量", "语言表达"],
-            help="选择您希望重点批注的方面"
+            ["全面批注", "全面批注（分维度并行）", "学术规范性", "逻辑结构", "内容质量", "语言表达"],
+            help="选择您希望重点批注的方面；“分维度并行”将10个维度分别并行批注并给出各维度评分"
+        )
+        
+        st.checkbox(
+            "✏️ 只重新批注修改过的段落",
+            value=False,
+            key="incremental_annotation",
+            disabled=annotation_type == "全面批注（分维度并行）",
+            help="同一论文的修改稿再次提交时，与上一版本逐段比对，只重新批注修改过的段落及其相邻段落，其余沿用上次的批注；首次提交仍整篇批注"
         )
         
         # 实时内容分析
@@ -506,54 +772,37 @@ def paper_annotation_page():
             if len(words) < 500:
                 st.warning("💡 内容较短，建议增加更多详细内容")
             elif len(words) > 5000:
-                st.info("💡 内容较长，建议分段进行批注")
+                st.info("💡 内容较长，将按章节分块并行批注")
         
         # 批注按钮
         if st.button("🔍 开始批注", type="primary", use_container_width=True):
             if paper_content:
-                # 创建进度条
-                progress_bar = st.progress(0)
                 status_text = st.empty()
                 
                 try:
-                    # 步骤1：内容预处理
-                    status_text.text("📝 正在预处理内容...")
-                    progress_bar.progress(20)
-                    
-                    # 步骤2：智能批注
-                    status_text.text("🤖 AI正在分析您的论文...")
-                    progress_bar.progress(60)
-                    annotation_result = intelligent_annotation(paper_content, annotation_type)
-                    
-                    # 步骤3：高级分析
-                    status_text.text("📊 正在进行高级分析...")
-                    progress_bar.progress(80)
-                    analysis_result = advanced_analyzer.comprehensive_analysis(paper_content)
-                    
-                    # 步骤4：完成
-                    status_text.text("✅ 批注分析完成！")
-                    progress_bar.progress(100)
-                    
-                    # 保存结果到session state
-                    st.session_state.annotation_result = annotation_result
-                    st.session_state.paper_content = paper_content
-                    st.session_state.analysis_result = analysis_result
+                    with telemetry.span("action.annotate_text", annotation_type=annotation_type):
+                        # 本地高级分析很快，先完成
+                        status_text.text("📊 正在进行高级分析...")
+                        st.session_state.analysis_result = advanced_analyzer.comprehensive_analysis(paper_content)
+                        
+                        # 智能批注提交为后台任务，进度在下方流式展示
+                        st.session_state.annotation_result = None
+                        _start_job("annotation_job", submit_annotation_job, paper_content, annotation_type,
+                                   draft_id=_annotation_draft_id(paper_content))
                     
-                    # 清除进度条
-                    progress_bar.empty()
+                    # 清除状态提示
                     status_text.empty()
                     
-                    st.success("🎉 批注分析完成！")
-                    st.rerun()
-                    
                 except Exception as e:
-                    progress_bar.empty()
                     status_text.empty()
                     st.error(f"❌ 批注过程中出现错误：{str(e)}")
                     st.info("💡 建议：请检查网络连接或稍后重试")
             else:
                 st.warning("⚠️ 请输入论文内容")
     
+    # 后台批注任务的进度（页面重新运行后继续展示）
+    _show_job("annotation_job", "🤖 AI批注", _save_annotation_job)
+    
     # 显示分析结果
     if 'analysis_result' in st.session_state and st.session_state.analysis_result:
         st.markdown("---")
@@ -656,7 +905,15 @@ def paper_annotation_page():
                                 st.info("导出功能开发中...")
                         with col2:
                             if st.button("🔄 重新批注", type="secondary", key="reannotate_btn_main"):
-                                st.info("重新批注功能开发中...")
+                                # 跳过缓存，重新请求模型（后台任务）
+                                _start_job("annotation_job", submit_annotation_job,
+                                    st.session_state.paper_content,
+                                    st.session_state.get("annotation_type", "全面批注"),
+                                    force_refresh=True,
+                                    structure=st.session_state.get("paper_structure"),
+                                    draft_id=_annotation_draft_id(st.session_state.paper_content)
+                                )
+                                st.rerun()
                         with col3:
                             if st.button("💾 保存批注", type="secondary", key="save_btn_main"):
                                 st.success("批注已保存")
@@ -851,7 +1108,7 @@ def format_correction_page():
             
             # 处理文档
             if st.button("🔧 分析文档格式", type="primary", use_container_width=True):
-                with st.spinner("正在处理文档..."):
+                with st.spinner("正在处理文档..."), telemetry.span("action.analyze_format_document"):
                     # 处理上传的文件
                     doc_result = document_processor.process_uploaded_file(uploaded_file)
                     
@@ -915,50 +1172,31 @@ def format_correction_page():
         # 格式修正按钮
         if st.button("🔧 开始格式修正", type="primary", use_container_width=True):
             if paper_content:
-                # 创建进度条
-                progress_bar = st.progress(0)
                 status_text = st.empty()
                 
                 try:
-                    # 步骤1：内容预处理
-                    status_text.text("📝 正在预处理内容...")
-                    progress_bar.progress(20)
-                    
-                    # 步骤2：格式分析
-                    status_text.text("🔍 AI正在分析格式问题...")
-                    progress_bar.progress(50)
-                    format_analysis_result = advanced_analyzer.comprehensive_analysis(paper_content)
-                    
-                    # 步骤3：格式修正
-                    status_text.text("🔧 正在进行格式修正...")
-                    progress_bar.progress(80)
-                    from PaperHelper_utils import format_correction
-                    format_result = format_correction(paper_content, target_format)
-                    
-                    # 步骤4：完成
-                    status_text.text("✅ 格式修正完成！")
-                    progress_bar.progress(100)
-                    
-                    # 保存结果到session state
-                    st.session_state.format_result = format_result
-                    st.session_state.format_content = paper_content
-                    st.session_state.format_analysis_result = format_analysis_result
+                    with telemetry.span("action.format_text", target_format=target_format):
+                        # 格式分析（本地计算）
+                        status_text.text("🔍 正在分析格式问题...")
+                        st.session_state.format_analysis_result = advanced_analyzer.comprehensive_analysis(paper_content)
+                        
+                        # 格式修正提交为后台任务，进度在下方流式展示
+                        st.session_state.format_result = None
+                        _start_job("format_job", submit_format_correction_job, paper_content, target_format)
                     
-                    # 清除进度条
-                    progress_bar.empty()
+                    # 清除状态提示
                     status_text.empty()
                     
-                    st.success("🎉 格式修正完成！")
-                    st.rerun()
-                    
                 except Exception as e:
-                    progress_bar.empty()
                     status_text.empty()
                     st.error(f"❌ 格式修正过程中出现错误：{str(e)}")
                     st.info("💡 建议：请检查网络连接或稍后重试")
             else:
                 st.warning("⚠️ 请输入论文内容")
     
+    # 后台格式修正任务的进度（页面重新运行后继续展示）
+    _show_job("format_job", "🔧 修正结果", _save_format_job)
+    
     # 显示格式分析结果
     if 'format_analysis_result' in st.session_state and st.session_state.format_analysis_result:
         st.markdown("---")
@@ -1046,7 +1284,13 @@ def format_correction_page():
                                 st.info("导出功能开发中...")
                         with col2:
                             if st.button("🔄 重新修正", type="secondary", key="reformat_btn"):
-                                st.info("重新修正功能开发中...")
+                                # 跳过缓存，重新请求模型（后台任务）
+                                _start_job("format_job", submit_format_correction_job,
+                                    st.session_state.format_content,
+                                    st.session_state.get("format_target", "APA格式"),
+                                    force_refresh=True
+                                )
+                                st.rerun()
                         with col3:
                             if st.button("💾 保存结果", type="secondary", key="save_format_btn"):
                                 st.success("格式修正结果已保存")
@@ -10,6 +10,7 @@ import json
 from typing import Dict, List, Any
 from collections import Counter
 import streamlit as st
+from src.config.telemetry import telemetry
 
 class AdvancedAnalyzer:
     """高级分析器类"""
@@ -26,6 +27,7 @@ class AdvancedAnalyzer:
             ]
         }
     
+    @telemetry.traced("analyzer.comprehensive")
     def comprehensive_analysis(self, content: str) -> Dict[str, Any]:
         """综合文档分析 - 增强版"""
         if not content:
@@ -40,6 +42,7 @@ class AdvancedAnalyzer:
             "recommendations": self._generate_recommendations(content)
         }
     
+    @telemetry.traced("analyzer.basic_stats")
     def _analyze_basic_stats(self, content: str) -> Dict[str, Any]:
         """基础统计分析"""
         words = content.split()
@@ -55,6 +58,7 @@ class AdvancedAnalyzer:
             "reading_time_minutes": len(words) / 200
         }
     
+    @telemetry.traced("analyzer.structure")
     def _analyze_structure(self, content: str) -> Dict[str, Any]:
         """结构分析"""
         lines = content.split('\n')
@@ -94,6 +98,7 @@ class AdvancedAnalyzer:
         
         return structure
     
+    @telemetry.traced("analyzer.academic_quality")
     def _analyze_academic_quality(self, content: str) -> Dict[str, Any]:
         """学术质量分析"""
         quality = {
@@ -126,6 +131,7 @@ class AdvancedAnalyzer:
         
         return quality
     
+    @telemetry.traced("analyzer.writing_style")
     def _analyze_writing_style(self, content: str) -> Dict[str, Any]:
         """写作风格分析"""
         style = {
@@ -157,6 +163,7 @@ class AdvancedAnalyzer:
         
         return style
     
+    @telemetry.traced("analyzer.communication_specialty")
     def _analyze_communication_specialty(self, content: str) -> Dict[str, Any]:
         """新闻传播学专业特色分析"""
         specialty = {
@@ -222,6 +229,7 @@ class AdvancedAnalyzer:
         
         return specialty
     
+    @telemetry.traced("analyzer.recommendations")
     def _generate_recommendations(self, content: str) -> List[str]:
         """生成改进建议 - 增强版"""
         recommendations = []
@@ -10,6 +10,7 @@ import io
 import base64
 from typing import Dict, List, Tuple, Optional, Any
 import streamlit as st
+from src.config.telemetry import telemetry
 
 # PDF处理
 try:
@@ -79,6 +80,7 @@ class DocumentProcessor:
         """获取支持的文档格式"""
         return self.supported_formats
     
+    @telemetry.traced("document.process")
     def process_uploaded_file(self, uploaded_file) -> Dict[str, Any]:
         """处理上传的文件"""
         if uploaded_file is None:
@@ -89,6 +91,7 @@ class DocumentProcessor:
             "file_type": uploaded_file.type,
             "file_size": uploaded_file.size
         }
+        telemetry.set_attributes(file_type=uploaded_file.type, file_size=uploaded_file.size)
         
         try:
             # 根据文件类型处理
@@ -104,8 +107,10 @@ class DocumentProcessor:
                 return {"error": f"不支持的文件格式: {uploaded_file.type}"}
         
         except Exception as e:
+            telemetry.record_error(e)
             return {"error": f"处理文件时出错: {str(e)}"}
     
+    @telemetry.traced("document.pdf")
     def _process_pdf(self, uploaded_file, file_info: Dict) -> Dict[str, Any]:
         """处理PDF文件"""
         if not PDF_AVAILABLE:
@@ -144,8 +149,10 @@ class DocumentProcessor:
             }
         
         except Exception as e:
+            telemetry.record_error(e)
             return {"error": f"PDF处理失败: {str(e)}"}
     
+    @telemetry.traced("document.docx")
     def _process_docx(self, uploaded_file, file_info: Dict) -> Dict[str, Any]:
         """处理Word文档"""
         if not DOCX_AVAILABLE:
@@ -187,8 +194,10 @@ class DocumentProcessor:
             }
         
         except Exception as e:
+            telemetry.record_error(e)
             return {"error": f"Word文档处理失败: {str(e)}"}
     
+    @telemetry.traced("document.txt")
     def _process_txt(self, uploaded_file, file_info: Dict) -> Dict[str, Any]:
         """处理文本文件"""
         try:
@@ -209,8 +218,10 @@ class DocumentProcessor:
             }
         
         except Exception as e:
+            telemetry.record_error(e)
             return {"error": f"文本文件处理失败: {str(e)}"}
     
+    @telemetry.traced("document.ocr")
     def _process_image(self, uploaded_file, file_info: Dict) -> Dict[str, Any]:
         """处理图片文件（OCR）"""
         if not OCR_AVAILABLE:
@@ -244,8 +255,10 @@ class DocumentProcessor:
             }
         
         except Exception as e:
+            telemetry.record_error(e)
             return {"error": f"图片OCR处理失败: {str(e)}"}
     
+    @telemetry.traced("document.structure")
     def _analyze_document_structure(self, content: str) -> Dict[str, Any]:
         """分析文档结构"""
         if not content:
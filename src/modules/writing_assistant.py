@@ -342,7 +342,7 @@ class WritingAssistant:
     def _generate_custom_template(self, template_type: str, topic: str, requirements: str) -> Dict[str, Any]:
         """生成个性化模板"""
         try:
-            from src.utils.PaperHelper_utils import get_llm
+            from src.utils.PaperHelper_utils import get_llm, invoke_chain
             from langchain.prompts import ChatPromptTemplate
             
             llm = get_llm(temperature=0.3)
@@ -364,11 +364,11 @@ class WritingAssistant:
             ])
             
             chain = template_prompt | llm
-            result = chain.invoke({
+            result = invoke_chain(chain, {
                 "template_type": template_type,
                 "topic": topic,
                 "requirements": requirements
-            }).content
+            })
             
             return {
                 "success": True,
@@ -386,7 +386,7 @@ class WritingAssistant:
     def provide_real_time_suggestions(self, content: str, context: str = "") -> Dict[str, Any]:
         """提供实时写作建议"""
         try:
-            from src.utils.PaperHelper_utils import get_llm
+            from src.utils.PaperHelper_utils import get_llm, invoke_chain
             from langchain.prompts import ChatPromptTemplate
             
             llm = get_llm(temperature=0.2)
@@ -408,10 +408,10 @@ class WritingAssistant:
             ])
             
             chain = suggestion_prompt | llm
-            result = chain.invoke({
+            result = invoke_chain(chain, {
                 "content": content,
                 "context": context
-            }).content
+            }, hedge=True)
             
             return {
                 "success": True,
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+新传论文智能辅导系统 - 批量批注脚本
+遍历目录或zip压缩包中的论文，多进程提取文本与综合分析，并发调用模型批注，结果写入JSONL/CSV
+每篇完成后立即落盘，中断后重新运行同一命令即可从断点继续
+
+用法示例：
+    python src/scripts/batch_annotate.py submissions.zip -o results/annotations.jsonl
+    python src/scripts/batch_annotate.py ./submissions --annotation-type 全面批注（分维度并行） --concurrency 8
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.utils.local_files import iter_documents, load_document
+
+# CSV中保留的字段（完整批注见JSONL）
+CSV_FIELDS = [
+    "doc_id", "name", "status", "error", "word_count", "total_characters", "citation_count",
+    "overall_quality_score", "overall_score", "annotation_chars", "extract_seconds", "annotate_seconds"
+]
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="批量批注目录或zip压缩包中的论文（支持PDF、Word、TXT）")
+    parser.add_argument("input", help="论文所在目录或.zip压缩包")
+    parser.add_argument("-o", "--output", default="batch_annotations.jsonl", help="JSONL结果文件，同时作为断点记录")
+    parser.add_argument("--csv", help="CSV汇总文件，默认与JSONL同名")
+    parser.add_argument("--annotation-type", default="全面批注",
+                        help="批注类型：全面批注、全面批注（分维度并行）、学术规范性、逻辑结构、内容质量、语言表达")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, (os.cpu_count() or 2) - 1)),
+                        help="文本提取进程数")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="同时批注的论文数（模型调用另受限流器约束）")
+    parser.add_argument("--restart", action="store_true", help="忽略已有结果，从头开始")
+    parser.add_argument("--retry-failed", action="store_true", help="续跑时重新处理上次失败的论文")
+    return parser.parse_args()
+
+def extract_document(source):
+    """
+    在子进程中提取文本并做综合分析（CPU密集，不调用模型）
+
+    Returns:
+        成功时包含 content、structure、analysis 等字段，失败时包含 error
+    """
+    from src.modules.document_processor_simple import document_processor
+    from src.modules.advanced_analyzer import advanced_analyzer
+
+    start = time.perf_counter()
+    doc_result = document_processor.process_uploaded_file(load_document(source))
+    if not doc_result.get("success"):
+        return {"error": doc_result.get("error", "文档处理失败")}
+
+    return {
+        "content": doc_result["content"],
+        "structure": doc_result.get("structure"),
+        "word_count": doc_result.get("word_count"),
+        "analysis": advanced_analyzer.comprehensive_analysis(doc_result["content"]),
+        "extract_seconds": round(time.perf_counter() - start, 2)
+    }
+
+def doc_id_for(source) -> str:
+    """论文标识：相对路径 + 文件指纹，文件修改后会重新批注"""
+    return f"{source['name']}#{source['fingerprint']}"
+
+def load_checkpoint(output_path):
+    """读取已有结果，返回 {doc_id: 最后一条记录}（忽略崩溃时写了一半的行）"""
+    records = {}
+    if not os.path.exists(output_path):
+        return records
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["doc_id"]] = record
+    return records
+
+def append_record(f, record):
+    """追加一条结果并立即刷盘"""
+    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def write_csv(csv_path, records):
+    """按最新记录写出CSV汇总"""
+    with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for record in sorted(records.values(), key=lambda r: r["name"]):
+            analysis = record.get("analysis") or {}
+            row = dict(record)
+            row.update({
+                "total_characters": analysis.get("basic_stats", {}).get("total_characters"),
+                "citation_count": analysis.get("academic_quality", {}).get("citation_count"),
+                "overall_quality_score": analysis.get("academic_quality", {}).get("overall_quality_score"),
+                "annotation_chars": len(record.get("annotation") or "")
+            })
+            writer.writerow(row)
+
+class Progress:
+    """进度与吞吐量统计"""
+
+    def __init__(self, total):
+        """初始化"""
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+
+    def docs_per_minute(self) -> float:
+        """已完成论文的平均吞吐量（篇/分钟）"""
+        elapsed = time.perf_counter() - self.start
+        return self.done / elapsed * 60 if elapsed > 0 else 0.0
+
+    def report(self, record):
+        """输出单篇完成情况"""
+        self.done += 1
+        if record["status"] != "ok":
+            self.failed += 1
+        rate = self.docs_per_minute()
+        remaining = (self.total - self.done) / rate if rate > 0 else 0.0
+        status = "✅" if record["status"] == "ok" else "❌"
+        detail = record.get("error") or f"{record.get('annotate_seconds', 0):.1f}s"
+        print(f"[{self.done}/{self.total}] {status} {record['name']} ({detail}) | "
+              f"{rate:.1f} 篇/分钟 | 预计剩余 {remaining:.1f} 分钟", flush=True)
+
+async def annotate_document(extracted, annotation_type):
+    """调用模型批注单篇论文（限流、重试、缓存均由批注函数内部处理）"""
+    from src.utils.PaperHelper_utils import aintelligent_annotation
+
+    start = time.perf_counter()
+    result = await aintelligent_annotation(extracted["content"], annotation_type, structure=extracted["structure"])
+    return result, round(time.perf_counter() - start, 2)
+
+def run_batch(args):
+    """执行批量批注，返回进度统计"""
+    from src.utils.PaperHelper_utils import submit_coroutine, get_rate_limit_stats
+
+    sources = list(iter_documents(args.input))
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    records = load_checkpoint(args.output)
+    # 换用其他批注类型时重新处理
+    finished = {doc_id for doc_id, record in records.items()
+                if record.get("annotation_type") == args.annotation_type
+                and (record["status"] == "ok" or not args.retry_failed)}
+    todo = deque(source for source in sources if doc_id_for(source) not in finished)
+
+    print(f"📚 共 {len(sources)} 篇，已完成 {len(sources) - len(todo)} 篇，待处理 {len(todo)} 篇")
+    progress = Progress(len(todo))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+    # 使用spawn启动提取进程，避免fork时复制后台事件循环等线程状态
+    context = multiprocessing.get_context("spawn")
+    extracting = {}  # future -> source
+    annotating = {}  # future -> (source, extracted)
+    ready = deque()  # 已提取、等待批注名额的论文
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool, \
+            open(args.output, "a", encoding="utf-8") as output:
+        def finish(source, extracted, **fields):
+            record = {
+                "doc_id": doc_id_for(source),
+                "name": source["name"],
+                "annotation_type": args.annotation_type,
+                "word_count": extracted.get("word_count"),
+                "extract_seconds": extracted.get("extract_seconds"),
+                "analysis": extracted.get("analysis"),
+                "finished_at": time.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            record.update(fields)
+            append_record(output, record)
+            records[record["doc_id"]] = record
+            progress.report(record)
+
+        while todo or extracting or annotating or ready:
+            # 提取进度领先批注一段即可，避免一次读入全部论文
+            while todo and len(extracting) + len(ready) < args.workers * 2:
+                source = todo.popleft()
+                extracting[pool.submit(extract_document, source)] = source
+            while ready and len(annotating) < args.concurrency:
+                source, extracted = ready.popleft()
+                annotating[submit_coroutine(annotate_document(extracted, args.annotation_type))] = (source, extracted)
+
+            done, _ = wait(set(extracting) | set(annotating), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in extracting:
+                    source = extracting.pop(future)
+                    try:
+                        extracted = future.result()
+                    except Exception as e:
+                        extracted = {"error": f"文档处理失败: {str(e)}"}
+                    if "error" in extracted:
+                        finish(source, extracted, status="error", error=extracted["error"])
+                    else:
+                        ready.append((source, extracted))
+                else:
+                    source, extracted = annotating.pop(future)
+                    try:
+                        result, elapsed = future.result()
+                    except Exception as e:
+                        finish(source, extracted, status="error", error=f"批注失败: {str(e)}")
+                        continue
+                    if result.get("failed"):
+                        # 模型调用失败时批注函数返回提示文本而不抛出异常，记为失败以便 --retry-failed 重跑
+                        finish(source, extracted, status="error", error="批注失败: 模型调用未能完成",
+                               annotate_seconds=elapsed)
+                        continue
+                    finish(source, extracted, status="ok", annotate_seconds=elapsed,
+                           annotation=result.get("annotation"), overall_score=result.get("overall_score"))
+
+    write_csv(args.csv or os.path.splitext(args.output)[0] + ".csv", records)
+    for name, stats in get_rate_limit_stats().items():
+        print(f"🚦 {name}: 平均排队 {stats['avg_wait']:.1f}s，P95 {stats['p95_wait']:.1f}s，"
+              f"被限流 {stats['throttled']} 次")
+    return progress
+
+def main():
+    """主函数"""
+    args = parse_args()
+    if not os.path.exists(args.input):
+        print(f"❌ 找不到输入: {args.input}")
+        return False
+
+    print("📝 新传论文智能辅导系统 - 批量批注")
+    try:
+        progress = run_batch(args)
+    except KeyboardInterrupt:
+        print("\n⏸️  已中断，已完成的结果已保存，重新运行同一命令即可继续")
+        return False
+
+    if progress.done:
+        elapsed = (time.perf_counter() - progress.start) / 60
+        print(f"\n🎉 完成 {progress.done} 篇（失败 {progress.failed} 篇），用时 {elapsed:.1f} 分钟，"
+              f"平均 {progress.docs_per_minute():.1f} 篇/分钟")
+    print(f"📄 结果: {args.output}")
+    return progress.failed == 0
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
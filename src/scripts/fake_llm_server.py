@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+新传论文智能辅导系统 - 本地模拟模型服务
+实现OpenAI兼容的 /v1/chat/completions 接口（含SSE流式输出），可配置延迟分布、输出速度、错误注入和固定回复，
+用于在无网络环境下确定性地测量系统自身开销，不依赖任何第三方包
+
+用法示例：
+    python src/scripts/fake_llm_server.py --port 8765 --latency lognormal:0.8,0.5 --tokens-per-second 60
+    PAPERHELPER_DEFAULT_MODEL=fake_llm streamlit run main.py
+
+    # 在测试或基准脚本中以线程方式启动
+    server = FakeLLMServer(latency="fixed:0.05", seed=42).start()
+    ...
+    server.stop()
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Callable, List, Optional
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MODEL_NAME = "fake-llm"
+# 无匹配的固定回复时，用于拼出默认回复的文本
+FILLER_TEXT = "这是本地模拟模型服务生成的回复内容，用于测量系统开销。"
+
+# 错误码对应的OpenAI错误类型
+ERROR_TYPES = {
+    400: "invalid_request_error",
+    401: "authentication_error",
+    429: "rate_limit_exceeded",
+    500: "server_error",
+    502: "server_error",
+    503: "service_unavailable"
+}
+
+def parse_distribution(spec: str, rng: random.Random) -> Callable[[], float]:
+    """
+    解析延迟分布描述，返回采样函数（秒，不小于0）
+
+    支持：fixed:0.5、uniform:0.2,1.0、normal:均值,标准差、lognormal:中位数,sigma、
+    bimodal:快速值,慢速值,慢速概率（模拟长尾）
+    """
+    kind, _, params = (spec or "fixed:0").partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] if params else []
+
+    if kind == "fixed":
+        value = values[0] if values else 0.0
+        return lambda: value
+    if kind == "uniform":
+        low, high = values
+        return lambda: rng.uniform(low, high)
+    if kind == "normal":
+        mean, std = values
+        return lambda: max(rng.gauss(mean, std), 0.0)
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: rng.lognormvariate(math.log(median), sigma)
+    if kind == "bimodal":
+        fast, slow, slow_ratio = values
+        return lambda: slow if rng.random() < slow_ratio else fast
+    raise ValueError(f"不支持的延迟分布: {spec}")
+
+def load_responses(path: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    读取固定回复文件
+
+    文件为JSON列表，每项 {"match": 正则表达式, "response": 回复文本}，按顺序匹配最后一条用户消息
+    """
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return [{"pattern": re.compile(entry["match"], re.S), "response": entry["response"]} for entry in entries]
+
+def sample_from_schema(schema: Dict[str, Any], root: Dict[str, Any] = None) -> Any:
+    """按JSON Schema生成一个确定的示例值（用于 response_format 为 json_schema 的请求）"""
+    root = root or schema
+    if "$ref" in schema:
+        schema = root.get("$defs", {}).get(schema["$ref"].rsplit("/", 1)[-1], {})
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"] or schema[key]
+            return sample_from_schema(options[0], root)
+    if "enum" in schema:
+        return schema["enum"][0]
+    schema_type = schema.get("type", "object")
+    if schema_type == "object":
+        return {name: sample_from_schema(prop, root) for name, prop in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return [sample_from_schema(schema.get("items", {}), root) for _ in range(2)]
+    if schema_type in ("integer", "number"):
+        low, high = schema.get("minimum", 0), schema.get("maximum", 100)
+        value = (low + high) / 2
+        return int(value) if schema_type == "integer" else value
+    if schema_type == "boolean":
+        return True
+    if schema_type == "null":
+        return None
+    return FILLER_TEXT
+
+
+def split_tokens(text: str, chars_per_token: int = 2) -> List[str]:
+    """按固定字数把回复切成“token”，用于流式输出和用量统计"""
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)] or [""]
+
+class FakeLLMServer:
+    """模拟模型服务：配置与统计，HTTP处理见 _Handler"""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, latency: str = "fixed:0",
+                 tokens_per_second: float = 0, response_tokens: int = 200, error_rate: float = 0.0,
+                 error_codes: List[int] = None, retry_after: float = None, disconnect_rate: float = 0.0,
+                 responses_file: str = None, seed: int = None, model_name: str = DEFAULT_MODEL_NAME):
+        """
+        初始化
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示自动选择
+            latency: 首字延迟分布（见 parse_distribution）
+            tokens_per_second: 输出速度，0表示不限速
+            response_tokens: 默认回复的token数
+            error_rate: 返回错误的概率
+            error_codes: 注入的HTTP错误码，随机选择其一
+            retry_after: 注入429时返回的 Retry-After 秒数
+            disconnect_rate: 流式输出中途断开连接的概率
+            responses_file: 固定回复文件（见 load_responses）
+            seed: 随机种子，相同种子下延迟与错误序列可复现
+            model_name: 对外报告的模型名
+        """
+        self.host = host
+        self.port = port
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.error_codes = error_codes or [500]
+        self.retry_after = retry_after
+        self.disconnect_rate = disconnect_rate
+        self.model_name = model_name
+        self.responses = load_responses(responses_file)
+
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._sample_latency = parse_distribution(latency, self._rng)
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "streams": 0, "errors": 0, "disconnects": 0,
+                       "prompt_tokens": 0, "completion_tokens": 0}
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """OpenAI兼容接口地址（base_url）"""
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _count(self, key: str, amount: int = 1):
+        """累加统计"""
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取请求统计"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def plan(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        决定本次请求的行为：首字延迟、是否报错/断开、回复token
+
+        在锁内一次性取完随机数，保证并发请求下相同种子的整体序列可复现
+        """
+        with self._rng_lock:
+            latency = self._sample_latency()
+            error_code = self._rng.choice(self.error_codes) if self._rng.random() < self.error_rate else None
+            disconnect = self._rng.random() < self.disconnect_rate
+
+        tokens = split_tokens(self._response_text(request))
+        max_tokens = request.get("max_tokens") or request.get("max_completion_tokens")
+        finish_reason = "stop"
+        if max_tokens and len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            finish_reason = "length"
+        return {"latency": latency, "error_code": error_code, "disconnect": disconnect,
+                "tokens": tokens, "finish_reason": finish_reason}
+
+    def _response_text(self, request: Dict[str, Any]) -> str:
+        """按固定回复匹配最后一条用户消息，未命中时生成默认长度的填充文本（要求JSON输出时生成JSON）"""
+        messages = request.get("messages") or []
+        prompt = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        if isinstance(prompt, list):
+            prompt = "".join(part.get("text", "") for part in prompt if isinstance(part, dict))
+        for entry in self.responses:
+            if entry["pattern"].search(prompt):
+                return entry["response"]
+        response_format = request.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format.get("json_schema", {}).get("schema", {})
+            return json.dumps(sample_from_schema(schema), ensure_ascii=False)
+        if response_format.get("type") == "json_object":
+            return json.dumps({"content": FILLER_TEXT}, ensure_ascii=False)
+        target_chars = self.response_tokens * 2
+        return (FILLER_TEXT * (target_chars // len(FILLER_TEXT) + 1))[:target_chars]
+
+    def token_delay(self) -> float:
+        """相邻两个token之间的间隔（秒）"""
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def start(self) -> "FakeLLMServer":
+        """在后台线程中启动服务，返回自身（端口为0时启动后可从 url 取得实际地址）"""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake_server = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self):
+        """阻塞直到服务停止（命令行模式）"""
+        while self._thread is not None and self._thread.is_alive():
+            self._thread.join(0.5)
+
+    def stop(self):
+        """停止服务"""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+class _Handler(BaseHTTPRequestHandler):
+    """OpenAI兼容接口的请求处理"""
+
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def fake(self) -> FakeLLMServer:
+        """所属的模拟服务"""
+        return self.server.fake_server
+
+    def log_message(self, format, *args):
+        """不输出访问日志，避免影响计时"""
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None):
+        """发送JSON响应"""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        """按 chunked 传输编码写出一块"""
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        """模型列表、健康检查与统计"""
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": self.fake.model_name, "object": "model", "owned_by": "paperhelper"}]})
+        elif self.path.rstrip("/") == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.fake.get_stats())
+        else:
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        """聊天补全"""
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+
+        fake = self.fake
+        plan = fake.plan(request)
+        prompt_chars = sum(len(str(m.get("content") or "")) for m in request.get("messages") or [])
+        fake._count("requests")
+        fake._count("prompt_tokens", prompt_chars // 2)
+
+        time.sleep(plan["latency"])
+        if plan["error_code"] is not None:
+            self._send_error(plan["error_code"])
+            return
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        if request.get("stream"):
+            self._stream(request, plan, completion_id, prompt_chars // 2)
+        else:
+            self._complete(request, plan, completion_id, prompt_chars // 2)
+
+    def _send_error(self, status: int):
+        """注入错误响应（格式与OpenAI一致，429时可附带 Retry-After）"""
+        fake = self.fake
+        fake._count("errors")
+        headers = {}
+        if status == 429 and fake.retry_after is not None:
+            headers["Retry-After"] = f"{fake.retry_after:g}"
+        self._send_json(status, {"error": {
+            "message": f"Injected error {status}",
+            "type": ERROR_TYPES.get(status, "server_error"),
+            "code": status
+        }}, headers)
+
+    def _complete(self, request: Dict[str, Any], plan: Dict[str, Any], completion_id: str, prompt_tokens: int):
+        """非流式回复：等待全部token生成后一次返回"""
+        fake = self.fake
+        tokens = plan["tokens"]
+        time.sleep(fake.token_delay() * len(tokens))
+        fake._count("completion_tokens", len(tokens))
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", fake.model_name),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": plan["finish_reason"]
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                      "total_tokens": prompt_tokens + len(tokens)}
+        })
+
+    def _stream(self, request: Dict[str, Any], plan: Dict[str, Any], completion_id: str, prompt_tokens: int):
+        """SSE流式回复：按输出速度逐token发送，可在中途断开"""
+        fake = self.fake
+        fake._count("streams")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta, finish_reason=None, usage=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", fake.model_name),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        tokens = plan["tokens"]
+        # 输出一半后断开，模拟已开始输出后的网络故障
+        disconnect_at = max(1, len(tokens) // 2) if plan["disconnect"] else None
+        try:
+            event({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if disconnect_at is not None and i == disconnect_at:
+                    fake._count("disconnects")
+                    self.close_connection = True
+                    return
+                if i > 0:
+                    time.sleep(fake.token_delay())
+                event({"content": token})
+            fake._count("completion_tokens", len(tokens))
+            usage = None
+            if (request.get("stream_options") or {}).get("include_usage"):
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                         "total_tokens": prompt_tokens + len(tokens)}
+            event({}, plan["finish_reason"], usage)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前关闭（如对冲请求中落败的一方）
+            self.close_connection = True
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容模拟模型服务")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=int(os.getenv("PAPERHELPER_FAKE_LLM_PORT", DEFAULT_PORT)))
+    parser.add_argument("--latency", default="fixed:0.2",
+                        help="首字延迟分布：fixed:秒、uniform:下限,上限、normal:均值,标准差、"
+                             "lognormal:中位数,sigma、bimodal:快速值,慢速值,慢速概率")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="输出速度，0表示不限速")
+    parser.add_argument("--response-tokens", type=int, default=200, help="默认回复的token数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误的概率")
+    parser.add_argument("--error-codes", default="500", help="注入的HTTP错误码，逗号分隔，如 429,500,503")
+    parser.add_argument("--retry-after", type=float, help="注入429时返回的 Retry-After 秒数")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="流式输出中途断开的概率")
+    parser.add_argument("--responses", help="固定回复文件（JSON列表，每项含 match 正则与 response 文本）")
+    parser.add_argument("--seed", type=int, help="随机种子，用于复现延迟与错误序列")
+    return parser.parse_args()
+
+def main():
+    """主函数"""
+    args = parse_args()
+    server = FakeLLMServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        error_codes=[int(code) for code in args.error_codes.split(",") if code.strip()],
+        retry_after=args.retry_after,
+        disconnect_rate=args.disconnect_rate,
+        responses_file=args.responses,
+        seed=args.seed
+    )
+
+    server.start()
+    print(f"🧪 模拟模型服务已启动: {server.url}")
+    print(f"   首字延迟 {args.latency}，输出速度 {args.tokens_per_second:g} token/s，错误率 {args.error_rate:g}")
+    print(f"   使用方式: PAPERHELPER_FAKE_LLM_URL={server.url} PAPERHELPER_DEFAULT_MODEL=fake_llm streamlit run main.py")
+    try:
+        server.wait()
+    except KeyboardInterrupt:
+        server.stop()
+        print("\n👋 已停止")
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@
 
 import os
 import sys
+import subprocess
+import time
 
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -37,6 +39,58 @@ def test_imports():
     
     return True
 
+def test_import_time():
+    """测试应用模块的导入耗时（冷启动预算）"""
+    print("\n⏱️  测试导入耗时...")
+    
+    budget_ms = float(os.getenv("PAPERHELPER_IMPORT_BUDGET_MS", "3000"))
+    project_root = os.path.join(os.path.dirname(__file__), '..', '..')
+    
+    # 在独立进程中测量，避免受当前进程已导入模块的影响；同时去掉API密钥，
+    # 确认导入阶段不依赖密钥、不导入LangChain
+    env = dict(os.environ)
+    for key in ["DASHSCOPE_API_KEY", "DEEPSEEK_API_KEY"]:
+        env.pop(key, None)
+    
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import src.utils.PaperHelper_utils\n"
+        "heavy = [m for m in ('langchain', 'langchain_openai', 'openai') if m in sys.modules]\n"
+        "import src.core.PaperHelper\n"
+        "print((time.perf_counter() - start) * 1000)\n"
+        "print(','.join(heavy))\n"
+    )
+    
+    try:
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=project_root, env=env,
+            capture_output=True, text=True, timeout=120
+        )
+    except subprocess.TimeoutExpired:
+        print("❌ 导入超时")
+        return False
+    
+    if result.returncode != 0:
+        print(f"❌ 导入失败: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else '未知错误'}")
+        return False
+    
+    lines = result.stdout.strip().splitlines()
+    elapsed_ms = float(lines[-2])
+    heavy_modules = lines[-1].strip()
+    
+    if heavy_modules:
+        print(f"❌ 导入 PaperHelper_utils 时加载了重量级依赖: {heavy_modules}")
+        return False
+    
+    if elapsed_ms > budget_ms:
+        print(f"❌ 导入 src.core.PaperHelper 耗时 {elapsed_ms:.0f} ms，超出预算 {budget_ms:.0f} ms")
+        return False
+    
+    print(f"✅ 导入 src.core.PaperHelper 耗时 {elapsed_ms:.0f} ms（预算 {budget_ms:.0f} ms）")
+    return True
+
 def test_api_key():
     """测试API密钥设置"""
     print("\n🔑 测试API密钥设置...")
@@ -59,17 +113,138 @@ def test_basic_functions():
         
         # 测试默认可行性数据生成
         feasibility_data = generate_default_feasibility_data()
-        if isinstance(feasibility_data, dict) and 'score' in feasibility_data:
+        if isinstance(feasibility_data, dict) and 'score' in feasibility_data and feasibility_data.get('fallback'):
             print("✅ 默认可行性数据生成成功")
         else:
             print("❌ 默认可行性数据生成失败")
             return False
         
+        # 测试结构化输出的本地修复（代码块、单引号、带单位的分数、尾逗号）
+        from src.utils.structured_output import FeasibilityResult, parse_structured
+        
+        data, status, error = parse_structured(
+            "```json\n{'theoretical_score': '80分', 'methodological_score': 70, 'data_score': 60, "
+            "'innovation_score': 90,}\n```", FeasibilityResult)
+        if data and status == "repaired" and data['score'] == 75:
+            print("✅ 结构化输出修复成功")
+        else:
+            print(f"❌ 结构化输出修复失败: {error}")
+            return False
+        
+        # 测试修改稿段落比对（修改第3段：第2-4段重新批注，其余沿用）
+        from src.utils.paragraph_diff import plan_reannotation
+        
+        dirty, reused = plan_reannotation(list("abXdef"), [(h, True) for h in "abcdef"])
+        if dirty == {1, 2, 3} and reused == {0: 0, 4: 4, 5: 5}:
+            print("✅ 修改稿段落比对成功")
+        else:
+            print(f"❌ 修改稿段落比对失败: {sorted(dirty)}")
+            return False
+        
         return True
     except Exception as e:
         print(f"❌ 基本功能测试失败: {e}")
         return False
 
+def test_fake_llm():
+    """使用本地模拟模型服务测试完整调用链路，并测量系统自身开销（不需要网络和API密钥）"""
+    print("\n🧪 测试模拟模型调用链路...")
+    
+    try:
+        from langchain.prompts import ChatPromptTemplate
+        from src.scripts.fake_llm_server import FakeLLMServer
+        from src.config.fast_models_config import fast_models_config
+        from src.config.fast_llm_manager import fast_llm_manager
+        from src.utils.PaperHelper_utils import invoke_chain
+    except ImportError as e:
+        print(f"⚠️  跳过模拟模型测试: {e}")
+        return True
+    
+    latency = 0.05
+    server = FakeLLMServer(port=0, latency=f"fixed:{latency}", response_tokens=50, seed=0).start()
+    # 测试结束后恢复模型表与当前模型
+    previous_config = fast_models_config.models.get("fake_llm")
+    previous_model = (fast_llm_manager.current_model, fast_llm_manager.model_config, fast_llm_manager.llm_instance)
+    try:
+        fast_models_config.models["fake_llm"] = fast_models_config.fake_llm_config(server.url)
+        result = fast_llm_manager.switch_model("fake_llm")
+        if not result["success"]:
+            print(f"❌ 切换到模拟模型失败: {result['error']}")
+            return False
+        
+        chain = ChatPromptTemplate.from_messages([("human", "{question}")]) | fast_llm_manager.get_llm()
+        invoke_chain(chain, {"question": "预热"})
+        
+        rounds = 10
+        start = time.perf_counter()
+        for i in range(rounds):
+            text = invoke_chain(chain, {"question": f"测试{i}"})
+            if not text:
+                print("❌ 模拟模型返回空内容")
+                return False
+        overhead_ms = ((time.perf_counter() - start) / rounds - latency) * 1000
+        print(f"✅ 模拟模型调用成功，单次调用系统开销约 {overhead_ms:.1f} ms（已扣除模拟延迟）")
+        return True
+    except Exception as e:
+        print(f"❌ 模拟模型测试失败: {e}")
+        return False
+    finally:
+        server.stop()
+        if previous_config is None:
+            fast_models_config.models.pop("fake_llm", None)
+        else:
+            fast_models_config.models["fake_llm"] = previous_config
+        fast_llm_manager.current_model, fast_llm_manager.model_config, fast_llm_manager.llm_instance = previous_model
+
+def test_single_flight():
+    """测试单飞请求合并：某个等待方被取消（直接取消或取消令牌）时，其余等待方仍拿到领头调用的结果"""
+    print("\n🧪 测试单飞请求合并...")
+    
+    import asyncio
+    from src.config import cancellation
+    from src.utils.single_flight import SingleFlight
+    
+    flight = SingleFlight(cross_process=False)
+    
+    async def leader():
+        await asyncio.sleep(0.1)
+        return "结果"
+    
+    async def run():
+        tasks = [asyncio.create_task(flight.ado("key", leader)) for _ in range(4)]
+        await asyncio.sleep(0.02)
+        tasks[1].cancel()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def run_with_token():
+        token = cancellation.CancellationToken("test")
+        tasks = [asyncio.create_task(flight.ado("key", leader))]
+        await asyncio.sleep(0.01)
+        with cancellation.scope(token):
+            tasks.extend(asyncio.create_task(flight.ado("key", leader)) for _ in range(2))
+        tasks.append(asyncio.create_task(flight.ado("key", leader)))
+        await asyncio.sleep(0.02)
+        token.cancel("test")
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    
+    try:
+        results = asyncio.run(run())
+        others = [r for i, r in enumerate(results) if i != 1]
+        if not (isinstance(results[1], asyncio.CancelledError) and others == ["结果"] * 3):
+            print(f"❌ 单飞请求合并失败: {results}")
+            return False
+        
+        results = asyncio.run(run_with_token())
+        cancelled = all(isinstance(r, asyncio.CancelledError) for r in results[1:3])
+        if not (cancelled and results[0] == results[3] == "结果"):
+            print(f"❌ 取消令牌后单飞请求合并失败: {results}")
+            return False
+        print("✅ 单飞请求合并成功")
+        return True
+    except Exception as e:
+        print(f"❌ 单飞请求合并测试失败: {e}")
+        return False
+
 def test_file_structure():
     """测试文件结构"""
     print("\n📁 测试文件结构...")
@@ -111,6 +286,11 @@ def main():
         print("\n❌ 模块导入测试失败")
         return False
     
+    # 测试导入耗时
+    if not test_import_time():
+        print("\n❌ 导入耗时测试失败")
+        return False
+    
     # 测试API密钥
     if not test_api_key():
         print("\n⚠️  API密钥未设置，部分功能可能无法使用")
@@ -120,6 +300,16 @@ def main():
         print("\n❌ 基本功能测试失败")
         return False
     
+    # 测试单飞请求合并
+    if not test_single_flight():
+        print("\n❌ 单飞请求合并测试失败")
+        return False
+    
+    # 测试模拟模型调用链路
+    if not test_fake_llm():
+        print("\n❌ 模拟模型测试失败")
+        return False
+    
     print("\n🎉 所有测试通过！")
     print("\n📋 系统状态:")
     print("✅ 文件结构完整")
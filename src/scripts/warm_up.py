@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+新传论文智能辅导系统 - 预热脚本
+提前导入模型依赖、创建模型客户端并打开缓存，可在部署或启动前执行
+"""
+
+import argparse
+import os
+import sys
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="预热新传论文智能辅导系统")
+    parser.add_argument("--research-trends", action="store_true",
+                        help="同时生成研究趋势快照（调用一次模型，缓存库中已有未过期快照时跳过）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    print("🔥 正在预热新传论文智能辅导系统...")
+    
+    from src.utils.PaperHelper_utils import warm_up
+    result = warm_up(research_trends=args.research_trends)
+    
+    for name, elapsed in result["timings_ms"].items():
+        status = "❌" if name in result["errors"] else "✅"
+        print(f"{status} {name}: {elapsed:.0f} ms")
+    
+    if result["errors"]:
+        print("\n⚠️  部分预热步骤失败，请检查依赖和API密钥设置")
+        return False
+    
+    print("\n🎉 预热完成！")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -1,25 +1,55 @@
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai.chat_models.base import BaseChatOpenAI
+"""
+论文辅导核心工具函数
+
+导入本模块不会创建模型客户端，也不会导入LangChain：
+这些工作延迟到第一次调用时完成，或由 warm_up() 在启动阶段提前完成。
+"""
+
 import os
 import json
-import random
+import asyncio
+import concurrent.futures
+import threading
 import hashlib
+import re
 import time
+import unicodedata
 from functools import lru_cache
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from src.utils.llm_cache import llm_cache
+from src.utils.single_flight import single_flight
+from src.config.rate_limiter import rate_limiter
+from src.config.retry_engine import retry_engine, CircuitOpenError
+from src.config.latency_router import latency_router
+from src.config.request_hedger import request_hedger
+from src.config.telemetry import telemetry
+from src.config import cancellation
+from src.utils.document_chunker import split_into_chunks, DEFAULT_MAX_CHARS
+from src.utils.paragraph_diff import split_paragraphs, plan_reannotation, group_batches
+from src.utils.prompt_registry import prompt_registry, estimate_tokens
+from src.utils.snapshot import Snapshot
+from src.utils.job_queue import job_queue
 
 # 从环境变量中获取 API Key - 优先使用通义千问
 api_key = os.getenv("DASHSCOPE_API_KEY") or os.getenv("DEEPSEEK_API_KEY")
 
-# 检查 API Key 是否设置
-if not api_key:
-    raise ValueError("请设置 DASHSCOPE_API_KEY 环境变量（通义千问）或 DEEPSEEK_API_KEY 环境变量")
-
 # 定义 base_url - 使用兼容模式（参考数眸平台配置）
 base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 
-# 缓存机制
-_cache = {}
+# 缓存机制 - 内存热点层 + SQLite持久层（见 src/utils/llm_cache.py）
+# 研究趋势不依赖输入，作为共享快照每天刷新一次（环境变量 PAPERHELPER_TRENDS_REFRESH_SECONDS）
+RESEARCH_TRENDS_REFRESH_SECONDS = float(os.getenv("PAPERHELPER_TRENDS_REFRESH_SECONDS", 24 * 3600))
+
+# 选题分析并发调用的共享截止时间（秒）
+TOPIC_ANALYSIS_TIMEOUT = 90
+# 超过此字数的论文按章节分块批注（环境变量 PAPERHELPER_ANNOTATION_CHUNK_CHARS）
+ANNOTATION_CHUNK_CHARS = int(os.getenv("PAPERHELPER_ANNOTATION_CHUNK_CHARS", DEFAULT_MAX_CHARS))
+# 分维度批注时，短于此字数的章节会合并，短论文通常只有一两块
+DIMENSION_CHUNK_MIN_CHARS = 3000
+# 分维度并行批注对应的批注类型
+DIMENSION_ANNOTATION_TYPE = "全面批注（分维度并行）"
+# 修改稿中需要重新批注的段落超过此比例时改为整篇重新批注
+INCREMENTAL_MAX_CHANGED_RATIO = 0.5
 
 def _generate_cache_key(func_name: str, *args, **kwargs) -> str:
     """生成缓存键"""
@@ -28,81 +58,602 @@ def _generate_cache_key(func_name: str, *args, **kwargs) -> str:
 
 def _get_cached_result(cache_key: str) -> Optional[str]:
     """获取缓存结果"""
-    return _cache.get(cache_key)
+    return llm_cache.get(cache_key)
 
-def _set_cached_result(cache_key: str, result: str):
+def _set_cached_result(cache_key: str, result: str, ttl_seconds: float = None):
     """设置缓存结果"""
-    _cache[cache_key] = result
+    llm_cache.set(cache_key, result, ttl_seconds)
 
-def _retry_with_backoff(func, max_retries=3, base_delay=1):
+def _get_cached_json(cache_key: str) -> Optional[Dict[str, Any]]:
+    """获取JSON格式的缓存结果"""
+    cached_result = _get_cached_result(cache_key)
+    if cached_result:
+        try:
+            return json.loads(cached_result)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+def _set_cached_json(cache_key: str, result: Dict[str, Any], ttl_seconds: float = None):
+    """缓存JSON格式的结果"""
+    _set_cached_result(cache_key, json.dumps(result, ensure_ascii=False), ttl_seconds)
+
+def _lookup_cache(cache_key: str) -> Optional[Dict[str, Any]]:
+    """查询JSON缓存并记录命中情况"""
+    cached_result = _get_cached_json(cache_key)
+    telemetry.record_cache("hit" if cached_result else "miss")
+    return cached_result
+
+def _report_error(label: str, e: Exception):
+    """输出错误日志，并在当前span上标记被降级处理的错误"""
+    print(f"{label}时发生错误: {str(e)}")
+    telemetry.record_error(e)
+
+def _record_usage(span, chain, inputs: Dict[str, Any], text: str, usage: Optional[Dict[str, Any]] = None):
+    """在模型调用span上记录token用量（优先使用模型返回的用量），并按提示词模板累计"""
+    prompt_name = prompt_registry.name_for(chain)
+    if usage:
+        span.set(prompt_tokens=usage.get("input_tokens", 0), completion_tokens=usage.get("output_tokens", 0))
+    elif "completion_tokens" not in span.attributes:
+        prompt_text = "".join(str(value) for value in inputs.values())
+        span.set(prompt_tokens=prompt_registry.template_tokens(prompt_name) + estimate_tokens(prompt_text),
+                 completion_tokens=estimate_tokens(text), tokens_estimated=True)
+    if prompt_name:
+        span.set(prompt=prompt_name)
+        prompt_registry.record_usage(prompt_name, span.attributes.get("prompt_tokens"),
+                                     span.attributes.get("completion_tokens"),
+                                     estimated=span.attributes.get("tokens_estimated", False))
+
+def _normalize_content(content: str) -> str:
+    """规范化论文内容，使仅有空白差异的重复上传命中同一缓存"""
+    text = unicodedata.normalize("NFC", content or "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [line.strip() for line in text.split("\n")]
+    text = "\n".join(lines)
+    # 合并多余空行
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+def _content_hash(content: str) -> str:
+    """计算论文内容的规范化哈希"""
+    return hashlib.sha256(_normalize_content(content).encode("utf-8")).hexdigest()
+
+def _single_flight_call(cache_key: str, compute, force_refresh=False, ttl_seconds: float = None):
+    """
+    带缓存与请求合并的调用
+    
+    相同缓存键的并发调用只有一个真正请求模型，其余等待并共享其结果。
+    
+    Args:
+        cache_key: 缓存键（同时作为合并键）
+        compute: 实际调用函数，返回 (结果字典, 是否可缓存)，降级结果不应缓存
+        force_refresh: 为True时跳过缓存读取
+        ttl_seconds: 缓存有效期，默认使用缓存全局配置
+    """
+    if not force_refresh:
+        cached_result = _lookup_cache(cache_key)
+        if cached_result:
+            return cached_result
+    
+    def leader():
+        # 排队期间其他调用可能刚刚写入缓存
+        if not force_refresh:
+            cached_result = _get_cached_json(cache_key)
+            if cached_result:
+                return cached_result
+        result, cacheable = compute()
+        if cacheable:
+            _set_cached_json(cache_key, result, ttl_seconds)
+        return result
+    
+    if force_refresh:
+        return single_flight.do(f"{cache_key}:refresh", leader)
+    return single_flight.do(cache_key, leader, check_cache=lambda: _get_cached_json(cache_key))
+
+async def _asingle_flight_call(cache_key: str, acompute, force_refresh=False, ttl_seconds: float = None):
+    """带缓存与请求合并的调用 - 异步版，与同步调用共享进行中的请求"""
+    if not force_refresh:
+        cached_result = _lookup_cache(cache_key)
+        if cached_result:
+            return cached_result
+    
+    async def leader():
+        if not force_refresh:
+            cached_result = _get_cached_json(cache_key)
+            if cached_result:
+                return cached_result
+        result, cacheable = await acompute()
+        if cacheable:
+            _set_cached_json(cache_key, result, ttl_seconds)
+        return result
+    
+    if force_refresh:
+        return await single_flight.ado(f"{cache_key}:refresh", leader)
+    return await single_flight.ado(cache_key, leader, check_cache=lambda: _get_cached_json(cache_key))
+
+def get_cache_stats() -> Dict[str, Any]:
+    """获取缓存命中/未命中/淘汰统计，以及请求合并统计"""
+    stats = llm_cache.stats()
+    stats["single_flight"] = single_flight.stats()
+    stats["research_trends"] = research_trends_snapshot.get_stats()
+    return stats
+
+def _quality_tier_for(model_type: str) -> Optional[str]:
+    """模型类型对应的自动路由质量档位，None表示使用配置中的默认档位"""
+    return "high" if model_type == "plus" else None
+
+def _current_model_id(model_type: str = "turbo") -> str:
+    """获取当前模型标识，用于区分不同模型的缓存"""
+    try:
+        from src.config.fast_llm_manager import fast_llm_manager
+        from src.config.fast_models_config import fast_models_config
+        if fast_llm_manager.auto_route:
+            # 自动路由时同一档位的模型共享缓存
+            return f"auto:{_quality_tier_for(model_type) or fast_models_config.default_quality_tier}"
+        return fast_llm_manager.current_model or fast_models_config.default_model
+    except ImportError:
+        return "qwen-turbo" if model_type == "turbo" else "qwen-plus"
+
+# 后台事件循环：异步调用统一在同一个长期运行的事件循环中执行，
+# 避免每次 asyncio.run 新建/关闭事件循环导致异步HTTP客户端失效
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+def _get_background_loop():
+    """获取（必要时启动）后台事件循环"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None or _background_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="paperhelper-async-loop", daemon=True)
+            thread.start()
+            _background_loop = loop
+        return _background_loop
+
+def _bind_context(coro):
+    """让提交到后台事件循环的协程沿用调用方的当前span与取消令牌"""
+    return telemetry.bind(cancellation.bind(coro))
+
+def _future_result(future):
+    """等待后台协程的结果；协程因取消令牌被取消时抛出 RequestCancelledError"""
+    try:
+        return future.result()
+    except concurrent.futures.CancelledError:
+        cancellation.check()
+        raise
+
+def _run_coroutine(coro):
+    """在同步代码（如Streamlit脚本线程）中运行协程，阻塞直到完成"""
+    loop = _get_background_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        raise RuntimeError("不能在后台事件循环内部同步等待协程")
+    return _future_result(asyncio.run_coroutine_threadsafe(_bind_context(coro), loop))
+
+def submit_coroutine(coro):
+    """将协程提交到后台事件循环，立即返回 concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(_bind_context(coro), _get_background_loop())
+
+def _iterate_in_background(async_iterator):
+    """在后台事件循环中驱动异步迭代器，转换为同步生成器"""
+    loop = _get_background_loop()
+    try:
+        while True:
+            try:
+                item = _future_result(asyncio.run_coroutine_threadsafe(_bind_context(async_iterator.__anext__()),
+                                                                       loop))
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        asyncio.run_coroutine_threadsafe(async_iterator.aclose(), loop).result()
+
+def _chunk_text(chunk) -> str:
+    """提取流式输出块中的文本（兼容聊天模型与普通LLM）"""
+    content = getattr(chunk, "content", chunk)
+    return content if isinstance(content, str) else ""
+
+def _stream_with_cache(chain, inputs, cache_key, result_field, fallback_message, error_label,
+                       force_refresh=False, hedge=False):
     """
-    带退避的重试机制
+    流式调用模型并逐块产出文本，完成后写入缓存
+    
+    同一缓存键已有进行中的请求时不再重复请求，等待其完成后一次性产出结果。
     
     Args:
-        func: 要重试的函数
-        max_retries: 最大重试次数
-        base_delay: 基础延迟时间（秒）
+        chain: 提示词与模型组成的调用链
+        inputs: 调用参数
+        cache_key: 缓存键
+        result_field: 结果字典中存放文本的字段名
+        fallback_message: 出错且尚未输出任何内容时产出的提示
+        error_label: 错误日志前缀
+        force_refresh: 为True时不与普通请求合并
+        hedge: 是否允许对冲请求（见 invoke_chain）
+    
+    Returns:
+        （生成器返回值）结果字典；模型调用失败或输出中断时带 "failed": True
     """
-    for attempt in range(max_retries):
+    flight_key = f"{cache_key}:refresh" if force_refresh else cache_key
+    while True:
+        call, is_leader = single_flight.join(flight_key)
+        if is_leader:
+            break
         try:
-            return func()
-        except Exception as e:
-            if attempt == max_retries - 1:
-                raise e
-            
-            # 指数退避
-            delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
-            print(f"请求失败，{delay:.1f}秒后重试... (尝试 {attempt + 1}/{max_retries})")
-            time.sleep(delay)
+            result = single_flight.wait(call)
+        except Exception:
+            # 领头请求被中断，重新加入
+            continue
+        yield result[result_field]
+        return result
+    
+    pieces = []
+    result = None
+    try:
+        for text in _stream_chain(chain, inputs, hedge=hedge):
+            pieces.append(text)
+            yield text
+        
+        if pieces:
+            result = {result_field: "".join(pieces)}
+            _set_cached_json(cache_key, result)
+    except Exception as e:
+        _report_error(error_label, e)
+        if pieces:
+            result = {result_field: "".join(pieces) + "\n\n⚠️ 输出中断，请稍后重试。", "failed": True}
+            yield "\n\n⚠️ 输出中断，请稍后重试。"
+        else:
+            # 熔断时直接告知用户模型暂不可用
+            message = f"⚠️ {str(e)}" if isinstance(e, CircuitOpenError) else fallback_message
+            result = {result_field: message, "failed": True}
+            yield message
+    finally:
+        if result is None:
+            # 调用方中途放弃（如页面重新运行），通知等待方自行重试
+            single_flight.complete(flight_key, call, error=GeneratorExit())
+        else:
+            single_flight.complete(flight_key, call, result=result)
+    return result
+
+def _prompt_from_messages(messages):
+    """构建聊天提示词模板（首次使用时才导入LangChain）"""
+    from langchain.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages(messages)
 
 # 创建 BaseChatOpenAI 实例 - 优化配置（参考数眸平台）
-def get_llm(temperature=0.3, model_type="turbo"):
+def get_llm(temperature=0.3, model_type="turbo", streaming=False):
     """
     获取LLM实例 - 优化版配置
     
     Args:
         temperature: 创造性参数（默认0.3，提高响应速度）
         model_type: 模型类型 ("turbo" 快速响应, "plus" 高质量)
+        streaming: 是否用于流式输出（自动路由时按首字延迟选择模型）
     """
     # 尝试使用快速模型管理器
     try:
         from src.config.fast_llm_manager import fast_llm_manager
-        return fast_llm_manager.get_llm(temperature)
+        return fast_llm_manager.get_llm(temperature, quality_tier=_quality_tier_for(model_type),
+                                        route_metric="ttft" if streaming else "total")
     except ImportError:
         # 回退到通义千问模型 - 优化配置
         model_name = "qwen-turbo" if model_type == "turbo" else "qwen-plus"
-        return BaseChatOpenAI(
-            model=model_name,
-            openai_api_key=api_key,
-            openai_api_base=base_url,
-            temperature=temperature,
-            max_tokens=1500,      # 优化token数量
-            timeout=30,           # 减少超时时间
-            request_timeout=30    # 减少请求超时时间
-        )
-
-# 全局实例使用默认temperature
-llm = get_llm()
+        return _create_fallback_llm(model_name, float(temperature))
 
-def generate_paper(subject, word_count, creativity):
-    """生成论文选题和建议 - 优化版（带缓存）"""
-    # 生成缓存键
-    cache_key = _generate_cache_key("generate_paper", subject, word_count, creativity)
+@lru_cache(maxsize=16)
+def _create_fallback_llm(model_name, temperature):
+    """创建回退用的通义千问实例，相同参数复用同一客户端"""
+    from langchain_openai.chat_models.base import BaseChatOpenAI
     
-    # 检查缓存
-    cached_result = _get_cached_result(cache_key)
-    if cached_result:
-        try:
-            result = json.loads(cached_result)
-            return result.get('title'), result.get('abstract'), result.get('outline')
-        except:
-            pass
+    # 检查 API Key 是否设置
+    if not api_key:
+        raise ValueError("请设置 DASHSCOPE_API_KEY 环境变量（通义千问）或 DEEPSEEK_API_KEY 环境变量")
     
-    # 根据creativity选择模型类型
-    model_type = "plus" if creativity > 0.5 else "turbo"
-    current_llm = get_llm(temperature=creativity, model_type=model_type)
+    # 与快速模型管理器共享同一服务商地址的HTTP连接池
+    try:
+        from src.config.http_client_pool import http_client_pool
+        client_kwargs = http_client_pool.client_kwargs(base_url)
+    except ImportError:
+        client_kwargs = {}
+    
+    return BaseChatOpenAI(
+        model=model_name,
+        openai_api_key=api_key,
+        openai_api_base=base_url,
+        temperature=temperature,
+        max_tokens=1500,      # 优化token数量
+        timeout=30,           # 减少超时时间
+        request_timeout=30,   # 减少请求超时时间
+        **client_kwargs
+    )
+
+def _chain_for(prompt_name: str, temperature=0.3, model_type="turbo", streaming=False):
+    """
+    获取提示词模板与模型组成的调用链
     
-    title_template = ChatPromptTemplate.from_messages([
+    模板只构建一次，相同 (模板, 模型, temperature) 的调用链直接复用（见 src/utils/prompt_registry.py）
+    """
+    llm = get_llm(temperature=temperature, model_type=model_type, streaming=streaming)
+    return prompt_registry.chain(prompt_name, llm, model=_model_id_for(llm, model_type))
+
+def _structured_chain_for(prompt_name: str, schema, temperature=0.2, model_type="turbo"):
+    """
+    获取要求结构化输出的调用链
+    
+    模型配置了 structured_output（json_schema/json_object）时通过 response_format 约束输出，
+    否则与普通调用链相同，完全依赖本地校验与修复
+    """
+    from src.utils.structured_output import response_format_for
+    
+    llm = get_llm(temperature=temperature, model_type=model_type)
+    model_id = _model_id_for(llm, model_type)
+    try:
+        from src.config.fast_models_config import fast_models_config
+        mode = fast_models_config.get_model_config(model_id).get("structured_output")
+    except ImportError:
+        mode = None
+    response_format = response_format_for(schema, mode)
+    return prompt_registry.chain(prompt_name, llm, model=model_id,
+                                 llm_kwargs={"response_format": response_format} if response_format else None)
+
+def _model_id_for(chain, model_type: str = "turbo") -> str:
+    """
+    确定调用链实际使用的模型（自动路由时每个请求可能不同）
+
+    返回真实的模型键，用于限流器、熔断器与模型配置；"auto:档位" 只作为缓存键的命名空间（见 _current_model_id）
+    """
+    llm = getattr(chain, "last", chain)
+    # 绑定了请求参数（如 response_format）的模型
+    llm = getattr(llm, "bound", llm)
+    try:
+        from src.config.fast_llm_manager import fast_llm_manager
+        from src.config.fast_models_config import fast_models_config
+    except ImportError:
+        return _current_model_id(model_type)
+    return (fast_llm_manager.model_key_for(llm) or fast_llm_manager.current_model
+            or fast_models_config.default_model)
+
+def _rebind_chain(chain, model_key: str):
+    """将调用链中的模型替换为指定模型（保留提示词与temperature）"""
+    from src.config.fast_llm_manager import fast_llm_manager
+    
+    llm = fast_llm_manager.get_llm_for(model_key, temperature=getattr(chain.last, "temperature", None))
+    rebound = prompt_registry.rebind(chain, llm, model=model_key)
+    if rebound is not None:
+        return rebound
+    rebound = chain.first
+    for step in chain.middle:
+        rebound = rebound | step
+    return rebound | llm
+
+async def _astream_attempt(chain, inputs: Dict[str, Any], model_id: str):
+    """单次异步流式调用（经限流器并记录延迟；熔断与重试由 retry_engine.astream 负责）"""
+    async with rate_limiter.alimit(model_id):
+        with latency_router.measure(model_id) as measurement:
+            async for chunk in chain.astream(inputs):
+                _record_chunk_usage(chunk)
+                text = _chunk_text(chunk)
+                if text:
+                    measurement.first_token()
+                    yield text
+
+def _hedged_astream(chain, inputs: Dict[str, Any], model_type: str = "turbo"):
+    """对冲流式调用：主模型首字过慢时同时请求备用模型，先输出者胜出；每一路各自按重试策略重试"""
+    primary_id = _model_id_for(chain, model_type)
+    
+    def make_stream(model_key):
+        target = chain if model_key == primary_id else _rebind_chain(chain, model_key)
+        return retry_engine.astream(model_key, lambda: _astream_attempt(target, inputs, model_key))
+    
+    return request_hedger.astream(primary_id, make_stream)
+
+def invoke_chain(chain, inputs: Dict[str, Any], model_type: str = "turbo", hedge: bool = False) -> str:
+    """
+    经限流器和重试引擎调用模型并返回文本
+    
+    所有模型调用都应通过此函数（或其异步/流式版本），以便按模型排队，避免高峰期集中请求触发429；
+    可重试的错误按服务端提示退避重试，模型持续失败时熔断并快速失败
+    
+    Args:
+        chain: 提示词与模型组成的调用链
+        inputs: 调用参数
+        model_type: 模型类型
+        hedge: 对延迟敏感的交互式调用设为True，开启对冲时主模型卡顿会改用备用模型
+    """
+    if cancellation.current_token() is not None:
+        # 可取消的调用走异步路径：令牌取消时直接取消协程，断开进行中的HTTP请求
+        return _run_coroutine(ainvoke_chain(chain, inputs, model_type, hedge))
+    
+    model_id = _model_id_for(chain, model_type)
+    if hedge and request_hedger.enabled:
+        with telemetry.llm_call(model_id, "hedged") as span:
+            text = "".join(_iterate_in_background(_hedged_astream(chain, inputs, model_type)))
+            _record_usage(span, chain, inputs, text)
+            return text
+    
+    def attempt():
+        with rate_limiter.limit(model_id):
+            with latency_router.measure(model_id):
+                return chain.invoke(inputs)
+    
+    with telemetry.llm_call(model_id, "invoke") as span:
+        message = retry_engine.call(model_id, attempt)
+        _record_usage(span, chain, inputs, message.content, getattr(message, "usage_metadata", None))
+        return message.content
+
+async def ainvoke_chain(chain, inputs: Dict[str, Any], model_type: str = "turbo", hedge: bool = False) -> str:
+    """经限流器和重试引擎调用模型并返回文本 - 异步版，排队与退避时不阻塞事件循环"""
+    model_id = _model_id_for(chain, model_type)
+    if hedge and request_hedger.enabled:
+        with telemetry.llm_call(model_id, "hedged") as span:
+            text = "".join([text async for text in _hedged_astream(chain, inputs, model_type)])
+            _record_usage(span, chain, inputs, text)
+            return text
+    
+    async def attempt():
+        async with rate_limiter.alimit(model_id):
+            with latency_router.measure(model_id):
+                return await chain.ainvoke(inputs)
+    
+    with telemetry.llm_call(model_id, "ainvoke") as span:
+        message = await retry_engine.acall(model_id, attempt)
+        _record_usage(span, chain, inputs, message.content, getattr(message, "usage_metadata", None))
+        return message.content
+
+def _stream_chain(chain, inputs: Dict[str, Any], model_type: str = "turbo", hedge: bool = False):
+    """经限流器和重试引擎流式调用模型，逐块产出文本"""
+    model_id = _model_id_for(chain, model_type)
+    if hedge and request_hedger.enabled:
+        return _traced_stream(_iterate_in_background(_hedged_astream(chain, inputs, model_type)),
+                              chain, model_id, "hedged", inputs)
+    if cancellation.current_token() is not None:
+        # 可取消的流式调用同样走异步路径，取消时立即断开连接（不必等下一块输出到达）
+        return _iterate_in_background(_astream_chain(chain, inputs, model_type))
+    
+    def attempt():
+        with rate_limiter.limit(model_id):
+            with latency_router.measure(model_id) as measurement:
+                for chunk in chain.stream(inputs):
+                    _record_chunk_usage(chunk)
+                    text = _chunk_text(chunk)
+                    if text:
+                        measurement.first_token()
+                        yield text
+    
+    return _traced_stream(retry_engine.stream(model_id, attempt), chain, model_id, "stream", inputs)
+
+def _astream_chain(chain, inputs: Dict[str, Any], model_type: str = "turbo"):
+    """经限流器和重试引擎流式调用模型 - 异步版，逐块产出文本"""
+    model_id = _model_id_for(chain, model_type)
+    return _atraced_stream(retry_engine.astream(model_id, lambda: _astream_attempt(chain, inputs, model_id)),
+                           chain, model_id, "astream", inputs)
+
+def _record_chunk_usage(chunk):
+    """流式输出的最后一块通常携带本次调用的token用量"""
+    usage = getattr(chunk, "usage_metadata", None)
+    if usage:
+        telemetry.set_attributes(prompt_tokens=usage.get("input_tokens", 0),
+                                 completion_tokens=usage.get("output_tokens", 0))
+
+def _traced_stream(stream, chain, model_id: str, mode: str, inputs: Dict[str, Any]):
+    """为流式调用创建span，记录首字延迟与token用量"""
+    with telemetry.llm_call(model_id, mode) as span:
+        pieces = []
+        for text in stream:
+            if not pieces:
+                span.set(ttft=span.elapsed())
+            pieces.append(text)
+            yield text
+        _record_usage(span, chain, inputs, "".join(pieces))
+
+async def _atraced_stream(stream, chain, model_id: str, mode: str, inputs: Dict[str, Any]):
+    """为流式调用创建span - 异步版"""
+    with telemetry.llm_call(model_id, mode) as span:
+        pieces = []
+        async for text in stream:
+            if not pieces:
+                span.set(ttft=span.elapsed())
+            pieces.append(text)
+            yield text
+        _record_usage(span, chain, inputs, "".join(pieces))
+
+def get_rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """获取各模型的排队深度与等待时间统计"""
+    return rate_limiter.get_stats()
+
+def get_retry_stats() -> Dict[str, Any]:
+    """获取重试统计与各模型熔断器状态"""
+    return retry_engine.get_stats()
+
+def get_latency_stats() -> Dict[str, Dict[str, Any]]:
+    """获取各模型实测的首字延迟、总耗时与错误率"""
+    return latency_router.get_stats()
+
+def get_prompt_stats() -> Dict[str, Any]:
+    """获取各提示词模板的token开销（按累计prompt token从高到低）与调用链复用统计"""
+    stats = prompt_registry.get_stats()
+    stats["prompts"] = prompt_registry.get_prompt_stats()
+    return stats
+
+def get_hedge_stats() -> Dict[str, Any]:
+    """获取对冲比例、胜出方与额外开销统计"""
+    return request_hedger.get_stats()
+
+def set_hedging(enabled: bool):
+    """开启/关闭对冲请求"""
+    request_hedger.set_enabled(enabled)
+
+_default_llm = None
+_warm_up_lock = threading.Lock()
+_warm_up_started = False
+
+def __getattr__(name):
+    """兼容旧代码中的 `PaperHelper_utils.llm`：首次访问时才创建默认实例"""
+    global _default_llm
+    if name == "llm":
+        if _default_llm is None:
+            _default_llm = get_llm()
+        return _default_llm
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _warm_up_research_trends():
+    """生成研究趋势快照（缓存库中已有未过期的快照时直接采用）"""
+    entry = research_trends_snapshot.refresh()
+    if entry is None:
+        raise RuntimeError("研究趋势快照生成失败")
+
+def warm_up(background=False, research_trends=False) -> Dict[str, Any]:
+    """
+    预热：提前导入LangChain、创建默认模型客户端、构建提示词模板并打开缓存数据库
+    
+    供启动脚本或应用进程启动时调用，使第一个用户请求不再承担这些开销。
+    
+    Args:
+        background: 为True时在后台线程中执行并立即返回（每个进程只执行一次）
+        research_trends: 为True时同时生成研究趋势快照（会调用一次模型），部署后执行可让第一个用户直接读取快照
+    """
+    global _warm_up_started
+    if background:
+        with _warm_up_lock:
+            if _warm_up_started:
+                return {"started": False}
+            _warm_up_started = True
+        thread = threading.Thread(target=warm_up, name="paperhelper-warm-up", daemon=True)
+        thread.start()
+        return {"started": True}
+    
+    timings = {}
+    errors = {}
+    steps = [
+        ("langchain", lambda: _prompt_from_messages([("human", "{input}")])),
+        ("llm", lambda: __getattr__("llm")),
+        ("prompts", lambda: [builder() for builder in (
+            get_topic_title_prompt, get_research_advice_prompt, get_topic_diagnosis_prompt,
+            get_feasibility_prompt, get_research_trends_prompt, get_comprehensive_annotation_prompt,
+            get_format_correction_prompt
+        )]),
+        ("cache", lambda: llm_cache.get("__warm_up__")),
+        ("event_loop", _get_background_loop),
+    ]
+    if research_trends:
+        steps.append(("research_trends", _warm_up_research_trends))
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            errors[name] = str(e)
+            print(f"预热步骤 {name} 失败: {str(e)}")
+        timings[name] = (time.perf_counter() - start) * 1000
+    
+    return {"timings_ms": timings, "errors": errors}
+
+@prompt_registry.register("topic_title")
+def get_topic_title_prompt():
+    """获取论文选题提示词"""
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，具有丰富的论文指导经验。请为以下研究主题提供高质量的论文选题建议。
 
 研究主题：{subject}
@@ -115,8 +666,11 @@ def generate_paper(subject, word_count, creativity):
 
 请直接返回题目列表，每个题目一行。""")
     ])
-    
-    abstract_template = ChatPromptTemplate.from_messages([
+
+@prompt_registry.register("research_advice")
+def get_research_advice_prompt():
+    """获取论文研究建议提示词"""
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，请为以下论文题目提供详细的研究建议。
 
 论文题目：{title}
@@ -146,45 +700,209 @@ def generate_paper(subject, word_count, creativity):
 请确保内容专业、具体、可操作，符合新闻传播学学术规范。""")
     ])
 
-    # 使用特定temperature的llm
-    title_chain = title_template | current_llm
-    abstract_chain = abstract_template | current_llm
+def _model_type_for(creativity) -> str:
+    """根据creativity选择模型类型"""
+    return "plus" if creativity > 0.5 else "turbo"
+
+def _generate_paper_cache_key(subject, word_count, creativity) -> str:
+    """generate_paper的缓存键"""
+    return _generate_cache_key("generate_paper", subject, word_count, creativity,
+                               _current_model_id(_model_type_for(creativity)))
+
+def _generate_paper_chains(creativity):
+    """构建选题与研究建议调用链（使用特定temperature的llm）"""
+    model_type = _model_type_for(creativity)
+    return (_chain_for("topic_title", temperature=creativity, model_type=model_type),
+            _chain_for("research_advice", temperature=creativity, model_type=model_type))
 
+@telemetry.traced()
+def generate_paper(subject, word_count, creativity):
+    """生成论文选题和建议 - 优化版（带缓存）"""
+    # 生成缓存键
+    cache_key = _generate_paper_cache_key(subject, word_count, creativity)
+    
+    def compute():
+        title_chain, abstract_chain = _generate_paper_chains(creativity)
+        model_type = _model_type_for(creativity)
+        try:
+            def get_title():
+                return invoke_chain(title_chain, {"subject": subject, "word_count": word_count}, model_type)
+            
+            def get_abstract():
+                return invoke_chain(abstract_chain, {
+                    "title": title, 
+                    "word_count": word_count
+                }, model_type)
+            
+            # 获取标题（重试与熔断由 invoke_chain 统一处理）
+            title = get_title()
+            
+            # 生成摘要和研究建议
+            abstract = get_abstract()
+            
+            return {'title': title, 'abstract': abstract, 'outline': None}, True
+        except Exception as e:
+            _report_error("生成论文内容", e)
+            return {'title': None, 'abstract': None, 'outline': None}, False
+    
+    # 检查缓存；相同选题的并发请求合并为一次模型调用
+    result = _single_flight_call(cache_key, compute)
+    return result.get('title'), result.get('abstract'), result.get('outline')
+
+@telemetry.traced()
+async def agenerate_paper(subject, word_count, creativity):
+    """生成论文选题和建议 - 异步版"""
+    cache_key = _generate_paper_cache_key(subject, word_count, creativity)
+    
+    async def compute():
+        title_chain, abstract_chain = _generate_paper_chains(creativity)
+        model_type = _model_type_for(creativity)
+        try:
+            async def get_title():
+                return await ainvoke_chain(title_chain, {"subject": subject, "word_count": word_count}, model_type)
+            
+            title = await get_title()
+            
+            async def get_abstract():
+                return await ainvoke_chain(abstract_chain, {"title": title, "word_count": word_count}, model_type)
+            
+            abstract = await get_abstract()
+            
+            return {'title': title, 'abstract': abstract, 'outline': None}, True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _report_error("生成论文内容", e)
+            return {'title': None, 'abstract': None, 'outline': None}, False
+    
+    result = await _asingle_flight_call(cache_key, compute)
+    return result.get('title'), result.get('abstract'), result.get('outline')
+
+# 逐题生成研究建议时最多处理的题目数（提示词要求3-5个）
+MAX_SPECULATIVE_TITLES = 5
+# 题目行首的编号或列表符号，如 "1."、"（2）"、"- "
+_TITLE_PREFIX_PATTERN = re.compile(r"^(?:[-*•·]|\d+\s*[.、)）]|[（(]\d+[)）]|题目\s*\d*\s*[:：])\s*")
+
+def _parse_title_line(line: str) -> Optional[str]:
+    """从选题输出的一行中提取题目，说明性文字（如“以下是题目：”）返回None"""
+    title = _TITLE_PREFIX_PATTERN.sub("", line.strip()).strip("*# ").strip()
+    if not title or title.endswith((":", "：")):
+        return None
+    if title[0] in "《\"“" and title[-1] in "》\"”":
+        title = title[1:-1].strip()
+    return title or None
+
+async def _astream_titles(title_chain, inputs: Dict[str, Any], model_type: str):
+    """流式调用选题链，每解析出一个完整题目（一行）就立即产出"""
+    stream = _astream_chain(title_chain, inputs, model_type)
+    buffer = ""
+    count = 0
     try:
-        # 使用重试机制获取标题
-        def get_title():
-            return title_chain.invoke({"subject": subject, "word_count": word_count}).content
-        
-        def get_abstract():
-            return abstract_chain.invoke({
-                "title": title, 
-                "word_count": word_count
-            }).content
-        
-        # 获取标题
-        title = _retry_with_backoff(get_title)
-        
-        # 生成摘要和研究建议
-        abstract = _retry_with_backoff(get_abstract)
-        
-        # 缓存结果
-        result = {
-            'title': title,
-            'abstract': abstract,
-            'outline': None
-        }
-        _set_cached_result(cache_key, json.dumps(result, ensure_ascii=False))
-        
-        return title, abstract, None
-    except Exception as e:
-        print(f"生成论文内容时发生错误: {str(e)}")
-        return None, None, None
+        async for text in stream:
+            buffer += text
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                title = _parse_title_line(line)
+                if title:
+                    yield title
+                    count += 1
+                    if count >= MAX_SPECULATIVE_TITLES:
+                        return
+    finally:
+        # 题目数已够时提前结束模型输出
+        await stream.aclose()
+    title = _parse_title_line(buffer)
+    if title:
+        yield title
+
+def _title_list_cache_key(subject, word_count, creativity) -> str:
+    """逐题模式下选题列表的缓存键"""
+    return _generate_cache_key("topic_titles", subject, word_count, creativity,
+                               _current_model_id(_model_type_for(creativity)))
+
+def _title_advice_cache_key(title, word_count, creativity) -> str:
+    """单个题目研究建议的缓存键"""
+    return _generate_cache_key("title_advice", title.strip(), word_count, creativity,
+                               _current_model_id(_model_type_for(creativity)))
+
+@telemetry.traced()
+def get_title_advice(title, word_count, creativity, force_refresh=False):
+    """
+    生成单个题目的研究建议（按题目缓存）
+    
+    Args:
+        force_refresh: 为True时忽略缓存重新生成（页面上的“🔄 重新生成”）
+    """
+    def compute():
+        model_type = _model_type_for(creativity)
+        advice_chain = _chain_for("research_advice", temperature=creativity, model_type=model_type)
+        try:
+            return {"advice": invoke_chain(advice_chain, {"title": title, "word_count": word_count}, model_type)}, True
+        except Exception as e:
+            _report_error("生成研究建议", e)
+            return {"advice": "研究建议暂时无法生成，请稍后重试。"}, False
+    
+    return _single_flight_call(_title_advice_cache_key(title, word_count, creativity), compute, force_refresh)
+
+@telemetry.traced()
+async def aget_title_advice(title, word_count, creativity, force_refresh=False):
+    """生成单个题目的研究建议 - 异步版"""
+    async def compute():
+        model_type = _model_type_for(creativity)
+        advice_chain = _chain_for("research_advice", temperature=creativity, model_type=model_type)
+        try:
+            advice = await ainvoke_chain(advice_chain, {"title": title, "word_count": word_count}, model_type)
+            return {"advice": advice}, True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _report_error("生成研究建议", e)
+            return {"advice": "研究建议暂时无法生成，请稍后重试。"}, False
+    
+    return await _asingle_flight_call(_title_advice_cache_key(title, word_count, creativity), compute, force_refresh)
 
-def topic_diagnosis(topic, research_type):
-    """选题诊断分析"""
-    current_llm = get_llm(temperature=0.3)
+@telemetry.traced()
+async def agenerate_paper_per_title(subject, word_count, creativity):
+    """
+    逐题生成论文选题与研究建议
+    
+    流式解析选题输出，每解析出一个题目就立即并发请求该题目的研究建议，
+    不必等全部题目生成完；每个题目的建议单独缓存，可单独重新生成（见 get_title_advice）。
+    
+    Returns:
+        {"titles": [题目], "advice": [对应的研究建议]}
+    """
+    model_type = _model_type_for(creativity)
+    cache_key = _title_list_cache_key(subject, word_count, creativity)
+    cached = _lookup_cache(cache_key)
+    titles = list(cached["titles"]) if cached else []
+    tasks = [asyncio.ensure_future(aget_title_advice(title, word_count, creativity)) for title in titles]
+    
+    try:
+        if not cached:
+            title_chain = _chain_for("topic_title", temperature=creativity, model_type=model_type)
+            try:
+                async for title in _astream_titles(title_chain, {"subject": subject, "word_count": word_count},
+                                                   model_type):
+                    titles.append(title)
+                    tasks.append(asyncio.ensure_future(aget_title_advice(title, word_count, creativity)))
+                if titles:
+                    _set_cached_json(cache_key, {"titles": titles})
+            except Exception as e:
+                # 已解析出的题目照常生成建议
+                _report_error("生成论文选题", e)
+        advice = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
     
-    diagnosis_template = ChatPromptTemplate.from_messages([
+    return {"titles": titles, "advice": [item["advice"] for item in advice]}
+
+@prompt_registry.register("topic_diagnosis")
+def get_topic_diagnosis_prompt():
+    """获取选题诊断提示词"""
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，请对以下选题进行专业诊断。
 
 研究主题：{topic}
@@ -215,25 +933,70 @@ def topic_diagnosis(topic, research_type):
 
 请提供详细的分析报告，确保专业、客观、具体。""")
     ])
+
+def _topic_diagnosis_cache_key(topic, research_type) -> str:
+    """选题诊断缓存键"""
+    return _generate_cache_key("topic_diagnosis", topic, research_type, _current_model_id())
+
+@telemetry.traced()
+def topic_diagnosis(topic, research_type):
+    """选题诊断分析"""
+    def compute():
+        diagnosis_chain = _chain_for("topic_diagnosis", temperature=0.3)
+        try:
+            result = invoke_chain(diagnosis_chain, {
+                "topic": topic,
+                "research_type": research_type
+            }, hedge=True)
+            
+            return {"analysis": result}, True
+        except Exception as e:
+            _report_error("选题诊断", e)
+            return {"analysis": "诊断分析暂时无法完成，请稍后重试。"}, False
     
-    diagnosis_chain = diagnosis_template | current_llm
+    return _single_flight_call(_topic_diagnosis_cache_key(topic, research_type), compute)
+
+@telemetry.traced()
+async def atopic_diagnosis(topic, research_type):
+    """选题诊断分析 - 异步版"""
+    async def compute():
+        diagnosis_chain = _chain_for("topic_diagnosis", temperature=0.3)
+        try:
+            result = await ainvoke_chain(diagnosis_chain, {
+                "topic": topic,
+                "research_type": research_type
+            }, hedge=True)
+            
+            return {"analysis": result}, True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _report_error("选题诊断", e)
+            return {"analysis": "诊断分析暂时无法完成，请稍后重试。"}, False
     
-    try:
-        result = diagnosis_chain.invoke({
-            "topic": topic,
-            "research_type": research_type
-        }).content
-        
-        return {"analysis": result}
-    except Exception as e:
-        print(f"选题诊断时发生错误: {str(e)}")
-        return {"analysis": "诊断分析暂时无法完成，请稍后重试。"}
+    return await _asingle_flight_call(_topic_diagnosis_cache_key(topic, research_type), compute)
 
-def analyze_topic_feasibility(topic, research_type):
-    """分析选题可行性"""
-    current_llm = get_llm(temperature=0.2)
+@telemetry.traced()
+def stream_topic_diagnosis(topic, research_type):
+    """选题诊断分析 - 流式版，逐块产出诊断文本"""
+    cache_key = _topic_diagnosis_cache_key(topic, research_type)
+    cached_result = _lookup_cache(cache_key)
+    if cached_result:
+        yield cached_result["analysis"]
+        return cached_result
     
-    feasibility_template = ChatPromptTemplate.from_messages([
+    diagnosis_chain = _chain_for("topic_diagnosis", temperature=0.3, streaming=True)
+    return (yield from _stream_with_cache(
+        diagnosis_chain,
+        {"topic": topic, "research_type": research_type},
+        cache_key, "analysis",
+        "诊断分析暂时无法完成，请稍后重试。", "选题诊断", hedge=True
+    ))
+
+@prompt_registry.register("feasibility")
+def get_feasibility_prompt():
+    """获取选题可行性评分提示词"""
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，请对以下选题进行可行性评分和分析。
 
 研究主题：{topic}
@@ -261,42 +1024,126 @@ def analyze_topic_feasibility(topic, research_type):
 
 请确保返回的是有效的JSON格式。""")
     ])
+
+@prompt_registry.register("json_repair")
+def get_json_repair_prompt():
+    """获取JSON修正提示词（结构化输出本地修复失败时的最后一次调用）"""
+    return _prompt_from_messages([
+        ("human", """下面是一段本应符合JSON Schema的输出，但未通过校验。请在不改变原有分析内容和评分的前提下修正它。
+
+JSON Schema：
+{schema}
+
+校验错误：
+{error}
+
+原输出：
+{output}
+
+只返回修正后的JSON对象，不要附加任何解释。""")
+    ])
+
+def _parse_structured_output(text: str, schema):
+    """本地解析并校验结构化输出，记录校验结果"""
+    from src.utils.structured_output import parse_structured
     
-    feasibility_chain = feasibility_template | current_llm
+    data, status, error = parse_structured(text, schema)
+    telemetry.inc("paperhelper_structured_output_total", schema=schema.__name__, status=status)
+    telemetry.set_attributes(structured_output=status)
+    return data, error
+
+def _feasibility_repair_inputs(text: str, error: str, schema) -> Dict[str, Any]:
+    """JSON修正调用的参数"""
+    from src.utils.structured_output import schema_description
+    return {"schema": schema_description(schema), "error": error, "output": text}
+
+def _feasibility_result(data):
+    """
+    可行性分析的最终结果
     
-    try:
-        result = feasibility_chain.invoke({
-            "topic": topic,
-            "research_type": research_type
-        }).content
+    Returns:
+        (可行性数据, 是否可缓存)；校验未通过时返回标记为默认的数据，且不入缓存
+    """
+    if data is None:
+        return generate_default_feasibility_data(), False
+    data["fallback"] = False
+    return data, True
+
+def _feasibility_cache_key(topic, research_type) -> str:
+    """可行性分析缓存键"""
+    return _generate_cache_key("analyze_topic_feasibility", topic, research_type, _current_model_id())
+
+@telemetry.traced()
+def analyze_topic_feasibility(topic, research_type):
+    """分析选题可行性"""
+    def compute():
+        from src.utils.structured_output import FeasibilityResult
         
-        # 尝试解析JSON结果
+        feasibility_chain = _structured_chain_for("feasibility", FeasibilityResult, temperature=0.2)
         try:
-            # 提取JSON部分
-            json_start = result.find('{')
-            json_end = result.rfind('}') + 1
-            if json_start != -1 and json_end != 0:
-                json_str = result[json_start:json_end]
-                feasibility_data = json.loads(json_str)
-            else:
-                # 如果无法解析JSON，生成默认数据
-                feasibility_data = generate_default_feasibility_data()
-        except json.JSONDecodeError:
-            feasibility_data = generate_default_feasibility_data()
+            result = invoke_chain(feasibility_chain, {
+                "topic": topic,
+                "research_type": research_type
+            })
+            data, error = _parse_structured_output(result, FeasibilityResult)
+            if data is None:
+                # 本地修复失败，最后再调用一次：只让模型修正原输出，不重新分析
+                repair_chain = _structured_chain_for("json_repair", FeasibilityResult, temperature=0)
+                result = invoke_chain(repair_chain, _feasibility_repair_inputs(result, error, FeasibilityResult))
+                data, error = _parse_structured_output(result, FeasibilityResult)
+                if data is None:
+                    print(f"可行性分析结果未通过校验，使用默认数据: {error}")
+            
+            # 只缓存通过校验的评分，默认数据不入缓存
+            return _feasibility_result(data)
+        except Exception as e:
+            _report_error("可行性分析", e)
+            return generate_default_feasibility_data(), False
+    
+    return _single_flight_call(_feasibility_cache_key(topic, research_type), compute)
+
+@telemetry.traced()
+async def aanalyze_topic_feasibility(topic, research_type):
+    """分析选题可行性 - 异步版"""
+    async def compute():
+        from src.utils.structured_output import FeasibilityResult
         
-        return feasibility_data
-    except Exception as e:
-        print(f"可行性分析时发生错误: {str(e)}")
-        return generate_default_feasibility_data()
+        feasibility_chain = _structured_chain_for("feasibility", FeasibilityResult, temperature=0.2)
+        try:
+            result = await ainvoke_chain(feasibility_chain, {
+                "topic": topic,
+                "research_type": research_type
+            })
+            data, error = _parse_structured_output(result, FeasibilityResult)
+            if data is None:
+                repair_chain = _structured_chain_for("json_repair", FeasibilityResult, temperature=0)
+                result = await ainvoke_chain(repair_chain, _feasibility_repair_inputs(result, error, FeasibilityResult))
+                data, error = _parse_structured_output(result, FeasibilityResult)
+                if data is None:
+                    print(f"可行性分析结果未通过校验，使用默认数据: {error}")
+            
+            return _feasibility_result(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _report_error("可行性分析", e)
+            return generate_default_feasibility_data(), False
+    
+    return await _asingle_flight_call(_feasibility_cache_key(topic, research_type), compute)
 
 def generate_default_feasibility_data():
-    """生成默认的可行性数据"""
+    """
+    生成默认的可行性数据
+    
+    模型未给出有效评分时使用：不编造分数（评分为None），fallback 为True，界面据此提示
+    """
     return {
-        "theoretical_score": random.randint(60, 85),
-        "methodological_score": random.randint(65, 90),
-        "data_score": random.randint(50, 80),
-        "innovation_score": random.randint(70, 95),
-        "score": random.randint(65, 85),
+        "theoretical_score": None,
+        "methodological_score": None,
+        "data_score": None,
+        "innovation_score": None,
+        "score": None,
+        "fallback": True,
         "theoretical": "理论可行性需要进一步评估",
         "methodological": "方法可行性需要具体分析",
         "data_availability": "数据可获得性需要调研",
@@ -309,11 +1156,10 @@ def generate_default_feasibility_data():
         ]
     }
 
-def get_research_trends():
-    """获取研究趋势"""
-    current_llm = get_llm(temperature=0.4)
-    
-    trends_template = ChatPromptTemplate.from_messages([
+@prompt_registry.register("research_trends")
+def get_research_trends_prompt():
+    """获取研究趋势提示词"""
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，请总结当前新闻传播学领域的研究趋势和热点话题。
 
 请从以下方面进行分析：
@@ -340,50 +1186,554 @@ def get_research_trends():
 
 请提供详细的分析报告，帮助研究者了解学科发展动态。""")
     ])
+
+RESEARCH_TRENDS_FALLBACK = "研究趋势分析暂时无法完成，请稍后重试。"
+
+def _generate_research_trends():
+    """调用模型生成研究趋势，返回 (文本, 是否成功)"""
+    try:
+        trends_chain = _chain_for("research_trends", temperature=0.4)
+        return invoke_chain(trends_chain, {}), True
+    except Exception as e:
+        _report_error("获取研究趋势", e)
+        return None, False
+
+# 研究趋势快照：所有会话共享，过期后先返回旧快照并在后台刷新
+research_trends_snapshot = Snapshot("research_trends", _generate_research_trends, RESEARCH_TRENDS_REFRESH_SECONDS)
+
+def _research_trends_result(entry: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """快照转换为研究趋势结果"""
+    if entry is None:
+        return {"trends": RESEARCH_TRENDS_FALLBACK}
+    return {"trends": entry["value"], "updated_at": entry["updated_at"], "stale": entry["stale"]}
+
+@telemetry.traced()
+def get_research_trends():
+    """
+    获取研究趋势
+
+    直接读取共享快照；只有进程内与缓存库中都还没有快照时才同步调用模型
+
+    Returns:
+        {"trends": 文本, "updated_at": 生成时间戳, "stale": 是否已过期（正在后台刷新）}
+    """
+    return _research_trends_result(research_trends_snapshot.get())
+
+@telemetry.traced()
+async def aget_research_trends():
+    """获取研究趋势 - 异步版"""
+    if research_trends_snapshot.peek() is None:
+        # 首次生成需要调用模型，放到线程中执行以免阻塞事件循环
+        return _research_trends_result(await asyncio.to_thread(research_trends_snapshot.get))
+    return _research_trends_result(research_trends_snapshot.get())
+
+def start_research_trends_refresh() -> bool:
+    """
+    启动研究趋势快照的定时刷新（每个进程只启动一次）
+
+    设置环境变量 PAPERHELPER_TRENDS_REFRESH=0 时不启动，快照仍会在过期后被读取时后台刷新
+    """
+    if os.getenv("PAPERHELPER_TRENDS_REFRESH", "1") != "1":
+        return False
+    return research_trends_snapshot.start()
+
+# 批注类型 -> 提示词模板名称
+ANNOTATION_PROMPTS = {
+    "全面批注": "comprehensive_annotation",
+    "学术规范性": "academic_standard",
+    "逻辑结构": "logic_structure",
+    "内容质量": "content_quality",
+    "语言表达": "language_expression"
+}
+
+def _annotation_prompt_name(annotation_type) -> str:
+    """批注类型对应的提示词模板名称，未知类型使用全面批注"""
+    return ANNOTATION_PROMPTS.get(annotation_type, "comprehensive_annotation")
+
+def get_annotation_prompt(annotation_type):
+    """根据批注类型选择不同的提示词"""
+    return prompt_registry.template(_annotation_prompt_name(annotation_type))
+
+def _annotation_cache_key(paper_content, annotation_type) -> str:
+    """批注缓存键：规范化内容哈希 + 批注类型 + 模型"""
+    return _generate_cache_key("intelligent_annotation", _content_hash(paper_content),
+                               annotation_type, _current_model_id())
+
+@telemetry.traced()
+def intelligent_annotation(paper_content, annotation_type="comprehensive", force_refresh=False, structure=None,
+                           draft_id=None):
+    """
+    智能批注功能 - 增强版
+    
+    长论文按章节分块并发批注后合并，短论文整篇批注
+    
+    Args:
+        paper_content: 论文内容
+        annotation_type: 批注类型
+        force_refresh: 为True时跳过缓存重新批注（结果仍会写回缓存）
+        structure: 文档处理器给出的结构分析结果，用于分块；为None时现场分析
+        draft_id: 草稿ID。该草稿已有上一版本的批注时，只重新批注修改过的段落及其相邻段落，
+            并与上一版本的批注合并；否则整篇批注，结果记为该草稿的上一版本
+    
+    Returns:
+        {"annotation": 批注文本, ...}；模型调用失败（含部分章节失败）时带 "failed": True，annotation 为提示文本
+    """
+    plan = _incremental_plan(paper_content, annotation_type, draft_id, force_refresh, structure)
+    if plan is not None:
+        return _run_coroutine(_aincremental_annotation(plan))
+    
+    def compute():
+        if annotation_type == DIMENSION_ANNOTATION_TYPE:
+            return _run_coroutine(_adimension_annotation(paper_content, force_refresh, structure))
+        if _needs_chunking(paper_content):
+            return _run_coroutine(_achunked_annotation(paper_content, annotation_type, force_refresh, structure))
+        
+        annotation_chain = _chain_for(_annotation_prompt_name(annotation_type), temperature=0.2)
+        try:
+            result = invoke_chain(annotation_chain, {
+                "paper_content": paper_content,
+                "annotation_type": annotation_type
+            })
+            
+            return {"annotation": result}, True
+        except Exception as e:
+            _report_error("智能批注", e)
+            return {"annotation": "批注分析暂时无法完成，请稍后重试。", "failed": True}, False
+    
+    # 按规范化内容哈希 + 批注类型 + 模型缓存，重复上传同一文档可直接命中
+    cache_key = _annotation_cache_key(paper_content, annotation_type)
+    result = _single_flight_call(cache_key, compute, force_refresh)
+    _save_draft_baseline(draft_id, annotation_type, paper_content, result)
+    return result
+
+@telemetry.traced()
+async def aintelligent_annotation(paper_content, annotation_type="comprehensive", force_refresh=False,
+                                  structure=None, draft_id=None):
+    """智能批注功能 - 异步版"""
+    plan = _incremental_plan(paper_content, annotation_type, draft_id, force_refresh, structure)
+    if plan is not None:
+        return await _aincremental_annotation(plan)
     
-    trends_chain = trends_template | current_llm
+    async def compute():
+        if annotation_type == DIMENSION_ANNOTATION_TYPE:
+            return await _adimension_annotation(paper_content, force_refresh, structure)
+        if _needs_chunking(paper_content):
+            return await _achunked_annotation(paper_content, annotation_type, force_refresh, structure)
+        
+        annotation_chain = _chain_for(_annotation_prompt_name(annotation_type), temperature=0.2)
+        try:
+            result = await ainvoke_chain(annotation_chain, {
+                "paper_content": paper_content,
+                "annotation_type": annotation_type
+            })
+            
+            return {"annotation": result}, True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _report_error("智能批注", e)
+            return {"annotation": "批注分析暂时无法完成，请稍后重试。", "failed": True}, False
+    
+    cache_key = _annotation_cache_key(paper_content, annotation_type)
+    result = await _asingle_flight_call(cache_key, compute, force_refresh)
+    _save_draft_baseline(draft_id, annotation_type, paper_content, result)
+    return result
+
+@telemetry.traced()
+def stream_intelligent_annotation(paper_content, annotation_type="comprehensive", force_refresh=False,
+                                  structure=None, draft_id=None):
+    """
+    智能批注功能 - 流式版，逐块产出批注文本（长论文按章节顺序逐节产出，修改稿按段落顺序产出）
     
+    生成器返回值为与 intelligent_annotation 相同的结果字典，模型调用失败时带 "failed": True
+    """
+    plan = _incremental_plan(paper_content, annotation_type, draft_id, force_refresh, structure)
+    if plan is not None:
+        return (yield from _stream_incremental_annotation(plan))
+    
+    cache_key = _annotation_cache_key(paper_content, annotation_type)
+    result = yield from _stream_full_annotation(paper_content, annotation_type, force_refresh, structure, cache_key)
+    _save_draft_baseline(draft_id, annotation_type, paper_content, result)
+    return result
+
+def _stream_full_annotation(paper_content, annotation_type, force_refresh, structure, cache_key):
+    """整篇批注 - 流式版（优先读取缓存）"""
+    if not force_refresh:
+        cached_result = _lookup_cache(cache_key)
+        if cached_result:
+            yield cached_result["annotation"]
+            return cached_result
+    
+    if annotation_type == DIMENSION_ANNOTATION_TYPE:
+        return (yield from _stream_dimension_annotation(paper_content, force_refresh, structure, cache_key))
+    if _needs_chunking(paper_content):
+        return (yield from _stream_chunked_annotation(paper_content, annotation_type, force_refresh, structure,
+                                                      cache_key))
+    
+    annotation_chain = _chain_for(_annotation_prompt_name(annotation_type), temperature=0.2, streaming=True)
+    return (yield from _stream_with_cache(
+        annotation_chain,
+        {"paper_content": paper_content, "annotation_type": annotation_type},
+        cache_key, "annotation",
+        "批注分析暂时无法完成，请稍后重试。", "智能批注", force_refresh
+    ))
+
+def _needs_chunking(paper_content) -> bool:
+    """论文是否超过单次批注的长度上限"""
+    return len(_normalize_content(paper_content)) > ANNOTATION_CHUNK_CHARS
+
+@prompt_registry.register("section_annotation")
+def get_section_annotation_prompt():
+    """获取章节批注提示词（长论文分块批注时使用）"""
+    return _prompt_from_messages([
+        ("human", """你是一位资深的新闻传播学教授，正在分章节批注一篇学位论文。
+
+论文题目：{paper_title}
+当前部分：{section_title}（全文共{section_total}部分，这是第{section_index}部分）
+批注重点：{annotation_type}
+
+本部分内容：
+{paper_content}
+
+请只针对本部分内容进行批注：
+1. **本部分概述**：一两句话概括本部分的作用
+2. **主要问题**：按重要程度列出问题，尽量引用原文定位
+3. **修改建议**：给出具体、可操作的修改建议和示例
+4. **与全文的衔接**：本部分在论文整体中的承接是否合理
+
+请保持简洁，不要重复论文原文，不要评价其他部分。""")
+    ])
+
+def _section_cache_key(chunk: Dict[str, Any], annotation_type) -> str:
+    """章节批注缓存键：只依赖本块内容，修改其他章节后本块仍可命中"""
+    return _generate_cache_key("section_annotation", _content_hash(chunk["content"]), chunk["title"],
+                               annotation_type, _current_model_id())
+
+async def _aannotate_section(chunk: Dict[str, Any], total: int, paper_title: str, annotation_type,
+                             force_refresh=False) -> Dict[str, Any]:
+    """批注单个章节，经限流器与其他章节并发执行"""
+    async def compute():
+        section_chain = _chain_for("section_annotation", temperature=0.2)
+        try:
+            result = await ainvoke_chain(section_chain, {
+                "paper_title": paper_title,
+                "section_title": chunk["title"],
+                "section_index": chunk["index"] + 1,
+                "section_total": total,
+                "annotation_type": annotation_type,
+                "paper_content": chunk["content"]
+            })
+            return {"annotation": result}, True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _report_error(f"批注章节「{chunk['title']}」", e)
+            return {"annotation": "⚠️ 本部分批注暂时无法完成，请稍后重试。", "failed": True}, False
+    
+    return await _asingle_flight_call(_section_cache_key(chunk, annotation_type), compute, force_refresh)
+
+def _paper_title(paper_content, structure) -> str:
+    """论文题目（结构分析结果中的标题，否则取首行）"""
+    title = (structure or {}).get("title")
+    if title:
+        return title
+    lines = [line.strip() for line in paper_content.split("\n") if line.strip()]
+    return lines[0][:100] if lines else "未命名论文"
+
+def _chunked_annotation_header(chunks, annotation_type) -> str:
+    """分块批注报告的目录"""
+    lines = [f"## 📑 分章节批注（{annotation_type}，共{len(chunks)}部分）", ""]
+    for chunk in chunks:
+        lines.append(f"- §{chunk['index'] + 1} {chunk['title']}（约{len(chunk['content'])}字）")
+    return "\n".join(lines) + "\n\n"
+
+def _chunked_annotation_section(chunk, result) -> str:
+    """分块批注报告中单个章节的内容，以 §序号 作为锚点"""
+    return f"---\n\n### §{chunk['index'] + 1} {chunk['title']}\n\n{result['annotation']}\n\n"
+
+def _prepare_chunks(paper_content, structure):
+    """切分论文并确定题目"""
+    chunks = split_into_chunks(paper_content, structure, ANNOTATION_CHUNK_CHARS)
+    return chunks, _paper_title(paper_content, structure)
+
+async def _achunked_annotation(paper_content, annotation_type, force_refresh=False, structure=None):
+    """
+    分块批注（map-reduce）：各章节并发批注后按原文顺序合并
+    
+    Returns:
+        (结果字典, 是否可缓存)；任一章节失败时整体结果不缓存，已成功的章节仍各自缓存
+    """
+    chunks, paper_title = _prepare_chunks(paper_content, structure)
+    results = await asyncio.gather(*[
+        _aannotate_section(chunk, len(chunks), paper_title, annotation_type, force_refresh)
+        for chunk in chunks
+    ])
+    
+    report = _chunked_annotation_header(chunks, annotation_type) + "".join(
+        _chunked_annotation_section(chunk, result) for chunk, result in zip(chunks, results))
+    sections = [{"anchor": chunk["anchor"], "title": chunk["title"], "annotation": result["annotation"]}
+                for chunk, result in zip(chunks, results)]
+    result = {"annotation": report, "sections": sections}
+    if any(r.get("failed") for r in results):
+        result["failed"] = True
+    return result, not result.get("failed")
+
+def _stream_chunked_annotation(paper_content, annotation_type, force_refresh, structure, cache_key):
+    """分块批注 - 流式版：所有章节同时开始，按原文顺序逐节产出"""
+    chunks, paper_title = _prepare_chunks(paper_content, structure)
+    futures = [submit_coroutine(_aannotate_section(chunk, len(chunks), paper_title, annotation_type, force_refresh))
+               for chunk in chunks]
+    
+    header = _chunked_annotation_header(chunks, annotation_type)
+    pieces = [header]
+    sections = []
+    failed = False
     try:
-        result = trends_chain.invoke({}).content
-        return {"trends": result}
-    except Exception as e:
-        print(f"获取研究趋势时发生错误: {str(e)}")
-        return {"trends": "研究趋势分析暂时无法完成，请稍后重试。"}
-
-def intelligent_annotation(paper_content, annotation_type="comprehensive"):
-    """智能批注功能 - 增强版"""
-    current_llm = get_llm(temperature=0.2)
-    
-    # 根据批注类型选择不同的提示词
-    if annotation_type == "全面批注":
-        prompt_template = get_comprehensive_annotation_prompt()
-    elif annotation_type == "学术规范性":
-        prompt_template = get_academic_standard_prompt()
-    elif annotation_type == "逻辑结构":
-        prompt_template = get_logic_structure_prompt()
-    elif annotation_type == "内容质量":
-        prompt_template = get_content_quality_prompt()
-    elif annotation_type == "语言表达":
-        prompt_template = get_language_expression_prompt()
+        yield header
+        for chunk, future in zip(chunks, futures):
+            result = _future_result(future)
+            failed = failed or bool(result.get("failed"))
+            piece = _chunked_annotation_section(chunk, result)
+            pieces.append(piece)
+            sections.append({"anchor": chunk["anchor"], "title": chunk["title"], "annotation": result["annotation"]})
+            yield piece
+    finally:
+        # 调用方中途放弃时取消尚未完成的章节
+        for future in futures:
+            future.cancel()
+    
+    result = {"annotation": "".join(pieces), "sections": sections}
+    if failed:
+        result["failed"] = True
     else:
-        prompt_template = get_comprehensive_annotation_prompt()
+        _set_cached_json(cache_key, result)
+    return result
+
+@prompt_registry.register("paragraph_annotation")
+def get_paragraph_annotation_prompt():
+    """获取逐段批注提示词（修改稿增量批注时使用）"""
+    return _prompt_from_messages([
+        ("human", """你是一位资深的新闻传播学教授，正在逐段批注一篇学位论文的修改稿。
+
+论文题目：{paper_title}
+批注重点：{annotation_type}
+
+以下是需要批注的段落，每段以 [¶编号] 开头；以 [上下文] 开头的是相邻段落，仅供理解衔接，不需要批注：
+{paragraphs}
+
+请逐段批注，每段以单独一行「### ¶编号」开头，随后给出：
+1. **主要问题**：尽量引用原文定位
+2. **修改建议**：具体、可操作，必要时给出改写示例
+3. **衔接**：与前后段落的过渡是否自然
+
+没有明显问题的段落只写「无明显问题」。只批注带编号的段落，不要重复原文。""")
+    ])
+
+# 逐段批注结果中的段落标题行，如 "### ¶12"
+_PARAGRAPH_NOTE_PATTERN = re.compile(r"^#{1,6}\s*¶\s*(\d+)[^\n]*$", re.M)
+
+def _draft_state_key(draft_id, annotation_type) -> str:
+    """草稿上一版本批注状态的缓存键"""
+    return _generate_cache_key("annotation_draft", draft_id, annotation_type)
+
+def _paragraph_batch_cache_key(plan, batch, context) -> str:
+    """逐段批注缓存键：只依赖本组段落与上下文段落的内容，其他草稿中相同的段落也可命中"""
+    return _generate_cache_key("paragraph_annotation", [plan["hashes"][i] for i in batch],
+                               [plan["hashes"][i] for i in context], plan["paper_title"],
+                               plan["annotation_type"], _current_model_id())
+
+def _save_draft_baseline(draft_id, annotation_type, paper_content, result):
+    """
+    整篇批注成功后记为草稿的上一版本
+
+    状态中保存各段落哈希与整篇批注；段落级批注为None表示该段由整篇批注覆盖
+    """
+    if not draft_id or annotation_type == DIMENSION_ANNOTATION_TYPE or not result or result.get("failed"):
+        return
+    _set_cached_json(_draft_state_key(draft_id, annotation_type), {
+        "base": result["annotation"],
+        "paragraphs": [{"hash": _content_hash(p), "note": None} for p in split_paragraphs(paper_content)]
+    })
+
+def _incremental_plan(paper_content, annotation_type, draft_id, force_refresh, structure):
+    """
+    与草稿上一版本逐段比对，确定需要重新批注的段落
+
+    草稿没有上一版本、强制重新批注、分维度批注或修改过多时返回None，改走整篇批注
+
+    Returns:
+        计划字典：paragraphs、hashes、notes（沿用的段落批注）、dirty、batches、base（上一版本整篇批注）等
+    """
+    if not draft_id or force_refresh or annotation_type == DIMENSION_ANNOTATION_TYPE:
+        return None
+    state_key = _draft_state_key(draft_id, annotation_type)
+    state = _get_cached_json(state_key)
+    if not state:
+        return None
     
-    annotation_chain = prompt_template | current_llm
+    paragraphs = split_paragraphs(paper_content)
+    hashes = [_content_hash(paragraph) for paragraph in paragraphs]
+    previous = state["paragraphs"]
+    dirty, reused = plan_reannotation(hashes, [(p["hash"], not p.get("failed")) for p in previous])
+    if len(dirty) > INCREMENTAL_MAX_CHANGED_RATIO * len(paragraphs):
+        return None
     
-    try:
-        result = annotation_chain.invoke({
-            "paper_content": paper_content,
-            "annotation_type": annotation_type
-        }).content
+    notes = [None] * len(paragraphs)
+    for index, previous_index in reused.items():
+        notes[index] = previous[previous_index]["note"]
+    
+    telemetry.set_attributes(paragraphs=len(paragraphs), reannotated=len(dirty), reused=len(reused))
+    telemetry.inc("paperhelper_annotation_paragraphs_total", len(dirty), result="reannotated")
+    telemetry.inc("paperhelper_annotation_paragraphs_total", len(reused), result="reused")
+    return {
+        "paragraphs": paragraphs,
+        "hashes": hashes,
+        "notes": notes,
+        "dirty": dirty,
+        "batches": group_batches(dirty, paragraphs, ANNOTATION_CHUNK_CHARS),
+        "base": state.get("base"),
+        "paper_title": _paper_title(paper_content, structure),
+        "annotation_type": annotation_type,
+        "state_key": state_key
+    }
+
+def _parse_paragraph_notes(text, batch) -> List[Optional[str]]:
+    """按「### ¶编号」拆分逐段批注结果，返回与batch对齐的批注列表（模型漏批的段落为None）"""
+    notes = {}
+    matches = list(_PARAGRAPH_NOTE_PATTERN.finditer(text or ""))
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(text)
+        note = text[match.end():end].strip().strip("-").strip()
+        if note:
+            notes[int(match.group(1)) - 1] = note
+    return [notes.get(index) for index in batch]
+
+async def _aannotate_paragraphs(plan, batch) -> Dict[str, Any]:
+    """批注一组连续段落（附前后各一段上下文），经限流器与其他组并发执行"""
+    paragraphs = plan["paragraphs"]
+    context = [i for i in (batch[0] - 1, batch[-1] + 1) if 0 <= i < len(paragraphs)]
+    
+    async def compute():
+        lines = []
+        if batch[0] - 1 in context:
+            lines.append(f"[上下文] {paragraphs[batch[0] - 1]}")
+        lines.extend(f"[¶{i + 1}] {paragraphs[i]}" for i in batch)
+        if batch[-1] + 1 in context:
+            lines.append(f"[上下文] {paragraphs[batch[-1] + 1]}")
         
-        return {"annotation": result}
-    except Exception as e:
-        print(f"智能批注时发生错误: {str(e)}")
-        return {"annotation": "批注分析暂时无法完成，请稍后重试。"}
+        paragraph_chain = _chain_for("paragraph_annotation", temperature=0.2)
+        try:
+            result = await ainvoke_chain(paragraph_chain, {
+                "paper_title": plan["paper_title"],
+                "annotation_type": plan["annotation_type"],
+                "paragraphs": "\n\n".join(lines)
+            })
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _report_error(f"批注第{batch[0] + 1}-{batch[-1] + 1}段", e)
+            return {"notes": [None] * len(batch)}, False
+        notes = _parse_paragraph_notes(result, batch)
+        return {"notes": notes}, all(note is not None for note in notes)
+    
+    return await _asingle_flight_call(_paragraph_batch_cache_key(plan, batch, context), compute)
+
+def _incremental_annotation_header(plan) -> str:
+    """修改稿批注报告的概要"""
+    return (f"## ✏️ 修改稿批注（{plan['annotation_type']}，共{len(plan['paragraphs'])}段）\n\n"
+            f"本次重新批注 {len(plan['dirty'])} 段（修改过的段落及其相邻段落），其余段落沿用上一版本的批注\n\n")
+
+def _incremental_annotation_section(plan, index) -> str:
+    """
+    修改稿批注报告中单个段落的内容，以 ¶序号 作为锚点，本次重新批注的段落标记 🆕
+
+    由上一版本整篇批注覆盖的段落不单独列出，返回空字符串
+    """
+    fresh = index in plan["dirty"]
+    note = plan["notes"][index]
+    if note is None and not fresh:
+        return ""
+    paragraph = plan["paragraphs"][index]
+    preview = paragraph[:30] + ("…" if len(paragraph) > 30 else "")
+    marker = " 🆕" if fresh else ""
+    return f"---\n\n### ¶{index + 1}{marker} {preview}\n\n{note or '⚠️ 本段批注暂时无法完成，请稍后重试。'}\n\n"
+
+def _incremental_annotation_base(plan) -> str:
+    """修改稿批注报告末尾附上上一版本的整篇批注"""
+    if not plan["base"]:
+        return ""
+    return f"---\n\n## 📄 上一版本整篇批注（未修改的部分仍然适用）\n\n{plan['base']}\n"
+
+def _apply_paragraph_result(plan, batch, result):
+    """将一组段落的批注结果合并到计划中"""
+    for index, note in zip(batch, result["notes"]):
+        plan["notes"][index] = note
+
+def _finish_incremental_annotation(plan, pieces) -> Dict[str, Any]:
+    """保存本版本的批注状态（批注失败的段落下次重新批注），返回合并后的结果"""
+    failed = [index in plan["dirty"] and note is None for index, note in enumerate(plan["notes"])]
+    _set_cached_json(plan["state_key"], {"base": plan["base"], "paragraphs": [
+        {"hash": paragraph_hash, "note": note, "failed": is_failed}
+        for paragraph_hash, note, is_failed in zip(plan["hashes"], plan["notes"], failed)
+    ]})
+    result = {
+        "annotation": "".join(pieces),
+        "paragraphs": [{"index": i, "note": note, "fresh": i in plan["dirty"]} for i, note in enumerate(plan["notes"])],
+        "reannotated": len(plan["dirty"]),
+        "reused": len(plan["paragraphs"]) - len(plan["dirty"])
+    }
+    if any(failed):
+        result["failed"] = True
+    return result
+
+async def _aincremental_annotation(plan):
+    """
+    修改稿增量批注：只重新批注修改过的段落及其相邻段落，与上一版本的批注按原文顺序合并
+    
+    调用次数与耗时取决于修改量而不是论文篇幅
+    """
+    results = await asyncio.gather(*[_aannotate_paragraphs(plan, batch) for batch in plan["batches"]])
+    for batch, result in zip(plan["batches"], results):
+        _apply_paragraph_result(plan, batch, result)
+    
+    pieces = [_incremental_annotation_header(plan)]
+    pieces.extend(_incremental_annotation_section(plan, i) for i in range(len(plan["paragraphs"])))
+    pieces.append(_incremental_annotation_base(plan))
+    return _finish_incremental_annotation(plan, pieces)
+
+def _stream_incremental_annotation(plan):
+    """修改稿增量批注 - 流式版：所有需要重新批注的段落组同时开始，按原文顺序逐段产出"""
+    futures = [submit_coroutine(_aannotate_paragraphs(plan, batch)) for batch in plan["batches"]]
+    batch_of = {index: n for n, batch in enumerate(plan["batches"]) for index in batch}
+    
+    header = _incremental_annotation_header(plan)
+    pieces = [header]
+    applied = set()
+    try:
+        yield header
+        for index in range(len(plan["paragraphs"])):
+            n = batch_of.get(index)
+            if n is not None and n not in applied:
+                _apply_paragraph_result(plan, plan["batches"][n], _future_result(futures[n]))
+                applied.add(n)
+            piece = _incremental_annotation_section(plan, index)
+            if piece:
+                pieces.append(piece)
+                yield piece
+        base = _incremental_annotation_base(plan)
+        pieces.append(base)
+        yield base
+    finally:
+        # 调用方中途放弃时取消尚未完成的段落组
+        for future in futures:
+            future.cancel()
+    
+    return _finish_incremental_annotation(plan, pieces)
 
+@prompt_registry.register("comprehensive_annotation")
 def get_comprehensive_annotation_prompt():
     """获取全面批注提示词"""
-    return ChatPromptTemplate.from_messages([
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，拥有20年以上的学术研究经验。请对以下论文内容进行深度专业批注。
 
 论文内容：{paper_content}
@@ -461,9 +1811,10 @@ def get_comprehensive_annotation_prompt():
 请确保批注专业、具体、可操作，体现新闻传播学的专业特色。""")
     ])
 
+@prompt_registry.register("academic_standard")
 def get_academic_standard_prompt():
     """获取学术规范性批注提示词"""
-    return ChatPromptTemplate.from_messages([
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，请专门针对学术规范性对以下论文内容进行批注。
 
 论文内容：{paper_content}
@@ -496,9 +1847,10 @@ def get_academic_standard_prompt():
 请提供具体的修改建议和示例。""")
     ])
 
+@prompt_registry.register("logic_structure")
 def get_logic_structure_prompt():
     """获取逻辑结构批注提示词"""
-    return ChatPromptTemplate.from_messages([
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，请专门针对逻辑结构对以下论文内容进行批注。
 
 论文内容：{paper_content}
@@ -529,9 +1881,10 @@ def get_logic_structure_prompt():
 请提供具体的结构调整建议。""")
     ])
 
+@prompt_registry.register("content_quality")
 def get_content_quality_prompt():
     """获取内容质量批注提示词"""
-    return ChatPromptTemplate.from_messages([
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，请专门针对内容质量对以下论文内容进行批注。
 
 论文内容：{paper_content}
@@ -566,9 +1919,10 @@ def get_content_quality_prompt():
 请提供具体的内容改进建议。""")
     ])
 
+@prompt_registry.register("language_expression")
 def get_language_expression_prompt():
     """获取语言表达批注提示词"""
-    return ChatPromptTemplate.from_messages([
+    return _prompt_from_messages([
         ("human", """你是一位资深的新闻传播学教授，请专门针对语言表达对以下论文内容进行批注。
 
 论文内容：{paper_content}
@@ -601,11 +1955,190 @@ def get_language_expression_prompt():
 请提供具体的语言修改建议和示例。""")
     ])
 
-def format_correction(paper_content, target_format="APA"):
-    """格式修正功能"""
-    current_llm = get_llm(temperature=0.1)
+# 全面批注的10个维度；有专用模板的维度复用对应模板，其余使用通用维度模板
+ANNOTATION_DIMENSIONS = [
+    {"key": "academic_standard", "title": "📋 1. 学术规范性评估", "template": "get_academic_standard_prompt",
+     "focus": "引用格式、参考文献、学术表达、格式规范"},
+    {"key": "theory", "title": "🧠 2. 理论框架分析", "template": None,
+     "focus": "理论基础是否合适、理论创新、理论运用是否恰当深入、是否与现有理论形成对话"},
+    {"key": "methodology", "title": "🔬 3. 研究方法评估", "template": None,
+     "focus": "方法选择、研究设计、样本与数据收集、数据分析与结果解释"},
+    {"key": "logic_structure", "title": "📊 4. 逻辑结构分析", "template": "get_logic_structure_prompt",
+     "focus": "论证逻辑、结构完整性、段落组织、过渡连接"},
+    {"key": "innovation", "title": "💡 5. 创新性评估", "template": None,
+     "focus": "研究问题的新颖性与重要性、研究视角、研究发现、实践价值"},
+    {"key": "content_quality", "title": "🎯 6. 内容质量分析", "template": "get_content_quality_prompt",
+     "focus": "研究深度、论证充分性、结论可靠性、局限性认识"},
+    {"key": "language", "title": "✍️ 7. 语言表达评估", "template": "get_language_expression_prompt",
+     "focus": "学术语言、表达清晰度、专业术语、语言流畅性"},
+    {"key": "empirical", "title": "📈 8. 实证研究特色", "template": None,
+     "focus": "数据质量、统计分析深度、结果解释、实践应用（非实证研究可说明不适用）"},
+    {"key": "discipline", "title": "🌐 9. 新闻传播学专业特色", "template": None,
+     "focus": "学科前沿、行业关联、社会价值、国际视野"},
+    {"key": "improvement", "title": "🔧 10. 具体改进建议", "template": None,
+     "focus": "结构优化、内容补充、方法改进、表达优化，按优先级列出"}
+]
+
+DIMENSION_SCORE_INSTRUCTION = "请在批注最后单独一行按“评分：X/10”的格式给出本维度1-10分的评分。"
+
+@prompt_registry.register("dimension_annotation")
+def get_dimension_annotation_prompt():
+    """获取单维度批注提示词（没有专用模板的维度使用）"""
+    return _prompt_from_messages([
+        ("human", """你是一位资深的新闻传播学教授，请只从“{dimension_title}”这一个维度对以下论文内容进行批注。
+
+当前部分：{section_title}
+关注要点：{dimension_focus}
+
+论文内容：{paper_content}
+
+请提供：
+1. **具体问题识别**：指出具体存在的问题，尽量引用原文定位
+2. **专业分析**：从新闻传播学专业角度分析
+3. **改进建议**：提供具体、可操作的改进建议
+
+不要评价其他维度。""" + DIMENSION_SCORE_INSTRUCTION)
+    ])
+
+def _dimension_prompt_name(dimension) -> str:
+    """单个维度使用的提示词模板名称：专用模板追加评分要求，否则使用通用维度模板"""
+    if not dimension["template"]:
+        return "dimension_annotation"
+    
+    def build():
+        base_prompt = globals()[dimension["template"]]()
+        return _prompt_from_messages(list(base_prompt.messages) + [("human", DIMENSION_SCORE_INSTRUCTION)])
+    
+    name = f"dimension_{dimension['key']}"
+    prompt_registry.template(name, build)
+    return name
+
+def _parse_dimension_score(text) -> Optional[float]:
+    """从维度批注中提取评分（取最后一次出现的“评分：X/10”）"""
+    matches = re.findall(r"评分\s*[:：]\s*(\d+(?:\.\d+)?)\s*(?:/|／)\s*10", text or "")
+    if not matches:
+        return None
+    return min(max(float(matches[-1]), 1.0), 10.0)
+
+def _dimension_cache_key(dimension, chunk) -> str:
+    """维度批注缓存键：维度 + 块内容哈希 + 模型，修改某一章节只重算该章节所在块"""
+    return _generate_cache_key("dimension_annotation", dimension["key"], _content_hash(chunk["content"]),
+                               chunk["title"], _current_model_id())
+
+async def _aannotate_dimension_chunk(dimension, chunk, force_refresh=False) -> Dict[str, Any]:
+    """对单个块进行单维度批注"""
+    async def compute():
+        dimension_chain = _chain_for(_dimension_prompt_name(dimension), temperature=0.2)
+        try:
+            result = await ainvoke_chain(dimension_chain, {
+                "paper_content": chunk["content"],
+                "section_title": chunk["title"],
+                "dimension_title": dimension["title"],
+                "dimension_focus": dimension["focus"]
+            })
+            return {"annotation": result, "score": _parse_dimension_score(result)}, True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _report_error(f"批注维度「{dimension['title']}」", e)
+            return {"annotation": "⚠️ 本维度批注暂时无法完成，请稍后重试。", "score": None, "failed": True}, False
+    
+    return await _asingle_flight_call(_dimension_cache_key(dimension, chunk), compute, force_refresh)
+
+def _merge_dimension(dimension, chunks, results) -> Dict[str, Any]:
+    """合并同一维度在各块上的批注；评分按块长度加权平均"""
+    scored = [(result["score"], len(chunk["content"])) for chunk, result in zip(chunks, results)
+              if result.get("score") is not None]
+    score = round(sum(s * w for s, w in scored) / sum(w for _, w in scored), 1) if scored else None
+    
+    if len(chunks) == 1:
+        body = results[0]["annotation"]
+    else:
+        body = "\n\n".join(f"#### §{chunk['index'] + 1} {chunk['title']}\n\n{result['annotation']}"
+                           for chunk, result in zip(chunks, results))
+    score_text = f"（{score}/10）" if score is not None else ""
+    return {
+        "key": dimension["key"],
+        "title": dimension["title"],
+        "score": score,
+        "annotation": body,
+        "markdown": f"## {dimension['title']}{score_text}\n\n{body}\n\n",
+        "failed": any(result.get("failed") for result in results)
+    }
+
+def _dimension_score_table(merged) -> str:
+    """各维度评分汇总表"""
+    lines = ["## 📊 各维度评分", "", "| 维度 | 评分 |", "| --- | --- |"]
+    for item in merged:
+        lines.append(f"| {item['title']} | {item['score'] if item['score'] is not None else '—'} |")
+    scores = [item["score"] for item in merged if item["score"] is not None]
+    if scores:
+        lines.append(f"| **总体** | **{sum(scores) / len(scores):.1f}** |")
+    return "\n".join(lines) + "\n"
+
+def _dimension_result(merged) -> Dict[str, Any]:
+    """组装分维度批注结果"""
+    scores = [item["score"] for item in merged if item["score"] is not None]
+    report = "".join(item["markdown"] for item in merged) + _dimension_score_table(merged)
+    return {
+        "annotation": report,
+        "dimensions": [{k: item[k] for k in ("key", "title", "score", "annotation")} for item in merged],
+        "overall_score": round(sum(scores) / len(scores), 1) if scores else None
+    }
+
+def _dimension_chunks(paper_content, structure):
+    """分维度批注使用的分块（短论文通常只有一两块）"""
+    return split_into_chunks(paper_content, structure, ANNOTATION_CHUNK_CHARS, DIMENSION_CHUNK_MIN_CHARS)
+
+async def _adimension_annotation(paper_content, force_refresh=False, structure=None):
+    """
+    分维度并行批注：10个维度 × 各块同时发出聚焦调用，合并为带评分的结构化报告
+    
+    Returns:
+        (结果字典, 是否可缓存)
+    """
+    chunks = _dimension_chunks(paper_content, structure)
+    results = await asyncio.gather(*[
+        _aannotate_dimension_chunk(dimension, chunk, force_refresh)
+        for dimension in ANNOTATION_DIMENSIONS for chunk in chunks
+    ])
     
-    format_template = ChatPromptTemplate.from_messages([
+    merged = [_merge_dimension(dimension, chunks, results[i * len(chunks):(i + 1) * len(chunks)])
+              for i, dimension in enumerate(ANNOTATION_DIMENSIONS)]
+    result = _dimension_result(merged)
+    if any(item["failed"] for item in merged):
+        result["failed"] = True
+    return result, not result.get("failed")
+
+def _stream_dimension_annotation(paper_content, force_refresh, structure, cache_key):
+    """分维度批注 - 流式版：所有调用同时开始，按维度顺序逐个产出，最后产出评分汇总"""
+    chunks = _dimension_chunks(paper_content, structure)
+    futures = [[submit_coroutine(_aannotate_dimension_chunk(dimension, chunk, force_refresh)) for chunk in chunks]
+               for dimension in ANNOTATION_DIMENSIONS]
+    
+    merged = []
+    try:
+        for dimension, dimension_futures in zip(ANNOTATION_DIMENSIONS, futures):
+            item = _merge_dimension(dimension, chunks, [_future_result(future) for future in dimension_futures])
+            merged.append(item)
+            yield item["markdown"]
+        yield _dimension_score_table(merged)
+    finally:
+        for dimension_futures in futures:
+            for future in dimension_futures:
+                future.cancel()
+    
+    result = _dimension_result(merged)
+    if any(item["failed"] for item in merged):
+        result["failed"] = True
+    else:
+        _set_cached_json(cache_key, result)
+    return result
+
+@prompt_registry.register("format_correction")
+def get_format_correction_prompt():
+    """获取格式修正提示词"""
+    return _prompt_from_messages([
         ("human", """你是一位资深的学术编辑，请对以下论文内容进行格式修正。
 
 论文内容：{paper_content}
@@ -640,19 +2173,204 @@ def format_correction(paper_content, target_format="APA"):
 
 请提供修正后的内容，确保格式规范统一。""")
     ])
+
+def _format_correction_cache_key(paper_content, target_format) -> str:
+    """格式修正缓存键：规范化内容哈希 + 目标格式 + 模型"""
+    return _generate_cache_key("format_correction", _content_hash(paper_content),
+                               target_format, _current_model_id())
+
+@telemetry.traced()
+def format_correction(paper_content, target_format="APA", force_refresh=False):
+    """
+    格式修正功能
+    
+    Args:
+        paper_content: 论文内容
+        target_format: 目标格式
+        force_refresh: 为True时跳过缓存重新修正（结果仍会写回缓存）
+    """
+    def compute():
+        format_chain = _chain_for("format_correction", temperature=0.1)
+        try:
+            result = invoke_chain(format_chain, {
+                "paper_content": paper_content,
+                "target_format": target_format
+            })
+            
+            return {"corrected_content": result}, True
+        except Exception as e:
+            _report_error("格式修正", e)
+            return {"corrected_content": "格式修正暂时无法完成，请稍后重试。"}, False
     
-    format_chain = format_template | current_llm
+    cache_key = _format_correction_cache_key(paper_content, target_format)
+    return _single_flight_call(cache_key, compute, force_refresh)
+
+@telemetry.traced()
+async def aformat_correction(paper_content, target_format="APA", force_refresh=False):
+    """格式修正功能 - 异步版"""
+    async def compute():
+        format_chain = _chain_for("format_correction", temperature=0.1)
+        try:
+            result = await ainvoke_chain(format_chain, {
+                "paper_content": paper_content,
+                "target_format": target_format
+            })
+            
+            return {"corrected_content": result}, True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _report_error("格式修正", e)
+            return {"corrected_content": "格式修正暂时无法完成，请稍后重试。"}, False
+    
+    cache_key = _format_correction_cache_key(paper_content, target_format)
+    return await _asingle_flight_call(cache_key, compute, force_refresh)
+
+@telemetry.traced()
+def stream_format_correction(paper_content, target_format="APA", force_refresh=False):
+    """格式修正功能 - 流式版，逐块产出修正后的内容"""
+    cache_key = _format_correction_cache_key(paper_content, target_format)
+    if not force_refresh:
+        cached_result = _lookup_cache(cache_key)
+        if cached_result:
+            yield cached_result["corrected_content"]
+            return cached_result
+    
+    format_chain = _chain_for("format_correction", temperature=0.1, streaming=True)
+    return (yield from _stream_with_cache(
+        format_chain,
+        {"paper_content": paper_content, "target_format": target_format},
+        cache_key, "corrected_content",
+        "格式修正暂时无法完成，请稍后重试。", "格式修正", force_refresh
+    ))
+
+@telemetry.traced()
+async def arun_topic_analysis(subject, word_count, creativity, research_type, timeout=TOPIC_ANALYSIS_TIMEOUT,
+                              include_diagnosis=True, per_title_advice=False):
+    """
+    并发执行选题生成、选题诊断和可行性分析
+    
+    三个调用互不依赖，总耗时约等于最慢的一个。超过共享截止时间仍未完成的
+    调用会被取消，并以各自的降级结果代替。
+    
+    Args:
+        subject: 研究主题
+        word_count: 论文篇幅（万字）
+        creativity: 创意程度
+        research_type: 研究类型
+        timeout: 共享截止时间（秒）
+        include_diagnosis: 为False时跳过选题诊断（由页面单独流式展示）
+        per_title_advice: 为True时逐题生成研究建议（见 agenerate_paper_per_title），结果中包含 titles 与 advice
+    """
+    paper = agenerate_paper_per_title(subject, word_count, creativity) if per_title_advice \
+        else agenerate_paper(subject, word_count, creativity)
+    tasks = {
+        "paper": asyncio.ensure_future(paper),
+        "feasibility": asyncio.ensure_future(aanalyze_topic_feasibility(subject, research_type)),
+    }
+    if include_diagnosis:
+        tasks["diagnosis"] = asyncio.ensure_future(atopic_diagnosis(subject, research_type))
     
     try:
-        result = format_chain.invoke({
-            "paper_content": paper_content,
-            "target_format": target_format
-        }).content
-        
-        return {"corrected_content": result}
-    except Exception as e:
-        print(f"格式修正时发生错误: {str(e)}")
-        return {"corrected_content": "格式修正暂时无法完成，请稍后重试。"}
+        done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    except asyncio.CancelledError:
+        # asyncio.wait 被取消时不会取消子任务
+        for task in tasks.values():
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    fallbacks = {
+        "paper": {"titles": [], "advice": []} if per_title_advice else (None, None, None),
+        "diagnosis": {"analysis": "诊断分析超时，请稍后重试。"},
+        "feasibility": generate_default_feasibility_data(),
+    }
+    results = {}
+    timed_out = []
+    for name, task in tasks.items():
+        if task in done and not task.cancelled() and task.exception() is None:
+            results[name] = task.result()
+        else:
+            # 单独被取消的子任务与超时的子任务一样使用降级结果
+            if task in pending or task.cancelled():
+                timed_out.append(name)
+            else:
+                print(f"选题分析子任务 {name} 失败: {str(task.exception())}")
+            results[name] = fallbacks[name]
+    
+    result = {
+        "diagnosis": results.get("diagnosis"),
+        "feasibility": results["feasibility"],
+        "timed_out": timed_out
+    }
+    if per_title_advice:
+        paper = results["paper"]
+        result.update(title="\n".join(paper["titles"]) or None, abstract=None,
+                      titles=paper["titles"], advice=paper["advice"])
+    else:
+        result["title"], result["abstract"], _ = results["paper"]
+    return result
+
+@telemetry.traced()
+def run_topic_analysis(subject, word_count, creativity, research_type, timeout=TOPIC_ANALYSIS_TIMEOUT):
+    """并发执行选题分析 - 同步入口（供Streamlit页面调用）"""
+    return _run_coroutine(arun_topic_analysis(subject, word_count, creativity, research_type, timeout))
+
+def submit_topic_analysis(subject, word_count, creativity, research_type, timeout=TOPIC_ANALYSIS_TIMEOUT,
+                          include_diagnosis=True, per_title_advice=False):
+    """在后台启动并发选题分析，返回Future，调用方可同时流式展示其他内容"""
+    return submit_coroutine(arun_topic_analysis(subject, word_count, creativity, research_type, timeout,
+                                                include_diagnosis, per_title_advice))
+
+@job_queue.register("annotation")
+def _annotation_job(paper_content, annotation_type, force_refresh=False, structure=None, draft_id=None):
+    """后台任务：智能批注（流式输出，进度写入任务库）"""
+    return stream_intelligent_annotation(paper_content, annotation_type, force_refresh, structure, draft_id)
+
+@job_queue.register("format_correction")
+def _format_correction_job(paper_content, target_format, force_refresh=False):
+    """后台任务：格式修正"""
+    return stream_format_correction(paper_content, target_format, force_refresh)
+
+def submit_annotation_job(paper_content, annotation_type="全面批注", force_refresh=False, structure=None,
+                          draft_id=None) -> str:
+    """
+    将智能批注提交为后台任务，立即返回任务ID
+    
+    任务在工作线程池中执行，页面重新运行或浏览器重连不会中断；凭任务ID读取进度（stream_job）与结果（get_job）。
+    传入 draft_id 时逐段增量批注（见 intelligent_annotation）
+    """
+    return job_queue.submit("annotation", {"paper_content": paper_content, "annotation_type": annotation_type,
+                                           "force_refresh": force_refresh, "structure": structure,
+                                           "draft_id": draft_id})
+
+def submit_format_correction_job(paper_content, target_format="APA格式", force_refresh=False) -> str:
+    """将格式修正提交为后台任务，立即返回任务ID"""
+    return job_queue.submit("format_correction", {"paper_content": paper_content, "target_format": target_format,
+                                                  "force_refresh": force_refresh})
+
+def get_job(job_id) -> Optional[Dict[str, Any]]:
+    """查询后台任务状态；结束后 result["text"] 为完整输出"""
+    return job_queue.get(job_id)
+
+def stream_job(job_id):
+    """逐块产出后台任务的输出（先产出已有内容），任务结束时返回"""
+    return job_queue.stream(job_id)
+
+def cancel_job(job_id, reason="superseded") -> bool:
+    """取消排队或运行中的后台任务（如用户重新提交或离开页面），任务发起的模型请求随之中止"""
+    return job_queue.cancel(job_id, reason)
+
+def get_job_stats() -> Dict[str, Any]:
+    """获取后台任务统计"""
+    return job_queue.get_stats()
+
+def start_job_workers():
+    """启动后台任务工作线程池，并接管上次进程退出时未完成的任务"""
+    job_queue.start()
 
 # 使用示例
 if __name__ == "__main__":
@@ -666,4 +2384,4 @@ if __name__ == "__main__":
         else:
             print("生成失败")
     except Exception as e:
-        print(f"程序执行出错: {str(e)}")
\ No newline at end of file
+        print(f"程序执行出错: {str(e)}")
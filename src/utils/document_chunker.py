@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+长文档分块
+按文档结构分析识别出的章节切分论文，过长的章节再按段落拆分，过短的相邻章节合并
+"""
+
+from typing import Dict, Any, List, Optional
+
+# 每块的目标字数上限，单次批注的输入与输出都能容纳在模型限制内
+DEFAULT_MAX_CHARS = 6000
+# 短于此字数的章节与后续章节合并，减少调用次数
+DEFAULT_MIN_CHARS = 800
+
+
+def _analyze_structure(content: str) -> Dict[str, Any]:
+    """调用文档处理器的结构分析（延迟导入，避免加载Streamlit等依赖）"""
+    try:
+        from src.modules.document_processor_simple import document_processor
+    except ImportError:
+        try:
+            from src.modules.document_processor import document_processor
+        except ImportError:
+            return {}
+    return document_processor._analyze_document_structure(content)
+
+
+def _split_long_text(text: str, max_chars: int) -> List[str]:
+    """按段落把过长的文本拆成不超过max_chars的片段（单段过长时按字数硬切）"""
+    parts = []
+    current = ""
+    for paragraph in [p for p in text.split("\n") if p.strip()]:
+        while len(paragraph) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + len(paragraph) + 1 > max_chars:
+            parts.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _sections_with_preface(content: str, sections: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """补上第一个章节标题之前的内容（题目、摘要等），结构分析会将其丢弃"""
+    if not sections:
+        return [{"title": "全文", "content": content}]
+
+    first_title = sections[0]["title"]
+    position = content.find(first_title)
+    preface = content[:position].strip() if position > 0 else ""
+    result = [{"title": "前置部分（题目、摘要等）", "content": preface}] if preface else []
+    return result + [{"title": s["title"], "content": f"{s['title']}\n{s['content']}"} for s in sections]
+
+
+def split_into_chunks(content: str, structure: Optional[Dict[str, Any]] = None,
+                      max_chars: int = DEFAULT_MAX_CHARS, min_chars: int = DEFAULT_MIN_CHARS) -> List[Dict[str, Any]]:
+    """
+    将论文切分为可独立批注的块
+
+    Args:
+        content: 论文全文
+        structure: 文档处理器给出的结构分析结果，为None时现场分析
+        max_chars: 每块字数上限
+        min_chars: 短于此字数的章节与下一章节合并
+
+    Returns:
+        块列表，每块包含 index、anchor、title（块内各章节标题）、content
+    """
+    if structure is None:
+        structure = _analyze_structure(content)
+    sections = _sections_with_preface(content, (structure or {}).get("sections") or [])
+
+    # 拆分过长章节
+    pieces = []
+    for section in sections:
+        parts = _split_long_text(section["content"], max_chars)
+        if len(parts) == 1:
+            pieces.append({"titles": [section["title"]], "content": parts[0]})
+        else:
+            for i, part in enumerate(parts, 1):
+                pieces.append({"titles": [f"{section['title']}（第{i}部分）"], "content": part})
+
+    # 合并过短的相邻章节
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]["content"]) < min_chars \
+                and len(chunks[-1]["content"]) + len(piece["content"]) <= max_chars:
+            chunks[-1]["titles"] += piece["titles"]
+            chunks[-1]["content"] += "\n" + piece["content"]
+        else:
+            chunks.append({"titles": list(piece["titles"]), "content": piece["content"]})
+
+    # 末尾过短的块并入前一块
+    if len(chunks) > 1 and len(chunks[-1]["content"]) < min_chars \
+            and len(chunks[-2]["content"]) + len(chunks[-1]["content"]) <= max_chars:
+        last = chunks.pop()
+        chunks[-1]["titles"] += last["titles"]
+        chunks[-1]["content"] += "\n" + last["content"]
+
+    return [{
+        "index": i,
+        "anchor": f"section-{i + 1}",
+        "title": " / ".join(chunk["titles"]),
+        "content": chunk["content"]
+    } for i, chunk in enumerate(chunks)]
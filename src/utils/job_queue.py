@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台任务队列
+耗时的模型调用（批注、格式修正）提交为任务，由本地工作线程池执行，不受Streamlit页面重新运行影响；
+任务状态与已输出的内容保存在SQLite任务库中，页面重新运行或浏览器重连后凭任务ID继续读取进度与结果
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from src.config import cancellation
+from src.config.telemetry import telemetry
+
+DEFAULT_JOB_DB_PATH = os.path.join(os.path.expanduser("~"), ".paperhelper", "jobs.sqlite3")
+DEFAULT_WORKERS = 4
+# 已结束任务的保留时间（秒）
+DEFAULT_RETENTION_SECONDS = 7 * 24 * 3600
+# 运行中任务写入已输出内容的最小间隔（秒）
+PROGRESS_FLUSH_INTERVAL = 0.5
+# 心跳间隔（秒）；超过 STALE_AFTER_SECONDS 没有心跳的未完成任务视为所在进程已退出，由其他进程接管
+HEARTBEAT_INTERVAL = 10
+STALE_AFTER_SECONDS = 60
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+TERMINAL_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+_COLUMNS = ("id", "kind", "params", "status", "output", "result", "error", "owner",
+            "created_at", "started_at", "finished_at", "heartbeat_at")
+
+
+class JobQueue:
+    """SQLite持久化的任务队列 + 本地工作线程池（线程安全）"""
+
+    def __init__(self, db_path: str = None, workers: int = None, retention_seconds: float = None):
+        """初始化（数据库连接与工作线程延迟到首次使用时创建）"""
+        self.db_path = db_path or os.getenv("PAPERHELPER_JOB_DB_PATH", DEFAULT_JOB_DB_PATH)
+        self.workers = workers or int(os.getenv("PAPERHELPER_JOB_WORKERS", DEFAULT_WORKERS))
+        self.retention_seconds = retention_seconds if retention_seconds is not None else float(
+            os.getenv("PAPERHELPER_JOB_RETENTION", DEFAULT_RETENTION_SECONDS))
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers = {}
+        # 本进程执行的任务：id -> 任务字典（数据库不可用时也是唯一存储）
+        self._jobs = {}
+        # 本进程任务的取消令牌：id -> CancellationToken
+        self._tokens = {}
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._conn = None
+        self._db_available = True
+        self._executor = None
+        self._heartbeat = None
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "recovered": 0}
+
+    def register(self, kind: str):
+        """
+        装饰器：注册任务处理函数
+
+        处理函数接收任务参数（关键字参数），返回逐块产出文本的生成器（流式任务）或结果字典。
+        结果字典（流式任务为生成器的返回值）带 "failed": True 时任务记为失败，已输出的内容保留
+        """
+        def decorator(handler: Callable[..., Any]):
+            self._handlers[kind] = handler
+            return handler
+        return decorator
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> str:
+        """
+        提交任务
+
+        Args:
+            kind: 任务类型（需已注册）
+            params: 任务参数，需可JSON序列化
+        Returns:
+            任务ID
+        """
+        if kind not in self._handlers:
+            raise KeyError(f"未注册的任务类型: {kind}")
+        now = time.time()
+        job = {"id": uuid.uuid4().hex, "kind": kind, "params": params, "status": STATUS_QUEUED, "output": "",
+               "result": None, "error": None, "owner": self.owner, "created_at": now, "started_at": None,
+               "finished_at": None, "heartbeat_at": now}
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._tokens[job["id"]] = cancellation.CancellationToken(kind)
+            self._stats["submitted"] += 1
+            self._write(job)
+        self._ensure_workers().submit(self._run, job["id"])
+        telemetry.inc("paperhelper_jobs_total", kind=kind, status=STATUS_QUEUED)
+        return job["id"]
+
+    def cancel(self, job_id: str, reason: str = "superseded") -> bool:
+        """
+        取消本进程中排队或运行中的任务：任务发起的模型请求随之中止（HTTP连接断开），已输出的内容保留
+
+        Returns:
+            是否取消了任务（任务已结束或不在本进程中时返回False）
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            token = self._tokens.get(job_id)
+            if job is None or token is None or job["status"] in TERMINAL_STATUSES:
+                return False
+        token.cancel(reason)
+        return True
+
+    def start(self):
+        """启动工作线程池（应用启动时调用，以便尽早接管上次进程退出时未完成的任务）"""
+        self._ensure_workers()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务
+
+        Returns:
+            {id, kind, params, status, output（已输出的文本）, result, error, created_at, started_at, finished_at}，
+            任务不存在时返回None
+        """
+        if not job_id:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._read(job_id)
+
+    def stream(self, job_id: str, poll_interval: float = 0.2) -> Iterator[str]:
+        """
+        逐块产出任务的输出：先产出已输出的内容，之后产出新增内容，任务结束时返回
+
+        本进程执行的任务有新内容时立即产出，其他进程执行的任务按 poll_interval 轮询任务库
+        """
+        sent = 0
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            output = job["output"] or ""
+            if len(output) > sent:
+                yield output[sent:]
+                sent = len(output)
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            with self._changed:
+                self._changed.wait(poll_interval)
+
+    def wait(self, job_id: str, timeout: float = None) -> Optional[Dict[str, Any]]:
+        """阻塞等待任务结束，超时返回当前状态"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                return job
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(0.2, remaining) if remaining is not None else 0.2)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取提交/完成/失败/取消/接管统计与本进程排队、运行中的任务数"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queued"] = sum(1 for job in self._jobs.values() if job["status"] == STATUS_QUEUED)
+            stats["running"] = sum(1 for job in self._jobs.values() if job["status"] == STATUS_RUNNING)
+        stats["workers"] = self.workers
+        stats["persistent"] = self._get_conn() is not None
+        return stats
+
+    # ---- 执行 ----
+
+    def _ensure_workers(self) -> ThreadPoolExecutor:
+        """启动工作线程池与心跳线程（首次提交任务时）"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="paperhelper-job")
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="paperhelper-job-heartbeat",
+                                                   daemon=True)
+                self._heartbeat.start()
+            return self._executor
+
+    def _run(self, job_id: str):
+        """在工作线程中执行任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != STATUS_QUEUED:
+                return
+            token = self._tokens.setdefault(job_id, cancellation.CancellationToken(job["kind"]))
+            if token.cancelled:
+                # 排队期间已被取消
+                self._finish(job, STATUS_CANCELLED, error=f"任务已取消（{token.reason}）")
+                return
+            job.update(status=STATUS_RUNNING, started_at=time.time())
+            self._write(job)
+            self._changed.notify_all()
+
+        handler = self._handlers.get(job["kind"])
+        pieces = []
+        last_flush = time.monotonic()
+        try:
+            # 任务中发起的模型调用都可被该任务的令牌取消
+            with telemetry.span(f"job.{job['kind']}", job_id=job_id), cancellation.scope(token):
+                if handler is None:
+                    raise KeyError(f"未注册的任务类型: {job['kind']}")
+                outcome = handler(**job["params"])
+                if isinstance(outcome, dict):
+                    result = returned = outcome
+                else:
+                    outcome = iter(outcome)
+                    while True:
+                        try:
+                            text = next(outcome)
+                        except StopIteration as stop:
+                            returned = stop.value
+                            break
+                        token.raise_if_cancelled()
+                        pieces.append(text)
+                        with self._lock:
+                            job["output"] = "".join(pieces)
+                            if time.monotonic() - last_flush >= PROGRESS_FLUSH_INTERVAL:
+                                self._write(job)
+                                last_flush = time.monotonic()
+                            self._changed.notify_all()
+                    result = {"text": "".join(pieces)}
+                token.raise_if_cancelled()
+        except cancellation.RequestCancelledError:
+            self._finish(job, STATUS_CANCELLED, error=f"任务已取消（{token.reason}）")
+            return
+        except Exception as e:
+            print(f"执行后台任务 {job['kind']} 时发生错误: {str(e)}")
+            self._finish(job, STATUS_FAILED, error=str(e))
+            return
+        if isinstance(returned, dict) and returned.get("failed"):
+            # 模型调用失败时处理函数产出的是降级提示，保留已输出的内容
+            self._finish(job, STATUS_FAILED, result=result, error="模型调用未能完成，请稍后重试")
+            return
+        self._finish(job, STATUS_SUCCEEDED, result=result)
+
+    def _finish(self, job: Dict[str, Any], status: str, result: Dict[str, Any] = None, error: str = None):
+        """记录任务结果，唤醒等待方；结束的任务只保留在任务库中"""
+        with self._lock:
+            job.update(status=status, result=result, error=error, finished_at=time.time())
+            self._stats[status] += 1
+            self._write(job)
+            self._tokens.pop(job["id"], None)
+            if self._get_conn() is not None:
+                self._jobs.pop(job["id"], None)
+            self._changed.notify_all()
+        telemetry.inc("paperhelper_jobs_total", kind=job["kind"], status=status)
+        telemetry.observe("paperhelper_job_duration_seconds", job["finished_at"] - job["created_at"],
+                          kind=job["kind"])
+
+    def _heartbeat_loop(self):
+        """定期更新本进程任务的心跳，并接管心跳超时（所在进程已退出）的任务"""
+        try:
+            self._recover()
+            self._purge()
+        except sqlite3.Error as e:
+            print(f"接管未完成任务时发生错误: {str(e)}")
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                with self._lock:
+                    conn = self._get_conn()
+                    if conn is not None:
+                        conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)",
+                                     (time.time(), self.owner, STATUS_QUEUED, STATUS_RUNNING))
+                        conn.commit()
+                self._recover()
+            except sqlite3.Error as e:
+                print(f"更新任务心跳时发生错误: {str(e)}")
+
+    def _recover(self):
+        """接管心跳超时的未完成任务，从头重新执行"""
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET owner = ?, status = ?, output = '', started_at = NULL, heartbeat_at = ? "
+                "WHERE status IN (?, ?) AND owner != ? AND heartbeat_at < ?",
+                (self.owner, STATUS_QUEUED, now, STATUS_QUEUED, STATUS_RUNNING, self.owner, now - STALE_AFTER_SECONDS))
+            conn.commit()
+            rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE owner = ? AND status = ?",
+                                (self.owner, STATUS_QUEUED)).fetchall()
+            recovered = [self._row_to_job(row) for row in rows if row[0] not in self._jobs]
+            for job in recovered:
+                self._jobs[job["id"]] = job
+                self._stats["recovered"] += 1
+        for job in recovered:
+            self._executor.submit(self._run, job["id"])
+
+    def _purge(self):
+        """删除超过保留时间的已结束任务"""
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+            conn.execute("DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?",
+                         (*TERMINAL_STATUSES, time.time() - self.retention_seconds))
+            conn.commit()
+
+    # ---- 任务库 ----
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        """获取SQLite连接，失败时降级为仅在内存中保存任务（页面重连后仍可查询，进程重启后丢失）"""
+        if self._conn is not None or not self._db_available:
+            return self._conn
+
+        with self._lock:
+            if self._conn is not None or not self._db_available:
+                return self._conn
+            try:
+                directory = os.path.dirname(self.db_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        params TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        output TEXT NOT NULL DEFAULT '',
+                        result TEXT,
+                        error TEXT,
+                        owner TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL,
+                        heartbeat_at REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, heartbeat_at)")
+                conn.commit()
+                self._conn = conn
+            except (sqlite3.Error, OSError) as e:
+                print(f"任务数据库不可用，任务仅保存在内存中: {str(e)}")
+                self._db_available = False
+                self._conn = None
+            return self._conn
+
+    def _write(self, job: Dict[str, Any]):
+        """写入任务（调用方持有锁）"""
+        conn = self._get_conn()
+        if conn is None:
+            return
+        try:
+            conn.execute(f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                         (job["id"], job["kind"], json.dumps(job["params"], ensure_ascii=False), job["status"],
+                          job["output"], json.dumps(job["result"], ensure_ascii=False) if job["result"] else None,
+                          job["error"], job["owner"], job["created_at"], job["started_at"], job["finished_at"],
+                          job["heartbeat_at"]))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"写入任务时发生错误: {str(e)}")
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """从任务库读取任务（其他进程提交的、或已结束的任务）"""
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"读取任务时发生错误: {str(e)}")
+                return None
+        return self._row_to_job(row) if row else None
+
+    @staticmethod
+    def _row_to_job(row) -> Dict[str, Any]:
+        """数据库行转换为任务字典"""
+        job = dict(zip(_COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+# 创建全局实例
+job_queue = JobQueue()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存模块
+内存热点层 + SQLite持久层，支持LRU/TTL淘汰、容量预算和命中统计
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+# 默认缓存配置，可通过环境变量覆盖
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".paperhelper", "llm_cache.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600          # 默认缓存7天
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024        # 持久层容量上限200MB
+DEFAULT_MEMORY_MAX_ITEMS = 256               # 内存热点层最多条目数
+DEFAULT_MEMORY_MAX_BYTES = 16 * 1024 * 1024  # 内存热点层容量上限16MB
+
+
+class LLMCache:
+    """两级LLM响应缓存：线程安全的内存LRU热点层 + SQLite持久层"""
+
+    def __init__(self, db_path: str = None, ttl_seconds: float = None, max_bytes: int = None,
+                 memory_max_items: int = None, memory_max_bytes: int = None):
+        """初始化缓存（数据库连接延迟到首次使用时建立）"""
+        self.db_path = db_path or os.getenv("PAPERHELPER_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.getenv("PAPERHELPER_CACHE_TTL", DEFAULT_TTL_SECONDS))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv("PAPERHELPER_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.memory_max_items = memory_max_items if memory_max_items is not None else int(
+            os.getenv("PAPERHELPER_CACHE_MEMORY_ITEMS", DEFAULT_MEMORY_MAX_ITEMS))
+        self.memory_max_bytes = memory_max_bytes if memory_max_bytes is not None else int(
+            os.getenv("PAPERHELPER_CACHE_MEMORY_BYTES", DEFAULT_MEMORY_MAX_BYTES))
+
+        self._lock = threading.RLock()
+        # key -> (value, expires_at, size)
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._conn = None
+        self._db_available = True
+        self._disk_bytes = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "sets": 0,
+            "evictions": 0,
+            "memory_evictions": 0,
+            "expirations": 0
+        }
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        """获取SQLite连接，失败时降级为纯内存缓存"""
+        if self._conn is not None or not self._db_available:
+            return self._conn
+
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+            # 跨进程请求合并使用的锁表
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_locks (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+            self._disk_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            self._conn = conn
+        except (sqlite3.Error, OSError) as e:
+            print(f"缓存数据库不可用，降级为内存缓存: {str(e)}")
+            self._db_available = False
+            self._conn = None
+
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return value
+                self._drop_memory(key)
+                self._stats["expirations"] += 1
+
+            conn = self._get_conn()
+            if conn is not None:
+                try:
+                    row = conn.execute(
+                        "SELECT value, expires_at, size FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        value, expires_at, size = row
+                        if expires_at > now:
+                            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                            conn.commit()
+                            self._put_memory(key, value, expires_at, size)
+                            self._stats["hits"] += 1
+                            self._stats["disk_hits"] += 1
+                            return value
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        conn.commit()
+                        self._disk_bytes -= size
+                        self._stats["expirations"] += 1
+                except sqlite3.Error as e:
+                    print(f"读取缓存失败: {str(e)}")
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str, ttl_seconds: float = None):
+        """写入缓存"""
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = now + ttl
+        size = len(value.encode("utf-8"))
+
+        with self._lock:
+            self._put_memory(key, value, expires_at, size)
+            self._stats["sets"] += 1
+
+            conn = self._get_conn()
+            if conn is None:
+                return
+
+            try:
+                row = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, value, size, now, expires_at, now)
+                )
+                conn.commit()
+                self._disk_bytes += size - (row[0] if row else 0)
+                if self._disk_bytes > self.max_bytes:
+                    self._enforce_disk_budget(conn)
+            except sqlite3.Error as e:
+                print(f"写入缓存失败: {str(e)}")
+
+    def delete(self, key: str):
+        """删除指定缓存"""
+        with self._lock:
+            self._drop_memory(key)
+            conn = self._get_conn()
+            if conn is not None:
+                try:
+                    row = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                    if row:
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        conn.commit()
+                        self._disk_bytes -= row[0]
+                except sqlite3.Error as e:
+                    print(f"删除缓存失败: {str(e)}")
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            conn = self._get_conn()
+            if conn is not None:
+                try:
+                    conn.execute("DELETE FROM llm_cache")
+                    conn.commit()
+                    self._disk_bytes = 0
+                except sqlite3.Error as e:
+                    print(f"清空缓存失败: {str(e)}")
+
+    def purge_expired(self) -> int:
+        """清理持久层中已过期的条目，返回清理数量"""
+        now = time.time()
+        with self._lock:
+            expired_keys = [k for k, (_, expires_at, _) in self._memory.items() if expires_at <= now]
+            for key in expired_keys:
+                self._drop_memory(key)
+
+            conn = self._get_conn()
+            if conn is None:
+                return len(expired_keys)
+
+            try:
+                cursor = conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+                conn.commit()
+                self._disk_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+                self._stats["expirations"] += cursor.rowcount
+                return cursor.rowcount
+            except sqlite3.Error as e:
+                print(f"清理过期缓存失败: {str(e)}")
+                return 0
+
+    def try_acquire_lock(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        尝试获取跨进程锁（基于共享的SQLite库）
+
+        锁已被其他持有者占用且未过期时返回False；持久层不可用时总是返回True
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return True
+
+            try:
+                conn.execute("DELETE FROM llm_locks WHERE key = ? AND expires_at <= ?", (key, now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO llm_locks (key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, owner, now + ttl_seconds)
+                )
+                conn.commit()
+                if cursor.rowcount == 1:
+                    return True
+                row = conn.execute("SELECT owner FROM llm_locks WHERE key = ?", (key,)).fetchone()
+                return row is not None and row[0] == owner
+            except sqlite3.Error as e:
+                print(f"获取缓存锁失败: {str(e)}")
+                return True
+
+    def release_lock(self, key: str, owner: str):
+        """释放跨进程锁"""
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+
+            try:
+                conn.execute("DELETE FROM llm_locks WHERE key = ? AND owner = ?", (key, owner))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"释放缓存锁失败: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            stats = dict(self._stats)
+            stats.update({
+                "hit_rate": self._stats["hits"] / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "persistent": self._conn is not None
+            })
+            return stats
+
+    def _put_memory(self, key: str, value: str, expires_at: float, size: int):
+        """写入内存热点层并按LRU淘汰"""
+        if size > self.memory_max_bytes:
+            # 超大条目只进入持久层
+            self._drop_memory(key)
+            return
+
+        self._drop_memory(key)
+        self._memory[key] = (value, expires_at, size)
+        self._memory_bytes += size
+
+        while self._memory and (len(self._memory) > self.memory_max_items
+                                or self._memory_bytes > self.memory_max_bytes):
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self._stats["memory_evictions"] += 1
+
+    def _drop_memory(self, key: str):
+        """从内存热点层移除"""
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[2]
+
+    def _enforce_disk_budget(self, conn: sqlite3.Connection):
+        """持久层超出容量预算时，先清理过期条目，再按最久未访问淘汰"""
+        now = time.time()
+        cursor = conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        self._stats["expirations"] += cursor.rowcount
+        # 其他进程可能也在写入，以数据库中的真实值为准
+        self._disk_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+        # 淘汰到预算的90%，避免每次写入都触发淘汰
+        target = int(self.max_bytes * 0.9)
+        while self._disk_bytes > target:
+            rows = conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access ASC LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._drop_memory(key)
+                self._disk_bytes -= size
+                self._stats["evictions"] += 1
+                if self._disk_bytes <= target:
+                    break
+        conn.commit()
+
+
+# 创建全局实例
+llm_cache = LLMCache()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地文件适配
+把磁盘或zip压缩包中的文档包装成与Streamlit上传文件相同的接口，供文档处理器在命令行场景中复用
+"""
+
+import io
+import os
+import zipfile
+from typing import Dict, Any, Iterator, Optional
+
+# 文档处理器支持的扩展名及对应的MIME类型
+MIME_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".txt": "text/plain"
+}
+
+
+def mime_type_for(filename: str) -> Optional[str]:
+    """按扩展名推断MIME类型，不支持的格式返回None"""
+    return MIME_TYPES.get(os.path.splitext(filename)[1].lower())
+
+
+class LocalUploadedFile(io.BytesIO):
+    """模拟 streamlit UploadedFile：提供 name、type、size 及文件读写接口"""
+
+    def __init__(self, name: str, data: bytes):
+        """初始化"""
+        super().__init__(data)
+        self.name = name
+        self.type = mime_type_for(name) or "application/octet-stream"
+        self.size = len(data)
+
+    @classmethod
+    def from_path(cls, path: str) -> "LocalUploadedFile":
+        """从磁盘文件创建"""
+        with open(path, "rb") as f:
+            return cls(os.path.basename(path), f.read())
+
+
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    """
+    获取压缩包内的文件名
+
+    Windows 压缩工具常以GBK编码写入中文文件名而不设置UTF-8标志，zipfile会按cp437解码成乱码，此处还原
+    """
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def _is_hidden(relative_path: str) -> bool:
+    """跳过隐藏文件、Office临时文件和macOS压缩时附带的元数据"""
+    parts = relative_path.replace("\\", "/").split("/")
+    return any(part.startswith((".", "~$")) or part == "__MACOSX" for part in parts)
+
+
+def iter_documents(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    遍历目录或zip压缩包中支持的文档
+
+    Args:
+        path: 目录或.zip文件路径
+
+    Yields:
+        {"name": 相对路径, "path": 磁盘路径, "member": 压缩包内的原始成员名（目录时为None）,
+         "fingerprint": 文件指纹（压缩包用CRC与大小，目录用修改时间与大小），文件变化后随之改变}
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = [(info, _zip_member_name(info)) for info in archive.infolist() if not info.is_dir()]
+        for info, name in sorted(members, key=lambda item: item[1]):
+            if mime_type_for(name) and not _is_hidden(name):
+                yield {"name": name, "path": path, "member": info.filename,
+                       "fingerprint": f"{info.CRC:08x}-{info.file_size}"}
+        return
+
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not _is_hidden(d))
+        for filename in sorted(files):
+            full_path = os.path.join(root, filename)
+            name = os.path.relpath(full_path, path).replace(os.sep, "/")
+            if mime_type_for(filename) and not _is_hidden(name):
+                stat = os.stat(full_path)
+                yield {"name": name, "path": full_path, "member": None,
+                       "fingerprint": f"{int(stat.st_mtime)}-{stat.st_size}"}
+
+
+def load_document(source: Dict[str, Any]) -> LocalUploadedFile:
+    """读取 iter_documents 给出的文档"""
+    if source["member"] is None:
+        uploaded_file = LocalUploadedFile.from_path(source["path"])
+    else:
+        with zipfile.ZipFile(source["path"]) as archive:
+            uploaded_file = LocalUploadedFile(source["name"], archive.read(source["member"]))
+    uploaded_file.name = os.path.basename(source["name"])
+    return uploaded_file
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+修改稿段落比对
+按段落切分论文（与文档结构分析相同的切分方式），与同一草稿上一版本的段落哈希比对，
+找出需要重新批注的段落：修改或新增的段落及其前后相邻段落（删除段落处的前后段落同样需要重新批注）
+"""
+
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+# 每次批注调用最多包含的段落数，段落过多时模型容易漏批
+DEFAULT_MAX_PARAGRAPHS = 20
+
+
+def split_paragraphs(content: str) -> List[str]:
+    """按行切分段落（去掉空行）"""
+    return [p.strip() for p in (content or "").split("\n") if p.strip()]
+
+
+def plan_reannotation(hashes: Sequence[str], previous: Optional[Sequence[Tuple[str, bool]]] = None,
+                      neighbors: int = 1) -> Tuple[Set[int], Dict[int, int]]:
+    """
+    比对新旧版本的段落哈希
+
+    Args:
+        hashes: 新版本各段落的哈希
+        previous: 上一版本各段落的 (哈希, 是否有可沿用的批注)，为None时全部重新批注
+        neighbors: 修改处前后各有多少段落一并重新批注
+
+    Returns:
+        (需要重新批注的段落序号集合, 可沿用批注的段落 新序号 -> 旧序号)
+    """
+    if not previous:
+        return set(range(len(hashes))), {}
+
+    dirty = set()
+    reused = {}
+    matcher = SequenceMatcher(None, [h for h, _ in previous], list(hashes), autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(j2 - j1):
+                if previous[i1 + offset][1]:
+                    reused[j1 + offset] = i1 + offset
+                else:
+                    # 上次批注失败的段落
+                    dirty.add(j1 + offset)
+            continue
+        # replace/insert 标记新段落本身；delete 时 j1 == j2，只标记删除处前后的段落
+        start, end = j1 - neighbors, j2 + neighbors
+        dirty.update(i for i in range(max(start, 0), min(end, len(hashes))))
+
+    for index in dirty:
+        reused.pop(index, None)
+    return dirty, reused
+
+
+def group_batches(indices: Set[int], paragraphs: Sequence[str], max_chars: int,
+                  max_paragraphs: int = DEFAULT_MAX_PARAGRAPHS) -> List[List[int]]:
+    """
+    将需要重新批注的段落按连续区间分组，每组不超过 max_chars 字与 max_paragraphs 段
+
+    Returns:
+        段落序号列表的列表，组内与组间均按原文顺序排列
+    """
+    batches = []
+    current = []
+    size = 0
+    for index in sorted(indices):
+        length = len(paragraphs[index])
+        contiguous = current and index == current[-1] + 1
+        if current and (not contiguous or size + length > max_chars or len(current) >= max_paragraphs):
+            batches.append(current)
+            current, size = [], 0
+        current.append(index)
+        size += length
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提示词模板与调用链注册表
+每个提示词模板只在第一次使用时构建一次；(模板, 模型, temperature) 组合好的调用链也会被复用，
+并按模板统计token用量，便于找出开销最大的提示词
+"""
+
+import functools
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# 缓存的调用链数量上限（模型实例池按LRU淘汰，调用链随之淘汰）
+DEFAULT_MAX_CHAINS = 128
+
+# 模板中的变量占位符，如 {paper_content}
+_PLACEHOLDER_PATTERN = re.compile(r"\{[A-Za-z_][A-Za-z0-9_]*\}")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（中文约1.5字/token）；实际调用的用量以模型返回为准"""
+    return int(len(text) / 1.5) + 1 if text else 0
+
+
+def _template_text(template) -> str:
+    """提取模板中所有消息的固定文本（去掉变量占位符）"""
+    parts = []
+    for message in getattr(template, "messages", []):
+        prompt = getattr(message, "prompt", None)
+        text = getattr(prompt, "template", None) if prompt is not None else getattr(message, "content", "")
+        if isinstance(text, str):
+            parts.append(_PLACEHOLDER_PATTERN.sub("", text))
+    return "\n".join(parts)
+
+
+class PromptRegistry:
+    """提示词模板与调用链注册表（线程安全）"""
+
+    def __init__(self, max_chains: int = DEFAULT_MAX_CHAINS):
+        """初始化"""
+        self.max_chains = max_chains
+        self._factories = {}
+        self._templates = {}
+        self._template_tokens = {}
+        self._chains = OrderedDict()
+        self._chain_specs = {}
+        self._usage = {}
+        self._lock = threading.RLock()
+        self._stats = {"template_builds": 0, "chain_hits": 0, "chain_misses": 0, "chain_evictions": 0}
+
+    def register(self, name: str):
+        """
+        装饰器：将模板构建函数注册到指定名称
+
+        被装饰的函数之后每次调用都返回同一个已构建的模板
+        """
+        def decorator(factory: Callable[[], Any]):
+            with self._lock:
+                self._factories[name] = factory
+
+            @functools.wraps(factory)
+            def wrapper():
+                return self.template(name)
+            return wrapper
+        return decorator
+
+    def template(self, name: str, factory: Callable[[], Any] = None):
+        """
+        获取模板，首次使用时构建
+
+        Args:
+            name: 模板名称
+            factory: 未注册的模板可在此传入构建函数（如按维度动态组合的模板）
+        """
+        template = self._templates.get(name)
+        if template is not None:
+            return template
+        with self._lock:
+            template = self._templates.get(name)
+            if template is not None:
+                return template
+            if factory is not None:
+                self._factories.setdefault(name, factory)
+            if name not in self._factories:
+                raise KeyError(f"未注册的提示词模板: {name}")
+            template = self._factories[name]()
+            self._template_tokens[name] = estimate_tokens(_template_text(template))
+            self._templates[name] = template
+            self._stats["template_builds"] += 1
+            return template
+
+    def chain(self, name: str, llm, model: str = None, temperature: float = None,
+              llm_kwargs: Dict[str, Any] = None):
+        """
+        获取 模板 | 模型 组成的调用链，相同 (模板, 模型, temperature) 复用已组合的实例
+
+        Args:
+            name: 模板名称
+            llm: 模型实例
+            model: 模型标识，默认取实例的模型名
+            temperature: 默认取实例的temperature
+            llm_kwargs: 绑定到模型请求上的参数（如 response_format）
+        """
+        if model is None:
+            model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+        if temperature is None:
+            temperature = getattr(llm, "temperature", None)
+        key = (name, model, temperature, json.dumps(llm_kwargs, sort_keys=True) if llm_kwargs else None)
+
+        with self._lock:
+            entry = self._chains.get(key)
+            # 模型实例被实例池淘汰后重建时，对应的调用链也需要重建
+            if entry is not None and entry[0] is llm:
+                self._chains.move_to_end(key)
+                self._stats["chain_hits"] += 1
+                return entry[1]
+
+            chain = self.template(name) | (llm.bind(**llm_kwargs) if llm_kwargs else llm)
+            if entry is not None:
+                self._chain_specs.pop(id(entry[1]), None)
+            self._chains[key] = (llm, chain)
+            self._chains.move_to_end(key)
+            self._chain_specs[id(chain)] = (name, llm_kwargs)
+            self._stats["chain_misses"] += 1
+
+            while len(self._chains) > self.max_chains:
+                _, (_, evicted) = self._chains.popitem(last=False)
+                self._chain_specs.pop(id(evicted), None)
+                self._stats["chain_evictions"] += 1
+            return chain
+
+    def name_for(self, chain) -> Optional[str]:
+        """查询调用链对应的模板名称，非注册表构建的调用链返回None"""
+        with self._lock:
+            spec = self._chain_specs.get(id(chain))
+        return spec[0] if spec else None
+
+    def rebind(self, chain, llm, model: str = None):
+        """
+        将注册表构建的调用链换成另一个模型（保留模板与绑定的请求参数）
+
+        Returns:
+            新的调用链，非注册表构建的调用链返回None
+        """
+        with self._lock:
+            spec = self._chain_specs.get(id(chain))
+        if spec is None:
+            return None
+        return self.chain(spec[0], llm, model=model, llm_kwargs=spec[1])
+
+    def template_tokens(self, name: str) -> int:
+        """模板固定部分（不含变量）的token数"""
+        return self._template_tokens.get(name, 0)
+
+    def record_usage(self, name: str, prompt_tokens: int, completion_tokens: int = 0, estimated: bool = False):
+        """记录一次调用的token用量"""
+        with self._lock:
+            usage = self._usage.setdefault(name, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                                  "estimated_calls": 0})
+            usage["calls"] += 1
+            usage["prompt_tokens"] += prompt_tokens or 0
+            usage["completion_tokens"] += completion_tokens or 0
+            if estimated:
+                usage["estimated_calls"] += 1
+
+    def get_prompt_stats(self) -> List[Dict[str, Any]]:
+        """
+        各模板的token统计，按累计prompt token数从高到低排列
+
+        Returns:
+            [{name, template_tokens, calls, prompt_tokens, avg_prompt_tokens, completion_tokens, estimated_calls}]
+        """
+        with self._lock:
+            names = set(self._templates) | set(self._usage)
+            rows = []
+            for name in names:
+                usage = self._usage.get(name, {})
+                calls = usage.get("calls", 0)
+                rows.append({
+                    "name": name,
+                    "template_tokens": self._template_tokens.get(name, 0),
+                    "calls": calls,
+                    "prompt_tokens": usage.get("prompt_tokens", 0),
+                    "avg_prompt_tokens": usage.get("prompt_tokens", 0) / calls if calls else 0.0,
+                    "completion_tokens": usage.get("completion_tokens", 0),
+                    "estimated_calls": usage.get("estimated_calls", 0)
+                })
+        rows.sort(key=lambda row: (row["prompt_tokens"], row["template_tokens"]), reverse=True)
+        return rows
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取模板构建与调用链复用统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["templates"] = len(self._templates)
+            stats["chains"] = len(self._chains)
+        return stats
+
+
+# 创建全局实例
+prompt_registry = PromptRegistry()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单飞（single-flight）请求合并模块
+相同缓存键的并发调用只发出一次模型请求，其余调用等待并共享结果
+"""
+
+import asyncio
+import os
+import threading
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from src.config import cancellation
+from src.utils.llm_cache import llm_cache
+
+# 跨进程锁的有效期（秒），持锁进程崩溃后超时自动释放
+DEFAULT_LOCK_TTL = 180
+# 跨进程等待时轮询共享缓存的间隔（秒）
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+class _LeaderAborted(Exception):
+    """领头调用被取消，等待方需要自行重新发起"""
+
+
+class _Call:
+    """一次进行中的调用"""
+
+    def __init__(self):
+        self.future = Future()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """进程内（跨线程、跨事件循环）合并相同键的并发调用，可选通过共享缓存库跨进程合并"""
+
+    def __init__(self, cross_process: bool = None, lock_ttl: float = DEFAULT_LOCK_TTL,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+        """初始化"""
+        if cross_process is None:
+            cross_process = os.getenv("PAPERHELPER_SINGLE_FLIGHT_CROSS_PROCESS", "0") == "1"
+        self.cross_process = cross_process
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._owner_prefix = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stats = {"leaders": 0, "shared": 0, "cross_process_waits": 0, "cross_process_shared": 0}
+
+    def join(self, key: str):
+        """
+        加入某个键的调用
+
+        Returns:
+            (call, is_leader)：is_leader为True时调用方负责执行并调用 complete()
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["shared"] += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self._stats["leaders"] += 1
+            return call, True
+
+    def complete(self, key: str, call: _Call, result: Any = None, error: BaseException = None):
+        """领头调用结束，唤醒所有等待方"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        if call.future.done():
+            return
+        if error is not None:
+            if isinstance(error, (asyncio.CancelledError, KeyboardInterrupt, GeneratorExit)):
+                error = _LeaderAborted()
+            call.future.set_exception(error)
+        else:
+            call.future.set_result(result)
+
+    def wait(self, call: _Call) -> Any:
+        """
+        等待领头调用的结果
+
+        当前取消令牌被取消时立即停止等待并抛出 RequestCancelledError（领头调用不受影响，继续为其他等待方执行）
+        """
+        token = cancellation.current_token()
+        if token is None:
+            return call.future.result()
+        done = threading.Event()
+        call.future.add_done_callback(lambda _: done.set())
+        remove = token.add_callback(done.set)
+        try:
+            done.wait()
+        finally:
+            remove()
+        token.raise_if_cancelled()
+        return call.future.result()
+
+    async def await_call(self, call: _Call) -> Any:
+        """
+        等待领头调用的结果（异步版）
+
+        每个等待方使用自己的事件循环future，等待方被取消时不影响共享的future与其他等待方；
+        当前取消令牌被取消时同样立即停止等待并抛出 RequestCancelledError
+        """
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+
+        def wake(*_):
+            try:
+                loop.call_soon_threadsafe(lambda: waiter.done() or waiter.set_result(None))
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+        call.future.add_done_callback(wake)
+        token = cancellation.current_token()
+        remove = token.add_callback(wake) if token is not None else (lambda: None)
+        try:
+            await waiter
+        finally:
+            remove()
+        cancellation.check()
+        return call.future.result()
+
+    def do(self, key: str, fn: Callable[[], Any], check_cache: Callable[[], Optional[Any]] = None) -> Any:
+        """
+        同步执行：相同键只有一个调用真正执行fn
+
+        Args:
+            key: 合并键（通常为缓存键）
+            fn: 实际执行的函数
+            check_cache: 跨进程等待时用于读取共享缓存的函数
+        """
+        while True:
+            call, is_leader = self.join(key)
+            if not is_leader:
+                try:
+                    return self.wait(call)
+                except _LeaderAborted:
+                    continue
+
+            try:
+                result = self._run_with_process_lock(key, fn, check_cache)
+            except BaseException as e:
+                self.complete(key, call, error=e)
+                raise
+            self.complete(key, call, result=result)
+            return result
+
+    async def ado(self, key: str, coro_fn: Callable[[], Any],
+                  check_cache: Callable[[], Optional[Any]] = None) -> Any:
+        """异步执行：与 do() 共享同一组进行中的调用"""
+        while True:
+            call, is_leader = self.join(key)
+            if not is_leader:
+                try:
+                    return await self.await_call(call)
+                except _LeaderAborted:
+                    continue
+
+            try:
+                result = await self._arun_with_process_lock(key, coro_fn, check_cache)
+            except BaseException as e:
+                self.complete(key, call, error=e)
+                raise
+            self.complete(key, call, result=result)
+            return result
+
+    def in_flight(self) -> int:
+        """当前进行中的调用数"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+            return stats
+
+    def _owner(self) -> str:
+        """当前线程的锁持有者标识"""
+        return f"{self._owner_prefix}:{threading.get_ident()}"
+
+    def _run_with_process_lock(self, key: str, fn: Callable[[], Any], check_cache) -> Any:
+        """跨进程合并：拿到共享锁才执行，否则等待其他进程写入缓存"""
+        if not self.cross_process or check_cache is None:
+            return fn()
+
+        owner = self._owner()
+        while not llm_cache.try_acquire_lock(key, owner, self.lock_ttl):
+            self._stats["cross_process_waits"] += 1
+            cancellation.sleep(self.poll_interval)
+            cached = check_cache()
+            if cached is not None:
+                self._stats["cross_process_shared"] += 1
+                return cached
+        try:
+            return fn()
+        finally:
+            llm_cache.release_lock(key, owner)
+
+    async def _arun_with_process_lock(self, key: str, coro_fn: Callable[[], Any], check_cache) -> Any:
+        """跨进程合并（异步版），等待期间不阻塞事件循环"""
+        if not self.cross_process or check_cache is None:
+            return await coro_fn()
+
+        owner = self._owner()
+        while not llm_cache.try_acquire_lock(key, owner, self.lock_ttl):
+            self._stats["cross_process_waits"] += 1
+            await asyncio.sleep(self.poll_interval)
+            cached = check_cache()
+            if cached is not None:
+                self._stats["cross_process_shared"] += 1
+                return cached
+        try:
+            return await coro_fn()
+        finally:
+            llm_cache.release_lock(key, owner)
+
+
+# 创建全局实例
+single_flight = SingleFlight()
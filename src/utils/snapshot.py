@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程级共享快照
+不依赖用户输入的结果（如研究趋势）由后台任务定时刷新，所有会话直接读取内存中的同一份快照；
+快照过期后仍先返回旧值，同时在后台重新生成（stale-while-revalidate）。
+快照同时写入共享缓存库，预热脚本生成的快照可被应用进程直接使用
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.config.telemetry import telemetry
+from src.utils.llm_cache import llm_cache
+from src.utils.single_flight import single_flight
+
+# 刷新失败后的重试间隔（秒）
+DEFAULT_RETRY_SECONDS = 300
+# 过期快照在共享缓存库中最多保留的刷新周期数
+DEFAULT_MAX_STALE_PERIODS = 7
+
+
+class Snapshot:
+    """定时刷新的共享快照（线程安全）"""
+
+    def __init__(self, name: str, loader: Callable[[], Tuple[Any, bool]], ttl_seconds: float,
+                 retry_seconds: float = DEFAULT_RETRY_SECONDS, max_stale_seconds: float = None):
+        """
+        初始化
+
+        Args:
+            name: 快照名称（同时用于共享缓存库的键）
+            loader: 生成快照的函数，返回 (值, 是否成功)，值需可JSON序列化；失败时不替换现有快照
+            ttl_seconds: 刷新周期，超过后视为过期
+            retry_seconds: 刷新失败后的重试间隔
+            max_stale_seconds: 过期快照的最长保留时间，默认为7个刷新周期
+        """
+        self.name = name
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self.max_stale_seconds = max_stale_seconds or ttl_seconds * DEFAULT_MAX_STALE_PERIODS
+        self._key = f"snapshot:{name}"
+        self._entry = None
+        self._store_checked = False
+        self._refreshing = False
+        self._next_retry = 0.0
+        self._scheduler = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"fresh": 0, "stale": 0, "miss": 0, "refreshes": 0, "failures": 0}
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """
+        读取快照
+
+        有快照时立即返回（过期则触发后台刷新）；进程内与共享缓存库中都没有快照时同步生成一次
+
+        Returns:
+            {"value": 值, "updated_at": 生成时间戳, "stale": 是否过期}，生成失败时返回None
+        """
+        entry = self.peek()
+        if entry is None:
+            self._count("miss")
+            return self._view(self.refresh())
+        if self._is_stale(entry):
+            self._count("stale")
+            self.refresh_in_background()
+        else:
+            self._count("fresh")
+        return self._view(entry)
+
+    def peek(self) -> Optional[Dict[str, Any]]:
+        """读取当前快照（不触发刷新）；进程内首次读取时从共享缓存库加载"""
+        entry = self._entry
+        if entry is not None or self._store_checked:
+            return entry
+        stored = self._load_stored()
+        with self._lock:
+            self._store_checked = True
+            if self._entry is None:
+                self._entry = stored
+            return self._entry
+
+    def refresh(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        同步刷新快照，并发的刷新请求（包括其他进程中的）只生成一次
+
+        Args:
+            force: 为False时若共享缓存库中已有其他进程生成的未过期快照，直接采用
+        Returns:
+            刷新后的快照，失败时返回现有快照（可能为None）
+        """
+        check_cache = None if force else self._fresh_stored
+        flight_key = f"{self._key}:refresh" if force else self._key
+        entry = single_flight.do(flight_key, lambda: self._refresh(force), check_cache=check_cache)
+        if entry is not None:
+            # 跨进程等待时拿到的是其他进程写入的快照
+            self._adopt(entry)
+        return entry
+
+    def refresh_in_background(self) -> bool:
+        """
+        在后台线程中刷新（已有刷新进行中或处于失败重试间隔内时不重复发起）
+
+        Returns:
+            是否发起了刷新
+        """
+        with self._lock:
+            if self._refreshing or time.time() < self._next_retry:
+                return False
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"后台刷新快照 {self.name} 时发生错误: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name=f"paperhelper-snapshot-{self.name}", daemon=True).start()
+        return True
+
+    def start(self) -> bool:
+        """
+        启动定时刷新线程（每个进程只启动一次）：快照缺失或过期时立即刷新，之后每个刷新周期刷新一次
+
+        Returns:
+            是否启动了新线程
+        """
+        with self._lock:
+            if self._scheduler is not None and self._scheduler.is_alive():
+                return False
+            self._stop.clear()
+            self._scheduler = threading.Thread(target=self._schedule_loop,
+                                               name=f"paperhelper-snapshot-{self.name}-scheduler", daemon=True)
+            self._scheduler.start()
+            return True
+
+    def stop(self):
+        """停止定时刷新线程"""
+        self._stop.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取读取命中（fresh/stale/miss）、刷新次数与快照年龄"""
+        with self._lock:
+            stats = dict(self._stats)
+            entry = self._entry
+            stats["scheduled"] = self._scheduler is not None and self._scheduler.is_alive()
+        stats["updated_at"] = entry["updated_at"] if entry else None
+        stats["age_seconds"] = time.time() - entry["updated_at"] if entry else None
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+    def _refresh(self, force: bool) -> Optional[Dict[str, Any]]:
+        """刷新的实际执行：优先采用其他进程刚生成的快照，否则调用loader"""
+        if not force:
+            stored = self._fresh_stored()
+            if stored is not None:
+                self._adopt(stored)
+                return stored
+
+        with telemetry.span("snapshot.refresh", snapshot=self.name) as span:
+            value, ok = self.loader()
+            span.set(ok=ok)
+        with self._lock:
+            if not ok:
+                self._stats["failures"] += 1
+                self._next_retry = time.time() + self.retry_seconds
+                return self._entry
+            self._stats["refreshes"] += 1
+            self._next_retry = 0.0
+
+        entry = {"value": value, "updated_at": time.time()}
+        llm_cache.set(self._key, json.dumps(entry, ensure_ascii=False), self.max_stale_seconds)
+        self._adopt(entry)
+        return entry
+
+    def _schedule_loop(self):
+        """定时刷新循环"""
+        while not self._stop.is_set():
+            entry = self.peek()
+            delay = entry["updated_at"] + self.ttl_seconds - time.time() if entry else 0
+            if delay <= 0:
+                try:
+                    entry = self.refresh()
+                except Exception as e:
+                    print(f"定时刷新快照 {self.name} 时发生错误: {str(e)}")
+                    entry = None
+                fresh = entry is not None and not self._is_stale(entry)
+                delay = self.ttl_seconds if fresh else self.retry_seconds
+            self._stop.wait(delay)
+
+    def _adopt(self, entry: Dict[str, Any]):
+        """采用较新的快照"""
+        with self._lock:
+            if self._entry is None or entry["updated_at"] >= self._entry["updated_at"]:
+                self._entry = entry
+
+    def _load_stored(self) -> Optional[Dict[str, Any]]:
+        """从共享缓存库读取快照"""
+        stored = llm_cache.get(self._key)
+        if not stored:
+            return None
+        try:
+            entry = json.loads(stored)
+        except (TypeError, ValueError):
+            return None
+        return entry if isinstance(entry, dict) and "updated_at" in entry else None
+
+    def _fresh_stored(self) -> Optional[Dict[str, Any]]:
+        """共享缓存库中未过期的快照（其他进程可能已经刷新过）"""
+        entry = self._load_stored()
+        return entry if entry is not None and not self._is_stale(entry) else None
+
+    def _is_stale(self, entry: Dict[str, Any]) -> bool:
+        """快照是否已超过刷新周期"""
+        return time.time() - entry["updated_at"] >= self.ttl_seconds
+
+    def _view(self, entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """返回给调用方的快照视图"""
+        if entry is None:
+            return None
+        return {"value": entry["value"], "updated_at": entry["updated_at"], "stale": self._is_stale(entry)}
+
+    def _count(self, result: str):
+        """记录一次读取结果"""
+        with self._lock:
+            self._stats[result] += 1
+        telemetry.inc("paperhelper_snapshot_reads_total", snapshot=self.name, result=result)
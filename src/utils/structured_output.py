@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结构化输出
+模型支持时通过 response_format 要求其直接输出JSON，本地按schema校验，并对接近合法的JSON
+（代码块包裹、中文标点、单引号、尾逗号、输出被截断等）做低成本修复；
+本地修复失败时才由调用方决定是否再请求一次模型
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+
+# 模型配置中 structured_output 的取值
+JSON_SCHEMA_MODE = "json_schema"
+JSON_OBJECT_MODE = "json_object"
+
+# 校验状态
+STATUS_VALID = "valid"
+STATUS_REPAIRED = "repaired"
+STATUS_INVALID = "invalid"
+
+_CODE_FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.S)
+_NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+_BULLET_PATTERN = re.compile(r"^\s*(?:[-*•·]|\d+[.、)）])\s*")
+
+# JSON结构之外常见的全角标点
+_FULLWIDTH_PUNCTUATION = {"，": ",", "：": ":", "｛": "{", "｝": "}", "［": "[", "］": "]"}
+# 字符串定界符 -> 对应的结束符
+_QUOTE_PAIRS = {'"': '"', "'": "'", "“": "”"}
+_LITERALS = {"True": "true", "False": "false", "None": "null", "true": "true", "false": "false", "null": "null"}
+
+
+class FeasibilityResult(BaseModel):
+    """选题可行性评分"""
+
+    theoretical_score: int = Field(ge=0, le=100, description="理论可行性评分（0-100）")
+    methodological_score: int = Field(ge=0, le=100, description="方法可行性评分（0-100）")
+    data_score: int = Field(ge=0, le=100, description="数据可获得性评分（0-100）")
+    innovation_score: int = Field(ge=0, le=100, description="创新性评分（0-100）")
+    score: Optional[int] = Field(default=None, ge=0, le=100, description="总体评分（0-100）")
+    theoretical: str = Field(default="", description="理论可行性分析")
+    methodological: str = Field(default="", description="方法可行性分析")
+    data_availability: str = Field(default="", description="数据可获得性分析")
+    innovation: str = Field(default="", description="创新性分析")
+    suggestions: List[str] = Field(default_factory=list, description="改进建议列表")
+
+    @field_validator("theoretical_score", "methodological_score", "data_score", "innovation_score", "score",
+                     mode="before")
+    @classmethod
+    def _parse_score(cls, value):
+        """兼容 "85"、"85分"、"85/100"、85.5 等写法"""
+        if isinstance(value, str):
+            match = _NUMBER_PATTERN.search(value)
+            if match is None:
+                raise ValueError("评分不是数字")
+            value = float(match.group())
+        if isinstance(value, float):
+            value = int(round(value))
+        return value
+
+    @field_validator("theoretical", "methodological", "data_availability", "innovation", mode="before")
+    @classmethod
+    def _join_text(cls, value):
+        """分析写成列表时合并为一段文字"""
+        if value is None:
+            return ""
+        if isinstance(value, list):
+            return "；".join(str(item) for item in value)
+        return value if isinstance(value, str) else str(value)
+
+    @field_validator("suggestions", mode="before")
+    @classmethod
+    def _split_suggestions(cls, value):
+        """建议写成一整段文字时按行拆分"""
+        if value is None:
+            return []
+        if isinstance(value, str):
+            lines = [_BULLET_PATTERN.sub("", line).strip() for line in value.splitlines()]
+            return [line for line in lines if line]
+        return [str(item) for item in value]
+
+    @model_validator(mode="after")
+    def _fill_overall_score(self):
+        """缺少总体评分时取各维度平均分"""
+        if self.score is None:
+            self.score = int(round((self.theoretical_score + self.methodological_score
+                                    + self.data_score + self.innovation_score) / 4))
+        return self
+
+
+def response_format_for(schema, mode: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    生成请求参数 response_format
+
+    Args:
+        schema: pydantic模型
+        mode: json_schema（按schema约束输出）、json_object（只保证输出合法JSON），其他值表示不支持
+    """
+    if mode == JSON_SCHEMA_MODE:
+        return {"type": "json_schema",
+                "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema(), "strict": False}}
+    if mode == JSON_OBJECT_MODE:
+        return {"type": "json_object"}
+    return None
+
+
+def schema_description(schema) -> str:
+    """schema的字段说明（供修正提示词使用）"""
+    return json.dumps(schema.model_json_schema(), ensure_ascii=False)
+
+
+def extract_json_text(text: str) -> Optional[str]:
+    """
+    提取输出中的JSON对象文本
+
+    去掉代码块标记，从第一个 { 开始截取到与之配对的 }；输出被截断时截取到末尾
+    """
+    if not text:
+        return None
+    fenced = _CODE_FENCE_PATTERN.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1)
+    start = text.find("{")
+    if start == -1:
+        start = text.find("｛")
+    if start == -1:
+        return None
+
+    depth = 0
+    quote = None
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == _QUOTE_PAIRS[quote]:
+                quote = None
+        elif char in _QUOTE_PAIRS:
+            quote = char
+        elif char in "{｛":
+            depth += 1
+        elif char in "}｝":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:]
+
+
+def repair_json(text: str) -> str:
+    """
+    修复接近合法的JSON文本
+
+    只在字符串之外改写：全角标点、单引号/中文引号定界、Python字面量、未加引号的键、尾逗号；
+    字符串内的换行转义；被截断的输出补齐未闭合的字符串与括号
+    """
+    output = []
+    closers = []
+    quote = None
+    escaped = False
+    index = 0
+    length = len(text)
+
+    def drop_trailing_comma():
+        while output and output[-1].isspace():
+            output.pop()
+        if output and output[-1] == ",":
+            output.pop()
+
+    while index < length:
+        char = text[index]
+        if quote:
+            if escaped:
+                output.append(char)
+                escaped = False
+            elif char == "\\":
+                output.append(char)
+                escaped = True
+            elif char == _QUOTE_PAIRS[quote]:
+                output.append('"')
+                quote = None
+            elif char == '"':
+                # 单引号或中文引号定界的字符串中出现的双引号需要转义
+                output.append('\\"')
+            elif char == "\n":
+                output.append("\\n")
+            elif char == "\r":
+                pass
+            elif char == "\t":
+                output.append("\\t")
+            else:
+                output.append(char)
+            index += 1
+            continue
+
+        char = _FULLWIDTH_PUNCTUATION.get(char, char)
+        if char in _QUOTE_PAIRS:
+            quote = char
+            output.append('"')
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+            output.append(char)
+        elif char in "}]":
+            drop_trailing_comma()
+            if closers:
+                closers.pop()
+            output.append(char)
+            if not closers:
+                break
+        elif char.isalpha() or char == "_":
+            end = index
+            while end < length and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[index:end]
+            rest = text[end:].lstrip()
+            if rest[:1] in (":", "："):
+                output.append(json.dumps(word))
+            else:
+                output.append(_LITERALS.get(word, json.dumps(word)))
+            index = end
+            continue
+        else:
+            output.append(char)
+        index += 1
+
+    # 输出被截断：闭合字符串、去掉悬空的键或逗号，再补齐括号
+    if quote:
+        if escaped:
+            output.pop()
+        output.append('"')
+    while closers:
+        drop_trailing_comma()
+        while output and output[-1] == ":":
+            output.pop()
+            _drop_last_string(output)
+            drop_trailing_comma()
+        output.append(closers.pop())
+    return "".join(output)
+
+
+def _drop_last_string(output: List[str]):
+    """删除输出末尾的一个字符串（截断在 "键": 之后时去掉该键）"""
+    while output and output[-1].isspace():
+        output.pop()
+    if not output or output[-1] != '"':
+        return
+    output.pop()
+    while output:
+        char = output.pop()
+        if char == '"' and not (output and output[-1] == "\\"):
+            return
+
+
+def _format_errors(error: ValidationError) -> str:
+    """校验错误摘要"""
+    return "；".join(f"{'.'.join(str(part) for part in item['loc']) or '根对象'}: {item['msg']}"
+                    for item in error.errors())
+
+
+def parse_structured(text: str, schema) -> Tuple[Optional[Dict[str, Any]], str, str]:
+    """
+    解析并校验模型输出
+
+    Returns:
+        (数据, 状态, 错误说明)：状态为 valid（直接通过）、repaired（本地修复后通过）或 invalid（数据为None）
+    """
+    candidate = extract_json_text(text)
+    if candidate is None:
+        return None, STATUS_INVALID, "输出中没有JSON对象"
+
+    error = ""
+    for status, load in ((STATUS_VALID, lambda: json.loads(candidate)),
+                         (STATUS_REPAIRED, lambda: json.loads(repair_json(candidate)))):
+        try:
+            raw = load()
+        except ValueError as e:
+            error = f"JSON格式错误: {str(e)}"
+            continue
+        if not isinstance(raw, dict):
+            return None, STATUS_INVALID, "JSON顶层不是对象"
+        try:
+            return schema.model_validate(raw).model_dump(), status, ""
+        except ValidationError as e:
+            # JSON本身合法但字段不符合要求，本地无法修复
+            return None, STATUS_INVALID, _format_errors(e)
+    return None, STATUS_INVALID, error